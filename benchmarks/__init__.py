@@ -0,0 +1,5 @@
+"""Performance benchmarks for contablo, run with ``python -m benchmarks``.
+
+Benchmarks operate on synthetic exports created by benchmarks.generator and register themselves with
+benchmarks.harness.benchmark(); see the modules named bench_*.
+"""
@@ -0,0 +1,56 @@
+import argparse
+import json
+import logging
+import tempfile
+from pathlib import Path
+
+import benchmarks.bench_import  # noqa: F401 - registers benchmarks
+import benchmarks.bench_merge  # noqa: F401 - registers benchmarks
+from benchmarks.harness import BenchContext
+from benchmarks.harness import BenchResult
+from benchmarks.harness import compare_reports
+from benchmarks.harness import load_report
+from benchmarks.harness import make_report
+from benchmarks.harness import registry
+from benchmarks.harness import result_key
+from benchmarks.harness import run_benchmarks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run contablo performance benchmarks.")
+    parser.add_argument("names", nargs="*", help="Only run benchmarks whose name contains one of these strings.")
+    parser.add_argument("-s", "--size", type=int, default=1000, help="Rows per generated file (default: 1000).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data generator (default: 0).")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Timed runs per benchmark (default: 3).")
+    parser.add_argument("-o", "--output", help="Write results to this JSON file.")
+    parser.add_argument("-c", "--compare", help="Compare results to those in this JSON file.")
+    parser.add_argument("-l", "--list", action="store_true", help="List available benchmarks and exit.")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, func in registry.items():
+            print(f"{name:24s} {(func.__doc__ or '').strip()}")
+        return
+
+    # the importer logs each non-matching rule as warning, which would dominate the timings:
+    logging.disable(logging.WARNING)
+
+    def report(result: BenchResult) -> None:
+        key = result_key(result.as_dict())
+        print(f"{key:60s} {result.best:10.4f}s  {result.items / result.best if result.best else 0:12.0f} items/s")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        context = BenchContext(size=args.size, seed=args.seed, workdir=Path(workdir))
+        results = run_benchmarks(context, args.names, args.repeat, report)
+
+    data = make_report(context, results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        print("\n".join(compare_reports(load_report(args.compare), data)))
+
+
+if __name__ == "__main__":
+    main()
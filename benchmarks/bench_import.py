@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import copy
+import csv
+import datetime
+import json
+import subprocess
+import sys
+import threading
+
+from benchmarks.common import field_spec_registry
+from benchmarks.common import target_fields
+from benchmarks.generator import generate_bank_export
+from benchmarks.generator import generate_broker_export
+from benchmarks.generator import generate_exports
+from benchmarks.generator import target_field_specs
+from benchmarks.harness import BenchCase
+from benchmarks.harness import BenchContext
+from benchmarks.harness import benchmark
+from contablo.cli import fill_import_spec_registry
+from contablo.codes import is_valid_isin
+from contablo.codes import validate_isins
+from contablo.csvimporter import MatchMemo
+from contablo.csvimporter import add_to_importable_using_import_spec
+from contablo.csvimporter import import_csv_with_spec
+from contablo.csvimporter import import_csv_with_spec_detection
+from contablo.csvtmplgen import CsvTemplateGenerator
+from contablo.fields import DateFieldSpec
+from contablo.fields import DecimalFieldSpec
+from contablo.fields import MoneyFieldSpec
+from contablo.format_helpers import common_date_formats
+from contablo.importable import ImporTable
+from contablo.importable import ImportDatum
+from contablo.importspec import DatumTemplates
+from contablo.importspec import ImportSpec
+from contablo.importspec import ImportSpecRegistry
+from contablo.match import check_conditions
+from contablo.match import compile_condition
+from contablo.serve import ImportService
+from contablo.serve import make_server
+from contablo.serve import request_import
+
+
+@benchmark("spec_detection")
+def bench_spec_detection(ctx: BenchContext) -> BenchCase:
+    """Detect and import two bank and two broker files against a registry with additional decoy specs."""
+    registry = field_spec_registry()
+    exports = generate_exports(ctx.size, seed=ctx.seed, files=2)
+    filenames = [export.write(ctx.workdir) for export in exports]
+    specs = ImportSpecRegistry()
+    for export in exports[:2]:
+        specs.add_import_spec(ImportSpec(**export.import_spec), export.filename)
+    decoys = 20
+    for idx in range(decoys):
+        decoy = copy.deepcopy(exports[idx % 2].import_spec)
+        decoy["label"] = f"decoy-{idx}"
+        decoy["columns"][-1]["label"] = f"Decoy {idx}"
+        specs.add_import_spec(ImportSpec(**decoy), f"decoy-{idx}.json")
+    factory = ImporTable(target_fields(registry)).clone_empty
+
+    def run():
+        for filename in filenames:
+            import_csv_with_spec_detection(filename, specs, factory, registry)
+
+    return BenchCase(run, ctx.size * len(filenames), dict(files=len(filenames), specs=2 + decoys))
+
+
+@benchmark("row_import")
+def bench_row_import(ctx: BenchContext) -> list[BenchCase]:
+    """Feed pre-split rows of the bank export through add_to_importable_using_import_spec()."""
+    registry = field_spec_registry()
+    fields = target_fields(registry)
+    cases = []
+    for rules in [10, 200, 1000]:
+        export = generate_bank_export(ctx.size, seed=ctx.seed, rules=rules)
+        rows = list(csv.reader(export.text.splitlines()[1:], delimiter=";"))
+        spec = ImportSpec(**export.import_spec)
+
+        def run(rows=rows, spec=spec):
+            importable = ImporTable(fields)
+            for idx, row in enumerate(rows, 2):
+                add_to_importable_using_import_spec(importable, spec, row, f"bench:{idx}")
+
+        cases.append(BenchCase(run, len(rows), dict(rules=rules)))
+    return cases
+
+
+@benchmark("small_files")
+def bench_small_files(ctx: BenchContext) -> BenchCase:
+    """Import many small bank exports with one spec that declares extra fields and transforms."""
+    registry = field_spec_registry()
+    factory = ImporTable(target_fields(registry)).clone_empty
+    exports = [generate_bank_export(5, seed=ctx.seed * 1000 + idx, rules=10) for idx in range(max(ctx.size // 5, 1))]
+    spec_data = dict(exports[0].import_spec)
+    spec_data["fields"] = [{"name": "net", "type": "number", "help": "Amount without balance"}]
+    spec_data["transforms"] = {"net": "balance - amount"}
+    spec = ImportSpec(**spec_data)
+    buffers = [(export.filename, memoryview(export.data)) for export in exports]
+
+    def run():
+        for name, data in buffers:
+            import_csv_with_spec(data, spec, factory, registry, name)
+
+    return BenchCase(run, len(buffers), dict(files=len(buffers), rows=5))
+
+
+@benchmark("spec_loading")
+def bench_spec_loading(ctx: BenchContext) -> list[BenchCase]:
+    """Fill the import spec registry from a directory of config files, without and with a warm spec cache."""
+    config_dir = ctx.workdir / "spec-loading"
+    config_dir.mkdir(exist_ok=True)
+    specs = 20
+    for idx in range(specs):
+        spec = generate_bank_export(1, seed=ctx.seed, rules=200, label=f"bank-{idx}").import_spec
+        (config_dir / f"bank-{idx}.json").write_text(json.dumps(spec))
+    cache_dir = (ctx.workdir / "spec-cache").as_posix()
+    fill_import_spec_registry(config_dir.as_posix(), ImportSpecRegistry(), cache_dir)
+
+    def run(cache_dir: str | None):
+        registry = ImportSpecRegistry()
+        fill_import_spec_registry(config_dir.as_posix(), registry, cache_dir)
+        assert len(registry) == specs
+
+    return [BenchCase(lambda c=c: run(c), specs, dict(cache=c is not None)) for c in [None, cache_dir]]
+
+
+@benchmark("single_file")
+def bench_single_file(ctx: BenchContext) -> list[BenchCase]:
+    """Load a config directory of 40 specs and detect and import one small file, with all specs or only the matching
+    one validated, the latter also with a warm spec cache."""
+    registry = field_spec_registry()
+    factory = ImporTable(target_fields(registry)).clone_empty
+    config_dir = ctx.workdir / "single-file"
+    config_dir.mkdir(exist_ok=True)
+    export = generate_bank_export(5, seed=ctx.seed, rules=200, label="bank")
+    filename = export.write(ctx.workdir)
+    specs = 40
+    for idx in range(specs):
+        spec = copy.deepcopy(export.import_spec)
+        if idx:
+            spec["label"] = f"decoy-{idx}"
+            spec["columns"][-1]["label"] = f"Decoy {idx}"
+        (config_dir / f"{spec['label']}.json").write_text(json.dumps(spec))
+    cache_dir = (ctx.workdir / "single-file-cache").as_posix()
+
+    def run(mode: str):
+        specs = ImportSpecRegistry()
+        fill_import_spec_registry(config_dir.as_posix(), specs, cache_dir if mode == "cached" else None)
+        if mode == "eager":
+            list(specs.iter_specs())
+        assert import_csv_with_spec_detection(filename, specs, factory, registry) is not None
+
+    run("cached")
+    return [BenchCase(lambda m=m: run(m), 1, dict(specs=specs, mode=m)) for m in ["eager", "lazy", "cached"]]
+
+
+@benchmark("serve")
+def bench_serve(ctx: BenchContext) -> list[BenchCase]:
+    """Convert small bank files with one CLI run per file, or with requests to a running import server."""
+    files = 5
+    exports = [generate_bank_export(20, seed=ctx.seed * 1000 + idx) for idx in range(files)]
+    filenames = [export.write(ctx.workdir) for export in exports]
+    config = ctx.workdir / "serve-spec.json"
+    config.write_text(json.dumps(exports[0].import_spec))
+    target = ctx.workdir / "serve-target.json"
+    target.write_text(json.dumps(target_field_specs))
+
+    registry = field_spec_registry()
+    specs = ImportSpecRegistry()
+    specs.add_import_spec(ImportSpec(**exports[0].import_spec), config.as_posix())
+    server = make_server(
+        ImportService(specs, registry, target_fields(registry)), (ctx.workdir / "serve.sock").as_posix()
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    command = [sys.executable, "-c", "from contablo.cli import cli; cli()", "convert", "-t", target, "-c", config]
+    output = (ctx.workdir / "serve-output.csv").as_posix()
+
+    def run_cli():
+        for filename in filenames:
+            subprocess.run(command + ["-o", output, filename], check=True, capture_output=True)
+
+    def run_server():
+        for filename in filenames:
+            request_import(server.server_address, path=filename, format="csv")
+
+    return [BenchCase(run_cli, files, dict(mode="cli")), BenchCase(run_server, files, dict(mode="server"))]
+
+
+@benchmark("match_memo")
+def bench_match_memo(ctx: BenchContext) -> list[BenchCase]:
+    """Import bank rows whose booking texts repeat a few dozen values, with and without the per-column match memo."""
+    registry = field_spec_registry()
+    fields = target_fields(registry)
+    export = generate_bank_export(ctx.size, seed=ctx.seed, rules=200)
+    rows = list(csv.reader(export.text.splitlines()[1:], delimiter=";"))
+    # direct debits are the bulk of the texts; the others depend on the amount and are kept as they are
+    texts = [row[3] for row in rows if row[3].startswith("SEPA")][:40]
+    for idx, row in enumerate(rows):
+        if row[3].startswith("SEPA"):
+            row[3] = texts[idx % len(texts)]
+    spec = ImportSpec(**export.import_spec)
+
+    def run(memo: bool):
+        importable = ImporTable(fields)
+        memo = MatchMemo() if memo else None
+        for idx, row in enumerate(rows, 2):
+            add_to_importable_using_import_spec(importable, spec, row, f"bench:{idx}", memo)
+
+    return [BenchCase(lambda memo=memo: run(memo), len(rows), dict(memo=memo)) for memo in [False, True]]
+
+
+@benchmark("defaults")
+def bench_defaults(ctx: BenchContext) -> list[BenchCase]:
+    """Fill in 24 defaults for each bank row, formatting every entry per row versus templates parsed once."""
+    export = generate_bank_export(ctx.size, seed=ctx.seed)
+    lines = export.text.splitlines()
+    columns = lines[0].split(";")
+    rows = [dict(zip(columns, row)) for row in csv.reader(lines[1:], delimiter=";")]
+    defaults = {f"constant_{idx}": "EUR" if idx % 2 else "0,00/-1.000,00" for idx in range(16)}
+    defaults.update({f"column_{idx}": "{Referenz}" for idx in range(4)})
+    defaults.update({f"template_{idx}": "{Buchungstag}-{Referenz}/dd.mm.yyyy" for idx in range(4)})
+    templates = DatumTemplates("(defaults)", defaults)
+
+    def run_formatted():
+        for row in rows:
+            result = {}
+            for field, text in defaults.items():
+                value, format = text.split("/", 1) if "/" in text else (text, "")
+                result[field] = ImportDatum(source_lbl="(defaults)", raw_value=value.format_map(row), format=format)
+
+    def run_compiled():
+        for row in rows:
+            templates(row)
+
+    return [
+        BenchCase(run_formatted, len(rows), dict(defaults=len(defaults), templates="per row")),
+        BenchCase(run_compiled, len(rows), dict(defaults=len(defaults), templates="compiled")),
+    ]
+
+
+@benchmark("field_conversion")
+def bench_field_conversion(ctx: BenchContext) -> list[BenchCase]:
+    """Convert raw number and date strings of the bank export to their native types."""
+    export = generate_bank_export(ctx.size, seed=ctx.seed)
+    rows = list(csv.reader(export.text.splitlines()[1:], delimiter=";"))
+    numbers = [row[4] for row in rows] + [row[5] for row in rows]
+    dates = [row[0] for row in rows] + [row[1] for row in rows]
+    number_spec = DecimalFieldSpec("amount", "")
+    money_spec = MoneyFieldSpec("amount", "")
+    date_spec = DateFieldSpec("tx_date", "")
+
+    def run_numbers():
+        for value in numbers:
+            number_spec.convert(value, "-1.000,00")
+
+    def run_money():
+        for value in numbers:
+            money_spec.convert(value, "-1.000,00")
+
+    def run_dates():
+        for value in dates:
+            date_spec.convert(value, "dd.mm.yyyy")
+
+    return [
+        BenchCase(run_numbers, len(numbers), dict(type="number")),
+        BenchCase(run_money, len(numbers), dict(type="money")),
+        BenchCase(run_dates, len(dates), dict(type="date")),
+    ]
+
+
+@benchmark("money")
+def bench_money(ctx: BenchContext) -> list[BenchCase]:
+    """Evaluate a transform on the amounts of the bank export and sum up the results, as number and as money."""
+    export = generate_bank_export(ctx.size, seed=ctx.seed)
+    rows = list(csv.reader(export.text.splitlines()[1:], delimiter=";"))
+    cases = []
+    for spec in [DecimalFieldSpec("amount", ""), MoneyFieldSpec("amount", "")]:
+        fields = [spec, type(spec)("balance", ""), type(spec)("fee", "")]
+        importable = ImporTable(fields)
+        importable.add_transforms({"fee": "(amount - balance) * 3 + 1"})
+        data = [
+            {"amount": spec.convert(row[4], "-1.000,00"), "balance": spec.convert(row[5], "-1.000,00")} for row in rows
+        ]
+
+        def run(importable=importable, data=data, zero=spec.zero):
+            total = zero
+            for row in data:
+                total += importable.evaluate(importable.transforms["fee"], row)
+
+        cases.append(BenchCase(run, len(data), dict(type=spec.type)))
+    return cases
+
+
+@benchmark("date_formats")
+def bench_date_formats(ctx: BenchContext) -> list[BenchCase]:
+    """Convert dates in each of the common date formats."""
+    spec = DateFieldSpec("tx_date", "")
+    start = datetime.date(2000, 1, 1)
+    dates = [start + datetime.timedelta(days=idx * 7 % 9000) for idx in range(ctx.size)]
+    cases = []
+    for date_format, strptime_format in common_date_formats.items():
+        values = [date.strftime(strptime_format) for date in dates]
+
+        def run(values=values, date_format=date_format):
+            for value in values:
+                spec.convert(value, date_format)
+
+        cases.append(BenchCase(run, len(values), dict(format=date_format)))
+    return cases
+
+
+@benchmark("isin_validation")
+def bench_isin_validation(ctx: BenchContext) -> list[BenchCase]:
+    """Validate the ISIN column of a broker export, value by value and as one batch."""
+    export = generate_broker_export(ctx.size, seed=ctx.seed)
+    isins = [row[2] for row in csv.reader(export.text.splitlines()[1 : ctx.size + 1])]
+
+    def run_values():
+        all(map(is_valid_isin, isins))
+
+    def run_batch():
+        validate_isins(isins)
+
+    return [
+        BenchCase(run_values, len(isins), dict(mode="values")),
+        BenchCase(run_batch, len(isins), dict(mode="batch")),
+    ]
+
+
+@benchmark("template_generation")
+def bench_template_generation(ctx: BenchContext) -> BenchCase:
+    """Analyse bank and broker exports including metadata chunks and derive import spec templates."""
+    fields = target_fields()
+    exports = generate_exports(ctx.size, seed=ctx.seed, files=1, metadata=True)
+    filenames = [export.write(ctx.workdir) for export in exports]
+
+    def run():
+        generator = CsvTemplateGenerator(fields)
+        generator.add_files(filenames)
+        for file_info in generator.input_formats:
+            generator.make_import_spec(file_info, fields)
+
+    return BenchCase(run, ctx.size * len(filenames), dict(files=len(filenames)))
+
+
+@benchmark("onlyif")
+def bench_onlyif(ctx: BenchContext) -> list[BenchCase]:
+    """Check number and date onlyif conditions, parsing them per row versus compiled once."""
+    conditions = {"amount": ">:0,00:number:-1.000,00", "date": ">=/15.12.2023/date/dd.mm.yyyy"}
+    rows = [
+        {"amount": f"{idx % 2000 - 1000},{idx % 100:02d}", "date": f"{idx % 28 + 1:02d}.12.2023"}
+        for idx in range(ctx.size)
+    ]
+    compiled = {field: compile_condition(condition) for field, condition in conditions.items()}
+
+    def run_parsed():
+        for row in rows:
+            all(compile_condition.__wrapped__(condition)(row[field]) for field, condition in conditions.items())
+
+    def run_compiled():
+        for row in rows:
+            check_conditions(compiled, row)
+
+    return [
+        BenchCase(run_parsed, len(rows), dict(conditions="per row")),
+        BenchCase(run_compiled, len(rows), dict(conditions="compiled")),
+    ]
@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import datetime
+import random
+import tracemalloc
+from decimal import Decimal
+
+from benchmarks.common import field_spec_registry
+from benchmarks.common import import_export
+from benchmarks.common import target_fields
+from benchmarks.generator import generate_bank_export
+from benchmarks.generator import generate_broker_export
+from benchmarks.generator import make_isin
+from benchmarks.generator import target_field_specs
+from benchmarks.harness import BenchCase
+from benchmarks.harness import BenchContext
+from benchmarks.harness import benchmark
+from contablo.bloom import BloomFilter
+from contablo.csvimporter import import_csv_with_spec
+from contablo.external import ExternalDeduplicator
+from contablo.importable import ImporTable
+from contablo.importablemerge import ImporTableMerger
+from contablo.importablemerge import LeftRightMatchRule
+from contablo.importablemerge import MatchComparator
+from contablo.importablemerge import dicts_match_by_map
+from contablo.importablemerge import importable_merge
+from contablo.importablemerge import importable_merge_all
+from contablo.importablemerge import importable_merge_two
+from contablo.importspec import ImportSpec
+from tests.test_importablemerge import dicts_match_cases
+
+
+@benchmark("match_compare")
+def bench_match_compare(ctx: BenchContext) -> list[BenchCase]:
+    """Compare rows with dicts_match_by_map() and with a compiled MatchComparator, using the unit test cases."""
+    cases = [case[:-1] for case in dicts_match_cases]
+    comparators = [(MatchComparator(*case[2:]), case[0], case[1]) for case in cases]
+    repeat = max(ctx.size // len(cases), 1)
+
+    def run_function():
+        for _ in range(repeat):
+            for left, right, match_map, ignore_left, ignore_right, ignore_undef in cases:
+                dicts_match_by_map(left, right, match_map, ignore_left, ignore_right, ignore_undef)
+
+    def run_compiled():
+        for _ in range(repeat):
+            for matches, left, right in comparators:
+                matches(left, right)
+
+    return [
+        BenchCase(run_function, repeat * len(cases), dict(func="dicts_match_by_map")),
+        BenchCase(run_compiled, repeat * len(cases), dict(func="MatchComparator")),
+    ]
+
+
+@benchmark("dedup")
+def bench_dedup(ctx: BenchContext) -> list[BenchCase]:
+    """Merge an importable into another one with half of its rows being duplicates, see ImporTable.merge_in()."""
+    registry = field_spec_registry()
+    rows = import_export(generate_broker_export(ctx.size, seed=ctx.seed), ctx.workdir, registry).data_vector
+    half = len(rows) // 2
+    known, incoming = ImporTable(target_fields(registry)), ImporTable(target_fields(registry))
+    known.data_vector = rows[:half] + rows[half + half // 2 :]
+    incoming.data_vector = [dict(row, imported_from="other") for row in rows[half:]]
+    warm = known.clone_empty()
+    warm.data_vector = known.data_vector
+    warm.use_key_filter(BloomFilter(len(rows), 0.01))
+    filename = (ctx.workdir / "dedup.bloom").as_posix()
+    warm.save_key_filter(filename)
+
+    def run(key_filter: str | None = None):
+        target = known.clone_empty()
+        target.data_vector = known.data_vector.copy()
+        if key_filter == "cold":
+            target.use_key_filter(BloomFilter(len(rows), 0.01))
+        elif key_filter == "warm":
+            target.use_key_filter(BloomFilter.load(filename), covers_rows=True)
+        target.merge_in(incoming)
+
+    cases = [
+        BenchCase(lambda key_filter=key_filter: run(key_filter), len(incoming), dict(rows=len(rows), filter=key_filter))
+        for key_filter in [None, "cold", "warm"]
+    ]
+
+    # a few new rows against a long history: the warm filter avoids indexing the history at all
+    history = known.clone_empty()
+    history.data_vector = [dict(row, reference=f"{row['reference']}-{idx}") for idx in range(20) for row in rows]
+    history.use_key_filter(BloomFilter(len(history), 0.0001))
+    history.save_key_filter(filename)
+    new_rows = known.clone_empty()
+    new_rows.data_vector = [dict(row, reference=f"{row['reference']}-new") for row in rows[:100]]
+
+    def run_new(key_filter: str | None = None):
+        target = history.clone_empty()
+        target.data_vector = history.data_vector.copy()
+        if key_filter == "warm":
+            target.use_key_filter(BloomFilter.load(filename), covers_rows=True)
+        target.merge_in(new_rows)
+
+    for key_filter in [None, "warm"]:
+        params = dict(rows=len(history), filter=key_filter, incoming="new")
+        cases.append(BenchCase(lambda key_filter=key_filter: run_new(key_filter), len(new_rows), params))
+    return cases
+
+
+@benchmark("external_dedup")
+def bench_external_dedup(ctx: BenchContext) -> list[BenchCase]:
+    """Drop the duplicates of an archive of eight overlapping exports, with ImporTable.merge_in() or with an
+    ExternalDeduplicator holding all or a tenth of the rows in memory; peak_kb is the memory allocated on the way."""
+    registry = field_spec_registry()
+    rows = import_export(generate_broker_export(ctx.size, seed=ctx.seed), ctx.workdir, registry).data_vector
+    columns = ImporTable(target_fields(registry)).columns
+    copies = 8
+
+    def sources():
+        # each export repeats half of the previous one; rows are created on the fly like those of imported files
+        size = len(rows)
+        for copy in range(copies):
+            start = copy * size // 2
+            yield [dict(rows[v % size], reference=f"{v}") for v in range(start, start + size)]
+
+    def run(max_rows: int | None) -> int:
+        if max_rows is None:
+            target = ImporTable(target_fields(registry))
+            for source in sources():
+                other = target.clone_empty()
+                other.data_vector = source
+                target.merge_in(other)
+            return len(target)
+        with ExternalDeduplicator(columns, max_rows, ctx.workdir.as_posix()) as dedup:
+            for source in sources():
+                dedup.add(source)
+            return sum(1 for _ in dedup)
+
+    cases = []
+    for max_rows in [None, copies * len(rows), len(rows) * copies // 10]:
+        tracemalloc.start()
+        run(max_rows)
+        peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+        params = dict(rows=copies * len(rows), max_rows=max_rows, peak_kb=peak_kb)
+        cases.append(BenchCase(lambda max_rows=max_rows: run(max_rows), copies * len(rows), params))
+    return cases
+
+
+@benchmark("dictionary")
+def bench_dictionary(ctx: BenchContext) -> list[BenchCase]:
+    """Deduplicate two separate imports of a bank export, with and without dictionary encoded text columns."""
+    registry = field_spec_registry()
+    export = generate_bank_export(ctx.size, seed=ctx.seed)
+    filename = export.write(ctx.workdir)
+    spec = ImportSpec(**export.import_spec)
+    cases = []
+    for dictionary in [False, True]:
+        specs = [dict(item, dictionary=dictionary) if item["type"] == "string" else item for item in target_field_specs]
+        factory = ImporTable(registry.make_spec_list(specs)).clone_empty
+        known = import_csv_with_spec(filename, spec, factory, registry)
+        incoming = import_csv_with_spec(filename, spec, factory, registry)
+
+        def run(known=known, incoming=incoming):
+            target = known.clone_empty()
+            target.data_vector = known.data_vector.copy()
+            target.merge_in(incoming)
+
+        cases.append(BenchCase(run, len(incoming), dict(dictionary=dictionary)))
+    return cases
+
+
+def split_rows(importable: ImporTable, columns: list[str]) -> tuple[ImporTable, ImporTable]:
+    """Split each row in two aspects, the second one carrying only the reference and the given columns."""
+    first, second = importable.clone_empty(), importable.clone_empty()
+    for row in importable.iter_data():
+        first.data_vector.append({k: v for k, v in row.items() if k not in columns})
+        second.data_vector.append({k: row[k] for k in ["reference", "imported_from"] + columns if k in row})
+    second.data_vector.reverse()
+    return first, second
+
+
+@benchmark("merge")
+def bench_merge(ctx: BenchContext) -> list[BenchCase]:
+    """Merge two aspects of the same transactions, matched by their reference."""
+    registry = field_spec_registry()
+    importable = import_export(generate_bank_export(ctx.size, seed=ctx.seed), ctx.workdir, registry)
+    target, source = split_rows(importable, ["note", "tx_type"])
+    rules = [LeftRightMatchRule({"reference": "reference"}, ["imported_from"])]
+
+    def run_two():
+        importable_merge_two(source, target, rules, [])
+
+    def run_one():
+        importable_merge(source, target, rules)
+
+    return [
+        BenchCase(run_two, len(source), dict(rows=len(target), func="importable_merge_two")),
+        BenchCase(run_one, len(source), dict(rows=len(target), func="importable_merge")),
+    ]
+
+
+# join sizes are fixed, as the point of the join benchmark is the scaling behaviour at large sizes
+join_sizes = [10_000, 100_000]
+join_workers = 4
+
+
+def make_join_sides(rows: int, seed: int) -> tuple[ImporTable, ImporTable]:
+    """Synthetic target and source rows for joining on the reference, without going through a CSV import.
+
+    Most source rows have a unique partner, some have none and some references are duplicated in the target,
+    so that both unmatched and ambiguous rows are part of the workload.
+    """
+    rng = random.Random(seed)
+    registry = field_spec_registry()
+    target, source = ImporTable(target_fields(registry)), ImporTable(target_fields(registry))
+    start = datetime.date(2020, 1, 1)
+    for idx in range(rows):
+        target.data_vector.append(
+            {
+                "tx_date": start + datetime.timedelta(days=idx // 20),
+                "amount": Decimal(rng.randint(-150000, 80000)) / 100,
+                "reference": f"R{idx:08d}" if idx % 50 else f"R{idx - 1:08d}",
+                "imported_from": "target",
+            }
+        )
+    for idx in rng.sample(range(rows + rows // 20), rows):
+        source.data_vector.append(
+            {"note": f"note {idx}", "tx_type": "WITHDRAW", "reference": f"R{idx:08d}", "imported_from": "source"}
+        )
+    return target, source
+
+
+@benchmark("merge_join")
+def bench_merge_join(ctx: BenchContext) -> list[BenchCase]:
+    """Join two large importables on their reference column with importable_merge_two()."""
+    rules = [LeftRightMatchRule({"reference": "reference"}, ["imported_from"])]
+    cases = []
+    for rows in join_sizes:
+        target, source = make_join_sides(rows, ctx.seed)
+        for workers in [1, join_workers]:
+
+            def run(source=source, target=target, workers=workers):
+                importable_merge_two(source, target, rules, [], workers=workers)
+
+            cases.append(BenchCase(run, len(source), dict(rows=rows, workers=workers)))
+    return cases
+
+
+@benchmark("merge_tolerance")
+def bench_merge_tolerance(ctx: BenchContext) -> list[BenchCase]:
+    """Join bank and broker style rows whose dates differ by up to two days, matched by isin, date and amount."""
+    rng = random.Random(ctx.seed)
+    registry = field_spec_registry()
+    isins = [make_isin(rng) for _ in range(50)]
+    start = datetime.date(2020, 1, 1)
+    rules = [
+        LeftRightMatchRule(
+            {"isin": "isin", "tx_date": "tx_date", "amount": "amount"},
+            ["imported_from", "value_date"],
+            {"tx_date": datetime.timedelta(days=2), "amount": 0.01},
+        )
+    ]
+    cases = []
+    for rows in join_sizes:
+        target, source = ImporTable(target_fields(registry)), ImporTable(target_fields(registry))
+        for idx in range(rows):
+            isin, amount = rng.choice(isins), Decimal(rng.randint(-150000, 80000)) / 100
+            tx_date = start + datetime.timedelta(days=idx // 20)
+            target.data_vector.append(dict(isin=isin, tx_date=tx_date, amount=amount, imported_from="bank"))
+            value_date = tx_date + datetime.timedelta(days=rng.choice([0, 1, 2]))
+            source.data_vector.append(dict(isin=isin, tx_date=value_date, amount=amount, imported_from="broker"))
+        rng.shuffle(source.data_vector)
+
+        def run(source=source, target=target):
+            importable_merge_two(source, target, rules, [])
+
+        cases.append(BenchCase(run, len(source), dict(rows=rows)))
+    return cases
+
+
+@benchmark("merge_state")
+def bench_merge_state(ctx: BenchContext) -> list[BenchCase]:
+    """Load a saved merge state of size * 1000 rows, and continue merging a new export into it."""
+    target, _ = make_join_sides(ctx.size * 1000, ctx.seed)
+    for row in target.iter_data():
+        row["note"] = row["reference"][-2:]
+    merger = ImporTableMerger(target, [LeftRightMatchRule({}, ["imported_from"])])
+    filename = (ctx.workdir / "merge.state").as_posix()
+    merger.save(filename)
+    incoming = target.clone_empty()
+    incoming.data_vector = [dict(row, imported_from="new") for row in target.data_vector[-1000:]]
+
+    def run_load():
+        ImporTableMerger.load(filename, target.clone_empty(), merger.match_rules)
+
+    def run_merge():
+        loaded = ImporTableMerger.load(filename, target.clone_empty(), merger.match_rules)
+        loaded.add(incoming)
+
+    return [
+        BenchCase(run_load, len(target), dict(func="load")),
+        BenchCase(run_merge, len(incoming), dict(func="load_and_merge")),
+    ]
+
+
+@benchmark("merge_convert")
+def bench_merge_convert(ctx: BenchContext) -> list[BenchCase]:
+    """Merge several overlapping imports into one result like 'contablo convert' does."""
+    registry = field_spec_registry()
+    files = 20
+    rows = import_export(generate_broker_export(ctx.size, seed=ctx.seed), ctx.workdir, registry).data_vector
+    importables = []
+    step = max(len(rows) // files, 1)
+    for idx in range(files):
+        importable = ImporTable(target_fields(registry))
+        importable.data_vector = [dict(row, imported_from=f"file{idx}") for row in rows[idx * step : (idx + 2) * step]]
+        importables.append(importable)
+    rules = [LeftRightMatchRule({}, ["imported_from"])]
+
+    def run_fold():
+        result = importables[0].clone_empty()
+        for importable in importables:
+            result = importable_merge(importable, result, rules)
+
+    def run_all():
+        importable_merge_all(importables, importables[0].clone_empty(), rules)
+
+    items = sum(len(importable) for importable in importables)
+    return [
+        BenchCase(run_fold, items, dict(files=files, func="importable_merge")),
+        BenchCase(run_all, items, dict(files=files, func="importable_merge_all")),
+    ]
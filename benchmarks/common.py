@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from benchmarks.generator import GeneratedExport
+from benchmarks.generator import target_field_specs
+from contablo.csvimporter import import_csv_with_spec
+from contablo.fields import FieldSpec
+from contablo.fields import FieldSpecRegistry
+from contablo.fields import add_builtin_fieldspecs_to_registry
+from contablo.importable import ImporTable
+from contablo.importspec import ImportSpec
+
+
+def field_spec_registry() -> FieldSpecRegistry:
+    registry = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(registry)
+    return registry
+
+
+def target_fields(registry: FieldSpecRegistry | None = None) -> list[FieldSpec]:
+    return (registry or field_spec_registry()).make_spec_list(target_field_specs)
+
+
+def import_export(export: GeneratedExport, workdir: Path, registry: FieldSpecRegistry | None = None) -> ImporTable:
+    """Write the generated export to workdir and import it with its own import spec."""
+    registry = registry or field_spec_registry()
+    filename = export.write(workdir)
+    spec = ImportSpec(**export.import_spec)
+    return import_csv_with_spec(filename, spec, ImporTable(target_fields(registry)).clone_empty, registry)
@@ -0,0 +1,252 @@
+"""Seeded generator for synthetic bank and broker CSV exports, together with matching import specs.
+
+The same seed and size always yield the same files, so benchmark results stay comparable across commits.
+"""
+
+from __future__ import annotations
+
+import datetime
+import random
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Any
+
+# Target table used by all generated exports, in the format of tests/fieldspec-banking.json
+target_field_specs: list[dict[str, str]] = [
+    {"name": "tx_date", "type": "date", "help": "Booking date"},
+    {"name": "value_date", "type": "date", "help": "Value date"},
+    {"name": "tx_type", "type": "string", "help": "Transaction type"},
+    {"name": "payee", "type": "string", "help": "Payee or payer"},
+    {"name": "note", "type": "string", "help": "Transaction notes"},
+    {"name": "isin", "type": "string", "help": "Asset ISIN"},
+    {"name": "asset_amount", "type": "number", "help": "Amount of asset units"},
+    {"name": "price", "type": "number", "help": "Price per asset unit"},
+    {"name": "amount", "type": "number", "help": "Amount in currency"},
+    {"name": "balance", "type": "number", "help": "Account balance"},
+    {"name": "currency", "type": "string", "help": "Currency"},
+    {"name": "reference", "type": "string", "help": "Transaction reference"},
+]
+
+payees = [
+    "Stadtwerke Musterstadt",
+    "Bäckerei Müller",
+    "Versicherung AG",
+    "Mobilfunk GmbH",
+    "Arbeitgeber KG",
+    "Supermarkt Süd",
+    "Online Versand",
+    "Hausverwaltung Nord",
+]
+
+broker_types = {"Buy": "BUY", "Sell": "SELL", "Dividend": "DIVIDEND"}
+
+
+@dataclass
+class GeneratedExport:
+    """A synthetic CSV export together with an import spec (as dict) that is able to import it."""
+
+    filename: str
+    encoding: str
+    text: str
+    import_spec: dict[str, Any]
+    rows: int
+    references: list[str] = field(default_factory=list)
+
+    @property
+    def data(self) -> bytes:
+        return self.text.encode(self.encoding)
+
+    def write(self, directory: str | Path) -> str:
+        path = Path(directory) / self.filename
+        path.write_bytes(self.data)
+        return path.as_posix()
+
+
+def format_number(value: float, thou_sep: str, frac_sep: str, digits: int = 2) -> str:
+    text = f"{value:,.{digits}f}"
+    return text.replace(",", "\0").replace(".", frac_sep).replace("\0", thou_sep)
+
+
+def make_isin(rng: random.Random, country: str = "DE") -> str:
+    body = country + "".join(rng.choice("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(9))
+    digits = "".join(str(int(c, 36)) for c in body)
+    total = 0
+    for idx, d in enumerate(reversed(digits)):
+        n = int(d) * (2 if idx % 2 == 0 else 1)
+        total += n // 10 + n % 10
+    return body + str((10 - total % 10) % 10)
+
+
+def bank_match_rules(rules: int) -> list[dict[str, Any]]:
+    """Match rules for the text column of the bank export; each generated text matches exactly one rule."""
+    result = [
+        {
+            "rule": "Kauf {}, Nominale: {asset_amount}, ISIN {isin}",
+            "formats": {"asset_amount": "1.000,00"},
+            "implies": {"tx_type": "BUY"},
+        },
+        {"rule": "Gutschrift Lohn/Gehalt {}", "implies": {"tx_type": "DEPOSIT"}},
+        {
+            "rule": "Dividende {} ISIN {isin}",
+            "implies": {"tx_type": "DIVIDEND"},
+            "onlyif": {"Betrag (EUR)": ">:0,00:number:-1.000,00"},
+        },
+    ]
+    for idx in range(rules):
+        result.append({"rule": f"SEPA-Lastschrift Mandat M{idx:04d} {{}}", "implies": {"tx_type": "WITHDRAW"}})
+    return result
+
+
+def bank_text(rng: random.Random, rules: int, isins: list[str], amount: float) -> str:
+    """Return a booking text that matches exactly one of bank_match_rules(rules)."""
+    if amount > 0:
+        if rng.random() < 0.3:
+            return f"Dividende Ertrag {rng.randint(1, 999)} ISIN {rng.choice(isins)}"
+        return f"Gutschrift Lohn/Gehalt {rng.choice(payees)}"
+    if rng.random() < 0.1:
+        nominale = format_number(rng.randint(1, 500), ".", ",")
+        return f"Kauf Some Asset Inc., Nominale: {nominale}, ISIN {rng.choice(isins)}"
+    return f"SEPA-Lastschrift Mandat M{rng.randrange(max(rules, 1)):04d} Kd-Nr {rng.randint(1000, 9999)}"
+
+
+def generate_bank_export(
+    rows: int,
+    seed: int = 0,
+    rules: int = 50,
+    metadata: bool = False,
+    label: str = "synthetic-bank",
+) -> GeneratedExport:
+    """German style bank export: ';' delimited, dd.mm.yyyy dates and 1.000,00 numbers.
+
+    With metadata, the table is preceded by a chunk of key-value-pairs, like many online banking exports.
+    Note that import_csv_with_spec() only considers the first chunk, so such files are only suitable for template
+    generation.
+    """
+    rng = random.Random(seed)
+    isins = [make_isin(rng) for _ in range(20)]
+    start = datetime.date(2020, 1, 1)
+    balance = 10000.0
+    lines = []
+    if metadata:
+        lines += [
+            "Konto;DE00123456780123456789",
+            f"Zeitraum;{start:%d.%m.%Y} - {start + datetime.timedelta(days=rows // 3):%d.%m.%Y}",
+            f"Kontostand;{format_number(balance, '.', ',')} EUR",
+            "",
+        ]
+    skip_lines = len(lines)
+    lines.append("Buchungstag;Wertstellung;Empfänger;Buchungstext;Betrag (EUR);Saldo (EUR);Referenz")
+    references = []
+    for idx in range(rows):
+        tx_date = start + datetime.timedelta(days=idx // 3)
+        value_date = tx_date + datetime.timedelta(days=rng.choice([0, 0, 0, 1, 2]))
+        amount = round(rng.uniform(-1500, 800), 2) or 1.0
+        balance += amount
+        text = bank_text(rng, rules, isins, amount)
+        reference = f"B{seed:02d}{idx:08d}"
+        references.append(reference)
+        fields = [
+            f"{tx_date:%d.%m.%Y}",
+            f"{value_date:%d.%m.%Y}",
+            f'"{rng.choice(payees)}"',
+            f'"{text}"',
+            f'"{format_number(amount, ".", ",")}"',
+            f'"{format_number(balance, ".", ",")}"',
+            reference,
+        ]
+        lines.append(";".join(fields))
+
+    import_spec = {
+        "label": label,
+        "type": "account",
+        "encoding": "iso-8859-1",
+        "skip_lines": skip_lines,
+        "delimiter": ";",
+        "defaults": {"currency": "EUR"},
+        "columns": [
+            {"label": "Buchungstag", "field": "tx_date", "format": "dd.mm.yyyy"},
+            {"label": "Wertstellung", "field": "value_date", "format": "dd.mm.yyyy"},
+            {"label": "Empfänger", "field": "payee"},
+            {"label": "Buchungstext", "field": "note", "match": bank_match_rules(rules)},
+            {"label": "Betrag (EUR)", "field": "amount", "format": "-1.000,00"},
+            {"label": "Saldo (EUR)", "field": "balance", "format": "-1.000,00"},
+            {"label": "Referenz", "field": "reference"},
+        ],
+    }
+    return GeneratedExport(f"{label}-{seed}.csv", "iso-8859-1", "\n".join(lines) + "\n", import_spec, rows, references)
+
+
+def generate_broker_export(
+    rows: int,
+    seed: int = 0,
+    metadata: bool = False,
+    label: str = "synthetic-broker",
+) -> GeneratedExport:
+    """English style broker export: ',' delimited, yyyy-mm-dd dates and 1,000.00 numbers, with a trailing summary.
+
+    See generate_bank_export() on metadata.
+    """
+    rng = random.Random(seed)
+    isins = [make_isin(rng, rng.choice(["DE", "US", "IE", "LU"])) for _ in range(50)]
+    start = datetime.date(2020, 1, 1)
+    lines = []
+    if metadata:
+        lines += ["Account,U1234567", f"Generated,{start:%Y-%m-%d}", ""]
+    skip_lines = len(lines)
+    lines.append("Date,Type,ISIN,Quantity,Price,Amount,Currency,Reference")
+    references = []
+    for idx in range(rows):
+        tx_type = rng.choice(list(broker_types))
+        quantity = rng.randint(1, 2000) if tx_type != "Dividend" else 0
+        price = round(rng.uniform(1, 2500), 2)
+        amount = quantity * price if tx_type != "Dividend" else round(rng.uniform(1, 500), 2)
+        amount = -amount if tx_type == "Buy" else amount
+        reference = f"K{seed:02d}{idx:08d}"
+        references.append(reference)
+        fields = [
+            f"{start + datetime.timedelta(days=idx // 5):%Y-%m-%d}",
+            tx_type,
+            rng.choice(isins),
+            f'"{format_number(quantity, ",", ".")}"',
+            f'"{format_number(price, ",", ".")}"',
+            f'"{format_number(amount, ",", ".")}"',
+            rng.choice(["EUR", "EUR", "USD"]),
+            reference,
+        ]
+        lines.append(",".join(fields))
+    lines += ["", "Total,,,,,,,", f"Rows,{rows},,,,,,"]
+
+    import_spec = {
+        "label": label,
+        "type": "depot",
+        "encoding": "us-ascii",
+        "skip_lines": skip_lines,
+        "delimiter": ",",
+        "columns": [
+            {"label": "Date", "field": "tx_date", "format": "yyyy-mm-dd"},
+            {"label": "Type", "field": "tx_type", "map": broker_types},
+            {"label": "ISIN", "field": "isin"},
+            {"label": "Quantity", "field": "asset_amount", "format": "1,000.00"},
+            {"label": "Price", "field": "price", "format": "1,000.00"},
+            {"label": "Amount", "field": "amount", "format": "-1,000.00"},
+            {"label": "Currency", "field": "currency"},
+            {"label": "Reference", "field": "reference"},
+        ],
+    }
+    return GeneratedExport(f"{label}-{seed}.csv", "us-ascii", "\n".join(lines) + "\n", import_spec, rows, references)
+
+
+def generate_exports(
+    rows: int,
+    seed: int = 0,
+    files: int = 1,
+    rules: int = 50,
+    metadata: bool = False,
+) -> list[GeneratedExport]:
+    """Generate pairs of bank and broker exports, each file with its own seed derived from the given one."""
+    result = []
+    for idx in range(files):
+        result.append(generate_bank_export(rows, seed=seed * 1000 + idx, rules=rules, metadata=metadata))
+        result.append(generate_broker_export(rows, seed=seed * 1000 + idx, metadata=metadata))
+    return result
@@ -0,0 +1,144 @@
+"""Minimal benchmark registry and runner that records results to JSON for comparison across commits."""
+
+from __future__ import annotations
+
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import time
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Any
+from typing import Callable
+
+
+@dataclass
+class BenchContext:
+    """Parameters passed to each benchmark's setup function."""
+
+    size: int
+    seed: int
+    workdir: Path
+
+
+@dataclass
+class BenchCase:
+    """A prepared benchmark: run() is timed, items is the number of processed items per run."""
+
+    run: Callable[[], Any]
+    items: int
+    params: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class BenchResult:
+    name: str
+    params: dict[str, Any]
+    items: int
+    timings: list[float]
+
+    @property
+    def best(self) -> float:
+        return min(self.timings)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.timings)
+
+    def as_dict(self) -> dict[str, Any]:
+        result = asdict(self)
+        result.update(best=self.best, median=self.median, items_per_second=self.items / self.best if self.best else 0)
+        return result
+
+
+registry: dict[str, Callable[[BenchContext], BenchCase | list[BenchCase]]] = {}
+
+
+def benchmark(name: str):
+    """Register a setup function under the given name.
+
+    The setup function receives a BenchContext and returns one or several BenchCase objects; setup time is excluded
+    from the measurement.
+    """
+
+    def decorator(func: Callable[[BenchContext], BenchCase | list[BenchCase]]):
+        assert name not in registry, f"Benchmark {name} is already registered"
+        registry[name] = func
+        return func
+
+    return decorator
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_benchmarks(
+    context: BenchContext,
+    names: list[str] | None = None,
+    repeat: int = 3,
+    report: Callable[[BenchResult], None] | None = None,
+) -> list[BenchResult]:
+    results = []
+    for name, setup in registry.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        cases = setup(context)
+        for case in cases if isinstance(cases, list) else [cases]:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                case.run()
+                timings.append(time.perf_counter() - start)
+            result = BenchResult(name, case.params, case.items, timings)
+            results.append(result)
+            if report is not None:
+                report(result)
+    return results
+
+
+def make_report(context: BenchContext, results: list[BenchResult]) -> dict[str, Any]:
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "size": context.size,
+            "seed": context.seed,
+        },
+        "results": [result.as_dict() for result in results],
+    }
+
+
+def result_key(result: dict[str, Any]) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def compare_reports(baseline: dict[str, Any], current: dict[str, Any]) -> list[str]:
+    """Return lines comparing the best timings of two reports, see make_report()."""
+    known = {result_key(r): r for r in baseline["results"]}
+    lines = [f"Comparing to revision {baseline['meta'].get('revision') or '?'}:"]
+    for result in current["results"]:
+        key = result_key(result)
+        if key not in known:
+            lines.append(f"  {key:60s} {result['best']:10.4f}s   (new)")
+            continue
+        ratio = result["best"] / known[key]["best"] if known[key]["best"] else float("inf")
+        lines.append(f"  {key:60s} {result['best']:10.4f}s   x{ratio:.2f}")
+    return lines
+
+
+def load_report(filename: str) -> dict[str, Any]:
+    with open(filename) as f:
+        return json.load(f)
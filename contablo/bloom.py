@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import math
+import os
+import struct
+from decimal import Decimal
+from decimal import InvalidOperation
+from typing import Any
+
+from contablo.fixedpoint import FixedPoint
+
+
+class BloomFilter:
+    """Probabilistic set of row digests, answering "definitely not contained" without false negatives.
+
+    The filter is sized for an expected number of entries and a false-positive rate, see row_digest() for the
+    entries.  It can be saved and loaded, so that a filter built for a long history does not have to be rebuilt.
+    """
+
+    magic = b"contablo-bloom-1\n"
+    header = struct.Struct("<QQQd")
+
+    def __init__(self, capacity: int, fp_rate: float = 0.01) -> None:
+        if capacity < 1 or not 0 < fp_rate < 1:
+            raise ValueError(f"Invalid bloom filter parameters {capacity=} and {fp_rate=}")
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.size = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes) -> list[int]:
+        # double hashing, see Kirsch and Mitzenmacher: "Less Hashing, Same Performance"
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:16], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, digest: bytes) -> None:
+        for pos in self._positions(digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+    def save(self, filename: str) -> None:
+        temp_name = f"{filename}.{os.getpid()}.tmp"
+        try:
+            with open(temp_name, "wb") as f:
+                f.write(self.magic)
+                f.write(self.header.pack(self.capacity, self.hashes, self.count, self.fp_rate))
+                f.write(self.bits)
+            os.replace(temp_name, filename)
+        finally:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+
+    @classmethod
+    def load(cls, filename: str) -> BloomFilter:
+        with open(filename, "rb") as f:
+            if f.read(len(cls.magic)) != cls.magic:
+                raise ValueError(f"{filename} is not a contablo bloom filter.")
+            capacity, hashes, count, fp_rate = cls.header.unpack(f.read(cls.header.size))
+            result = cls(capacity, fp_rate)
+            bits = f.read()
+        if hashes != result.hashes or len(bits) != len(result.bits):
+            raise ValueError(f"{filename} is corrupt.")
+        result.bits[:] = bits
+        result.count = count
+        return result
+
+
+def _normalized(value: Any) -> str:
+    # equal values must yield the same text, otherwise the filter would miss duplicates
+    if value is None or isinstance(value, str):
+        return repr(value)
+    if isinstance(value, FixedPoint):
+        value = value.to_decimal()
+    if isinstance(value, (bool, int, float, Decimal)):
+        try:
+            number = value if isinstance(value, Decimal) else Decimal(value)
+            return "n:0" if number == 0 else f"n:{number.normalize()}"
+        except (InvalidOperation, ValueError, OverflowError):
+            return f"n:{value}"
+    if isinstance(value, datetime.datetime):
+        if value.utcoffset() is not None:
+            value = value.astimezone(datetime.timezone.utc)
+        return f"dt:{value.isoformat()}"
+    if isinstance(value, (datetime.date, datetime.time)):
+        return f"{type(value).__name__}:{value.isoformat()}"
+    # unknown types share a digest per type, which only costs false positives
+    return type(value).__qualname__
+
+
+def row_digest(row: dict[str, Any], columns: list[str]) -> bytes:
+    """Stable digest of the row's values in the given columns, equal for rows matched by dicts_equal_in_keys()."""
+    text = "\x1f".join(f"{column}\x1e{_normalized(row[column])}" for column in columns if column in row)
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
@@ -1,44 +1,80 @@
 import csv
+import functools
 import json
 import logging
+import os
 from pathlib import Path
+from typing import Callable
 
 import click
 import pydantic
 
+from contablo.csv_helper import iter_sources
 from contablo.csvimporter import import_csv_with_spec_detection
 from contablo.csvtmplgen import CsvTemplateGenerator
+from contablo.external import ExternalDeduplicator
+from contablo.fields import FieldSpec
 from contablo.fields import FieldSpecRegistry
 from contablo.fields import add_builtin_fieldspecs_to_registry
 from contablo.importable import ImporTable
+from contablo.importablemerge import ImporTableMerger
 from contablo.importablemerge import LeftRightMatchRule
-from contablo.importablemerge import importable_merge
 from contablo.importspec import ImportSpec
+from contablo.importspec import ImportSpecCache
+from contablo.importspec import ImportSpecHeader
 from contablo.importspec import ImportSpecRegistry
+from contablo.profiling import ImportProfile
+from contablo.profiling import profile_scope
+from contablo.profiling import profiling
+from contablo.profiling import stage
+from contablo.serve import ImportService
+from contablo.serve import default_max_request_bytes
+from contablo.serve import make_server
+from contablo.watch import DropFolderWatcher
 
 logger = logging.getLogger(__file__)
 log_levels = [logging.ERROR, logging.WARNING, logging.INFO, logging.DEBUG]
 
 
-def fill_import_spec_registry(dir_or_file: str, registry: ImportSpecRegistry) -> None:
+def fill_import_spec_registry(dir_or_file: str, registry: ImportSpecRegistry, cache_dir: str | None = None) -> None:
+    """Add the import specs of the given config file or directory; with a cache_dir, see ImportSpecCache.
+
+    Only the headers of the specs are read right away, see ImportSpecHeader; the specs are validated once a file may
+    need them.
+    """
     import glob
 
     if not dir_or_file:
         return
     path = Path(dir_or_file)
+    cache = ImportSpecCache(cache_dir, dir_or_file) if cache_dir else None
 
     file_list = glob.glob((path / "*.json").as_posix()) if path.is_dir() else [dir_or_file]
     for import_config_file in file_list:
+        if cache is not None and (cached := cache.get(import_config_file)) is not None:
+            digest, header = cached
+            load = functools.partial(load_import_spec, import_config_file, None, cache, digest)
+            registry.add_lazy_import_spec(header, import_config_file, load)
+            continue
 
         try:
-            with open(import_config_file) as f:
-                data = json.load(f)
-                if not all([key in data for key in ["label", "encoding", "type"]]):
-                    logger.warning(f"Skipping {import_config_file}: Not a valid ImportSpec configuration.")
-                    continue
-
-                config = ImportSpec(**data)
-                registry.add_import_spec(config, import_config_file)
+            with open(import_config_file, "rb") as f:
+                content = f.read()
+            data = json.loads(content)
+            if not all([key in data for key in ["label", "encoding", "type"]]):
+                logger.warning(f"Skipping {import_config_file}: Not a valid ImportSpec configuration.")
+                continue
+
+            try:
+                header = ImportSpecHeader.from_data(data)
+            except TypeError:
+                registry.add_import_spec(ImportSpec(**data), import_config_file)
+                continue
+            digest = ImportSpecCache.digest(content) if cache is not None else None
+            load = functools.partial(load_import_spec, import_config_file, data, cache, digest)
+            registry.add_lazy_import_spec(header, import_config_file, load)
+            if cache is not None:
+                cache.put(import_config_file, digest, header)
 
         except json.JSONDecodeError:
             logger.warning(f"Skipping {import_config_file}: Not a valid JSON file.")
@@ -50,6 +86,42 @@ def fill_import_spec_registry(dir_or_file: str, registry: ImportSpecRegistry) ->
         except Exception as e:
             logger.exception(e)
 
+    if cache is not None:
+        try:
+            cache.save()
+        except OSError as e:
+            logger.warning(f"Could not save import spec cache: {e}")
+
+
+def load_import_spec(
+    filename: str,
+    data: dict | None = None,
+    cache: ImportSpecCache | None = None,
+    digest: bytes | None = None,
+) -> ImportSpec:
+    """Validate the import spec from the config file or its already parsed data, using the cache if given."""
+    if cache is not None and (spec := cache.load_spec(digest)) is not None:
+        return spec
+    if data is None:
+        with open(filename, "rb") as f:
+            content = f.read()
+        if cache is not None and ImportSpecCache.digest(content) != digest:
+            cache = None  # changed since its header was read, so the spec must not be cached under the old digest
+        data = json.loads(content)
+    spec = ImportSpec(**data)
+    if cache is not None:
+        cache.save_spec(digest, spec)
+    return spec
+
+
+def cache_dir_option(func):
+    return click.option(
+        "--cache-dir",
+        type=click.Path(file_okay=False, dir_okay=True),
+        envvar="CONTABLO_CACHE_DIR",
+        help="Cache validated import specs in this directory to speed up later runs (env: CONTABLO_CACHE_DIR).",
+    )(func)
+
 
 @click.group(context_settings=dict(help_option_names=["-h", "--help"]))
 @click.option("-v", "--verbose", count=True)
@@ -89,11 +161,18 @@ def cli(verbose):
     default=True,
     help="Decide wheter to include samples in the template or not",
 )
+@cache_dir_option
 @click.argument("csv-files", nargs=-1)
 def mk_import_tmpl(
-    verbose: int | None, csv_files: list[str], target_spec: str, config: str, output_base: str, samples: bool
+    verbose: int | None,
+    csv_files: list[str],
+    target_spec: str,
+    config: str,
+    output_base: str,
+    samples: bool,
+    cache_dir: str | None,
 ):
-    """Create an input configuration template for the given CSV file(s)."""
+    """Create an input configuration template for the given CSV file(s), which may be compressed or zip archives."""
     if verbose is not None:
         logging.getLogger().setLevel(log_levels[min(verbose, len(log_levels) - 1)])
 
@@ -108,7 +187,7 @@ def mk_import_tmpl(
             fields = fieldspecs.make_spec_list(json.load(target_spec_file))
 
     registry = ImportSpecRegistry()
-    fill_import_spec_registry(config, registry)
+    fill_import_spec_registry(config, registry, cache_dir)
 
     csv_files = list(csv_files)
 
@@ -175,36 +254,366 @@ cli.add_command(mk_schema)
     type=str,
     help="Export merged imported data to this file.",
 )
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Print a per-file and per-spec breakdown of time spent in each import stage.",
+)
+@click.option(
+    "--profile-json",
+    type=str,
+    help="Write the per-file and per-spec stage timings and counters to this JSON file.",
+)
+@click.option(
+    "--state",
+    type=str,
+    help="Merge into the state saved by a previous run, if the file exists, and save the updated state to it.",
+)
+@cache_dir_option
+@click.option(
+    "--spill-rows",
+    type=click.IntRange(min=1),
+    help="Only drop duplicate rows instead of merging matching ones, keeping at most this many rows in memory and "
+    "the others in temporary files.",
+)
 @click.argument("csv-files", nargs=-1, required=True, type=click.Path(exists=True, file_okay=True, dir_okay=False))
-def convert(verbose: int | None, csv_files: list[str], target_spec: str, config: str, output_file: str):
-    """Load the given CSV file(s) based on their configurations and write resulting table(s)."""
+def convert(
+    verbose: int | None,
+    csv_files: list[str],
+    target_spec: str,
+    config: str,
+    output_file: str,
+    profile: bool,
+    profile_json: str,
+    state: str | None,
+    cache_dir: str | None,
+    spill_rows: int | None,
+):
+    """Load the given CSV file(s) based on their configurations and write resulting table(s).
+
+    CSV files may be compressed with gzip, bz2 or xz, or be members of zip archives.
+    """
     if verbose is not None:
         logging.getLogger().setLevel(log_levels[min(verbose, len(log_levels) - 1)])
+    if spill_rows is not None and state is not None:
+        raise click.UsageError("--spill-rows cannot be combined with --state.")
 
-    registry = ImportSpecRegistry()
-    fill_import_spec_registry(config, registry)
+    if not (profile or profile_json):
+        convert_files(csv_files, target_spec, config, output_file, state, cache_dir, spill_rows)
+        return
+
+    with profiling(ImportProfile()) as import_profile:
+        convert_files(csv_files, target_spec, config, output_file, state, cache_dir, spill_rows)
 
+    if profile:
+        print("Import profile:")
+        for line in import_profile.format_table():
+            print(f"  {line}")
+    if profile_json:
+        with open(profile_json, "w") as f:
+            json.dump(import_profile.as_dict(), f, indent=2)
+
+
+def load_target_fields(target_spec: str) -> tuple[list[FieldSpec], FieldSpecRegistry]:
+    """The fields of the target table, together with the registry of field types they were created from."""
     # Initialize target table's field specs from json file. See specs/fieldspec-banking.json for an example.
     # Refer to contablo.fields.ImportSpec subclasses for available types and attributes.
     with open(target_spec) as target_spec_file:
         field_spec_registry = FieldSpecRegistry()
         add_builtin_fieldspecs_to_registry(field_spec_registry)
         fields = field_spec_registry.make_spec_list(json.load(target_spec_file))
-
-    result = ImporTable(fields)
-    for csv_file in csv_files:
-        importable = import_csv_with_spec_detection(csv_file, registry, result.clone_empty, field_spec_registry)
-        if not importable:
-            print(f"--- importing from {csv_file} yields nothing ---")
-            continue
-        result = importable_merge(importable, result, [LeftRightMatchRule({}, ["imported_from"])])
-        print(f"--- importing from {csv_file} with {len(importable)} entries results in {len(result)} after merge ---")
+    return fields, field_spec_registry
+
+
+def load_merger(target_spec: str, state: str | None = None) -> tuple[ImporTableMerger, FieldSpecRegistry]:
+    """The merger for the target table, continuing with the state saved by a previous run if given and existing."""
+    fields, field_spec_registry = load_target_fields(target_spec)
+    match_rules = [LeftRightMatchRule({}, ["imported_from"])]
+    if state is not None and os.path.exists(state):
+        merger = ImporTableMerger.load(state, ImporTable(fields), match_rules)
+        print(f"--- continuing with {len(merger)} entries from {state} ---")
+    else:
+        merger = ImporTableMerger(ImporTable(fields), match_rules)
+    return merger, field_spec_registry
+
+
+def write_replacing(filename: str, write: Callable[[str], None]) -> None:
+    """Write a file by calling write() with a temporary name, replacing the file only once it is complete."""
+    temp_name = f"{filename}.{os.getpid()}.tmp"
+    try:
+        write(temp_name)
+        os.replace(temp_name, filename)
+    finally:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+
+
+def save_merger(merger: ImporTableMerger, output_file: str | None = None, state: str | None = None) -> None:
+    """Save the state and export the merged data, each replacing the previous file only once complete."""
+    result = merger.result()
+    if state is not None:
+        merger.save(state, result)
 
     if output_file is not None:
         print("Exporting merged data...")
-        with open(output_file, "w") as csv_file:
-            csv_writer = csv.writer(csv_file)
-            csv_writer.writerows(result.get_flat_table(convert_func=str, fallback="", include_header=True))
+
+        def export(filename: str) -> None:
+            with open(filename, "w") as csv_file:
+                csv_writer = csv.writer(csv_file)
+                csv_writer.writerows(result.get_flat_table(convert_func=str, fallback="", include_header=True))
+
+        write_replacing(output_file, export)
+
+
+def convert_files(
+    csv_files: list[str],
+    target_spec: str,
+    config: str,
+    output_file: str,
+    state: str | None = None,
+    cache_dir: str | None = None,
+    spill_rows: int | None = None,
+) -> None:
+    """Import and merge the given CSV files, optionally exporting the result to output_file.
+
+    With a state file, merging continues with the result of a previous run, and the new result is saved back to it.
+    With spill_rows, see dedup_files().
+    """
+    registry = ImportSpecRegistry()
+    with stage("spec_loading"):
+        fill_import_spec_registry(config, registry, cache_dir)
+    if spill_rows is not None:
+        dedup_files(csv_files, registry, target_spec, output_file, spill_rows)
+        return
+
+    merger, field_spec_registry = load_merger(target_spec, state)
+    for name, source, provenance in iter_sources(csv_files):
+        with profile_scope(file=name):
+            importable = import_csv_with_spec_detection(
+                source, registry, merger.target.clone_empty, field_spec_registry, name, provenance
+            )
+            if not importable:
+                print(f"--- importing from {name} yields nothing ---")
+                continue
+            merger.add(importable)
+        print(f"--- importing from {name} with {len(importable)} entries results in {len(merger)} after merge ---")
+    save_merger(merger, output_file, state)
+
+
+def dedup_files(
+    csv_files: list[str],
+    registry: ImportSpecRegistry,
+    target_spec: str,
+    output_file: str | None,
+    max_rows: int,
+) -> None:
+    """Import the given CSV files and drop duplicate rows like ImporTable.merge_in(), see ExternalDeduplicator.
+
+    At most max_rows rows of the result are kept in memory, plus the rows of the file being imported.
+    """
+    fields, field_spec_registry = load_target_fields(target_spec)
+    target = ImporTable(fields)
+    columns = target.columns
+    with ExternalDeduplicator(columns, max_rows) as dedup:
+        for name, source, provenance in iter_sources(csv_files):
+            with profile_scope(file=name):
+                importable = import_csv_with_spec_detection(
+                    source, registry, target.clone_empty, field_spec_registry, name, provenance
+                )
+                if not importable:
+                    print(f"--- importing from {name} yields nothing ---")
+                    continue
+                dedup.add(importable.iter_data())
+            print(f"--- importing from {name} with {len(importable)} entries ---")
+        if output_file is None:
+            return
+        rows = ([str(value) if value is not None else "" for value in map(row.get, columns)] for row in dedup)
+
+        def export(filename: str) -> None:
+            with open(filename, "w") as csv_file:
+                csv_writer = csv.writer(csv_file)
+                csv_writer.writerow(columns)
+                csv_writer.writerows(rows)
+
+        print("Exporting deduplicated data...")
+        write_replacing(output_file, export)
 
 
 cli.add_command(convert)
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option("-v", "--verbose", count=True, default=None)
+@click.option(
+    "-t",
+    "--target-spec",
+    required=True,
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    help="JSON file with target table specs.",
+)
+@click.option(
+    "-c",
+    "--config",
+    type=click.Path(exists=True, file_okay=True, dir_okay=True),
+    help="Location of the import spec. May be one single json file or a directory with several config files.",
+)
+@click.option(
+    "-o",
+    "--output-file",
+    type=str,
+    help="Export merged imported data to this file after each import.",
+)
+@click.option(
+    "--state",
+    type=str,
+    help="Merge into the state saved by a previous run, if the file exists, and save the updated state to it.",
+)
+@cache_dir_option
+@click.option("-p", "--pattern", default="*.csv", show_default=True, help="Import the files matching this pattern.")
+@click.option("--interval", type=float, default=2.0, show_default=True, help="Seconds between polls of the folder.")
+@click.option(
+    "--debounce",
+    type=float,
+    default=2.0,
+    show_default=True,
+    help="Seconds a file must stay unchanged before it is imported.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=2,
+    show_default=True,
+    help="Maximum number of files imported concurrently.",
+)
+@click.option(
+    "--write-interval",
+    type=float,
+    default=30.0,
+    show_default=True,
+    help="Minimum seconds between writes of the state and output files; pending merges are written on stop.",
+)
+@click.argument("folder", type=click.Path(exists=True, file_okay=False, dir_okay=True))
+def watch(
+    verbose: int | None,
+    folder: str,
+    target_spec: str,
+    config: str,
+    output_file: str,
+    state: str | None,
+    cache_dir: str | None,
+    pattern: str,
+    interval: float,
+    debounce: float,
+    jobs: int,
+    write_interval: float,
+):
+    """Import CSV files as they appear or change in the given folder, keeping the merged result up to date.
+
+    Files already in the folder are imported on start.  A changed file is merged again, without removing the rows of
+    its previous version.  Stop with Ctrl-C.
+    """
+    if verbose is not None:
+        logging.getLogger().setLevel(log_levels[min(verbose, len(log_levels) - 1)])
+
+    registry = ImportSpecRegistry()
+    fill_import_spec_registry(config, registry, cache_dir)
+    merger, field_spec_registry = load_merger(target_spec, state)
+
+    def import_file(filename: str) -> ImporTable | None:
+        return import_csv_with_spec_detection(filename, registry, merger.target.clone_empty, field_spec_registry)
+
+    watcher = DropFolderWatcher(
+        folder,
+        import_file,
+        merger,
+        on_merged=lambda: save_merger(merger, output_file, state),
+        pattern=pattern,
+        debounce=debounce,
+        max_imports=jobs,
+        write_interval=write_interval,
+    )
+    print(f"Watching {os.path.join(folder, pattern)}, press Ctrl-C to stop.")
+    try:
+        watcher.run(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+cli.add_command(watch)
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option("-v", "--verbose", count=True, default=None)
+@click.option(
+    "-t",
+    "--target-spec",
+    required=True,
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    help="JSON file with target table specs.",
+)
+@click.option(
+    "-c",
+    "--config",
+    type=click.Path(exists=True, file_okay=True, dir_okay=True),
+    help="Location of the import spec. May be one single json file or a directory with several config files.",
+)
+@cache_dir_option
+@click.option("-s", "--socket", "socket_path", type=str, help="Listen on this Unix domain socket.")
+@click.option("-p", "--port", type=int, help="Listen on this TCP port of localhost, if no socket is given.")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Maximum number of connections served concurrently.",
+)
+@click.option(
+    "--max-request-bytes",
+    type=click.IntRange(min=1),
+    default=default_max_request_bytes,
+    show_default=True,
+    help="Maximum size of the CSV data sent with a request.",
+)
+@click.option(
+    "--allow-dir",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True),
+    help="Only convert files in this directory when requested by path. Without, only requests on a Unix domain socket "
+    "may name files.",
+)
+def serve(
+    verbose: int | None,
+    target_spec: str,
+    config: str,
+    cache_dir: str | None,
+    socket_path: str | None,
+    port: int | None,
+    jobs: int,
+    max_request_bytes: int,
+    allow_dir: str | None,
+):
+    """Convert CSV files or data sent to a local socket, keeping the import specs loaded between requests.
+
+    See contablo.serve for the protocol and request_import() for a client.  Stop with Ctrl-C.
+    """
+    if verbose is not None:
+        logging.getLogger().setLevel(log_levels[min(verbose, len(log_levels) - 1)])
+    if socket_path is None and port is None:
+        raise click.UsageError("Either --socket or --port is required.")
+
+    registry = ImportSpecRegistry()
+    fill_import_spec_registry(config, registry, cache_dir)
+    fields, field_spec_registry = load_target_fields(target_spec)
+    service = ImportService(registry, field_spec_registry, fields)
+    server = make_server(service, socket_path, port, jobs, max_request_bytes, allow_dir)
+    with server:
+        print(f"Serving on {server.server_address}, press Ctrl-C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+cli.add_command(serve)
@@ -1,5 +1,9 @@
+from typing import Iterable
+
 import iso3166
 
+isin_country_codes = frozenset(iso3166.countries_by_alpha2) | {"XS", "EU"}
+
 
 def is_luhn_valid(n: str) -> bool:
     # from https://stackoverflow.com/questions/21079439/implementation-of-luhn-formula
@@ -7,19 +11,52 @@ def is_luhn_valid(n: str) -> bool:
     return (sum(r[0::2]) + sum(sum(divmod(d * 2, 10)) for d in r[1::2])) % 10 == 0
 
 
+def _isin_luhn_table() -> dict[str, tuple[tuple[int, int], tuple[int, int]]]:
+    # Letters count as two digits (A=10 .. Z=35), so the Luhn weight of the following characters depends on the
+    # number of digits seen so far.  For each character and parity of that number, the table yields the character's
+    # contribution to the checksum and the parity after it, which reduces the check to one lookup per character.
+    doubled = [0, 2, 4, 6, 8, 1, 3, 5, 7, 9]
+    table = {}
+    for value, char in enumerate("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"):
+        entries = []
+        for parity in (0, 1):
+            total, p = 0, parity
+            for digit in reversed(str(value)):
+                total += doubled[int(digit)] if p else int(digit)
+                p ^= 1
+            entries.append((total, p))
+        table[char] = (entries[0], entries[1])
+        if char.isalpha():
+            table[char.lower()] = table[char]
+    return table
+
+
+_isin_luhn = _isin_luhn_table()
+
+
 def is_valid_isin(isin: str) -> bool:
     # https://de.wikipedia.org/wiki/Internationale_Wertpapierkennnummer
-    if len(isin) != 12:
+    if len(isin) != 12 or isin[0:2].upper() not in isin_country_codes:
         return False
-    isin = isin.upper()
-    cc = isin[0:2]
-    if cc not in ["XS", "EU"]:
-        try:
-            iso3166.countries.get(cc)
-        except KeyError:
+    table = _isin_luhn
+    total, parity = 0, 0
+    for char in reversed(isin):
+        entry = table.get(char)
+        if entry is None:
             return False
-    code = "".join([c if c.isdigit() else str(10 + ord(c) - ord("A")) for c in list(isin)])
-    # print(isin, cc, nsin, cs, code)
-    if not is_luhn_valid(code):
-        return False
-    return True
+        add, parity = entry[parity]
+        total += add
+    return total % 10 == 0
+
+
+def validate_isins(values: Iterable[str]) -> int:
+    """Check a batch of values, returning a bitmask with bit i set if the i-th value is a valid ISIN."""
+    known: dict[str, str] = {}
+    bits = []
+    for value in values:
+        bit = known.get(value)
+        if bit is None:
+            bit = known[value] = "1" if is_valid_isin(value) else "0"
+        bits.append(bit)
+    bits.reverse()
+    return int("".join(bits), 2) if bits else 0
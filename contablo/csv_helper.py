@@ -1,10 +1,25 @@
 from __future__ import annotations
 
+import bz2
+import ctypes
+import functools
+import gzip
+import io
 import logging
+import lzma
+import os
+import zipfile
+import zlib
+from typing import BinaryIO
+from typing import Iterable
+from typing import Iterator
+from typing import Union
 
 import magic
 import pydantic
 
+from contablo.profiling import stage
+
 logger = logging.getLogger(__file__)
 
 
@@ -12,30 +27,167 @@ class UnknownEncodingError(Exception):
     pass
 
 
-def get_file_encoding(filename: str) -> str:
-    """tries to figure out the correct encoding of the given file"""
+TextSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+
+def is_buffer(source: TextSource) -> bool:
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+
+def read_source(source: TextSource) -> bytes | bytearray | memoryview:
+    """Return the content of a path or binary file-like object; buffers are returned as they are, without copy."""
+    if is_buffer(source):
+        return source
+    if hasattr(source, "read"):
+        return source.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def source_name(source: TextSource, default: str = "<buffer>") -> str:
+    """Name of the source for reporting and provenance, e.g. the file name."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    name = getattr(source, "name", None)
+    return name if isinstance(name, str) else default
+
 
-    with open(filename, "rb") as f:
-        blob = f.read()
-        m = magic.Magic(mime_encoding=True)
-        encoding = m.from_buffer(blob)
+archive_separator = "!"  # between the name of an archive and that of a member, e.g. "bundle.zip!2024/01.csv"
+_compression_magic = {b"\x1f\x8b": gzip.open, b"BZh": bz2.open, b"\xfd7zXZ\x00": lzma.open}
+_read_errors = (OSError, EOFError, zipfile.BadZipFile, RuntimeError, NotImplementedError, lzma.LZMAError, zlib.error)
+
+
+def provenance_name(path: str, member: str | None = None) -> str:
+    """Short name of a file, or of a member of an archive, for the imported_from provenance of its rows."""
+    basename = path.split("/")[-1]
+    return basename if member is None else f"{basename}{archive_separator}{member}"
+
+
+def _is_csv_member(info: zipfile.ZipInfo) -> bool:
+    name = info.filename
+    return not info.is_dir() and name.lower().endswith(".csv") and not name.startswith("__MACOSX/")
+
+
+def _iter_zip_members(name: str) -> Iterator[tuple[str, TextSource, str]]:
+    try:
+        archive = zipfile.ZipFile(name)
+    except _read_errors as e:
+        logger.error(f"Cannot read {name}: {e}")
+        return
+    with archive:
+        for info in archive.infolist():
+            if not _is_csv_member(info):
+                continue
+            member_name = f"{name}{archive_separator}{info.filename}"
+            try:
+                with stage("decompress"):
+                    data = archive.read(info)
+            except _read_errors as e:  # e.g. encrypted or corrupt
+                logger.error(f"Cannot read {member_name}: {e}")
+                continue
+            yield member_name, data, provenance_name(name, info.filename)
+
+
+def iter_sources(paths: Iterable[str | os.PathLike]) -> Iterator[tuple[str, TextSource, str]]:
+    """Yield name, source and provenance name of the CSV data in the given files, see import_csv_with_spec_detection().
+
+    Plain files are yielded as they are.  Files compressed with gzip, bz2 or xz are yielded decompressed, under their
+    own name, and zip archives with each of their CSV members, named like "bundle.zip!2024/01.csv".  The data is
+    decompressed in memory and never written to disk; like a plain file, it is read as a whole for encoding detection.
+    Files and members that cannot be read are logged as errors and skipped.
+    """
+    for path in paths:
+        name = os.fspath(path)
+        try:
+            with open(path, "rb") as f:
+                head = f.read(6)
+        except OSError as e:
+            logger.error(f"Cannot read {name}: {e}")
+            continue
+        if head.startswith((b"PK\x03\x04", b"PK\x05\x06")):
+            yield from _iter_zip_members(name)
+            continue
+        opener = next((opener for prefix, opener in _compression_magic.items() if head.startswith(prefix)), None)
+        if opener is None:
+            yield name, path, provenance_name(name)
+            continue
+        try:
+            with stage("decompress"), opener(path, "rb") as f:
+                data = f.read()
+        except _read_errors as e:  # e.g. truncated
+            logger.error(f"Cannot read {name}: {e}")
+            continue
+        yield name, data, provenance_name(name)
+
+
+class _BufferReader(io.RawIOBase):
+    """Raw binary stream over a buffer, allowing to decode it incrementally without copying it as a whole."""
+
+    def __init__(self, buffer: bytes | bytearray | memoryview) -> None:
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos : self._pos + n]
+        self._pos += n
+        return n
+
+
+def _as_magic_buffer(buffer: bytes | bytearray | memoryview):
+    """Provide a buffer in a form libmagic accepts, avoiding copies where possible."""
+    if isinstance(buffer, bytes):
+        return buffer
+    view = memoryview(buffer).cast("B")
+    if not view.readonly:
+        return (ctypes.c_char * len(view)).from_buffer(view)
+    if isinstance(view.obj, bytes) and view.nbytes == len(view.obj):
+        return view.obj
+    return view.tobytes()
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding_magic() -> magic.Magic:
+    # loading the magic database takes longer than checking a small file; Magic serializes concurrent calls
+    return magic.Magic(mime_encoding=True)
+
+
+def get_file_encoding(source: TextSource) -> str:
+    """tries to figure out the correct encoding of the given file, buffer or binary file-like object"""
+
+    with stage("encoding"):
+        blob = read_source(source)
+        encoding = _encoding_magic().from_buffer(_as_magic_buffer(blob))
         return "utf-8-sig" if encoding == "utf-8" else encoding
 
-    raise UnknownEncodingError(f"Could not figure out encoding of '{filename}'.")
+    raise UnknownEncodingError(f"Could not figure out encoding of '{source_name(source)}'.")
 
 
 def load_chunked_textfile(
-    filename: str,
+    source: TextSource,
     chunk_delimiters: list[str] = None,
     encoding: str = None,
 ) -> list[list[tuple[int, str]]]:
-    """Read one or more chunks from the given file, delimited by empty lines or one of the specified delimiters."""
+    """Read one or more chunks from the given source, delimited by empty lines or one of the specified delimiters.
+
+    The source may be a file name, a buffer (bytes, bytearray or memoryview) or a binary file-like object.
+    """
     chunk_delimiters = chunk_delimiters if chunk_delimiters is not None else ["", '""', "''"]
     chunks = [[]]
-    encoding = encoding or get_file_encoding(filename)
-    with open(filename, encoding=encoding) as f:
+    filename = source_name(source)
+    if not isinstance(source, (str, os.PathLike)):
+        source = read_source(source)
+    encoding = encoding or get_file_encoding(source)
+    if is_buffer(source):
+        stream = io.TextIOWrapper(io.BufferedReader(_BufferReader(source)), encoding=encoding)
+    else:
+        stream = open(source, encoding=encoding)
+    with stage("chunking"), stream as f:
         chunk_num = 0
-        for i, row in enumerate(f.readlines(), 1):
+        for i, row in enumerate(f, 1):
             if row.strip() in chunk_delimiters:
                 logging.debug(f"New table in {filename} possibly starting at line {i}.")
                 chunk_num += 1
@@ -1,16 +1,26 @@
+import csv
 import logging
+from collections import OrderedDict
+from typing import Iterator
 
+from contablo.csv_helper import TextSource
 from contablo.csv_helper import load_chunked_textfile
+from contablo.csv_helper import provenance_name
+from contablo.csv_helper import source_name
 from contablo.fields import FieldSpecRegistry
-from contablo.format_helpers import format_implicit
 from contablo.format_helpers import guess_separator
 from contablo.importable import ImporTable
 from contablo.importable import ImportDatum
+from contablo.importspec import DatumTemplates
 from contablo.importspec import ImportColumnSpec
+from contablo.importspec import ImportMatchRule
 from contablo.importspec import ImportSpec
 from contablo.importspec import ImportSpecRegistry
 from contablo.match import check_conditions
 from contablo.match import match_to_template
+from contablo.profiling import count
+from contablo.profiling import profile_scope
+from contablo.profiling import stage
 
 logger = logging.getLogger(__file__)
 
@@ -35,88 +45,193 @@ def make_field_import_datum_dict(
     fmt_sep: str,
     row_dict: dict[str, str] | None = None,
 ) -> dict[str, ImportDatum]:
-    result = {}
-    for field, spec in spec.items():
-        value, format = spec.split(fmt_sep, 1) if fmt_sep in spec else (spec, "")
-        if row_dict is not None:
-            value = format_implicit(value, row_dict)
-        result[field] = ImportDatum(source_lbl=src_lbl, raw_value=value, format=format)
+    return DatumTemplates(src_lbl, spec, fmt_sep)(row_dict)
+
+
+MatchedRule = tuple[int, ImportMatchRule, dict[str, ImportDatum]]
+
+
+def match_column_rules(spec: ImportColumnSpec, raw: str) -> list[MatchedRule]:
+    """Match the raw value against the column's match rules, ignoring onlyif conditions.
+
+    Returns index, rule and data of all matching rules, in order.  The data comprises the matched fields and the implied
+    ones, unless the latter depend on the row, see ImportMatchRule.implies_row_values.
+    """
+    candidates = spec.match_candidates(raw)
+    count("match_rules_tried", len(candidates))
+    count("match_rules_skipped", len(spec.match) - len(candidates))
+    result = []
+    for rule_idx, rule in candidates:
+        data = match_to_template(raw, rule.rule)
+        if data is None:  # None is no match, {} is a match but without data (e.g. with implies)
+            logger.warning(f"no data for {raw=} {rule=}")
+            continue  # this is normal, only one rule should match
+        logging.debug(f"    ! found match with {data=}")
+        match_data = {}
+        for k, v in data.items():
+            match_data[k] = ImportDatum(source_lbl=k, raw_value=v, format=rule.formats.get(k, ""))
+        if not rule.implies_row_values:
+            match_data.update(rule.implied())
+        result.append((rule_idx, rule, match_data))
     return result
 
 
+class MatchMemo:
+    """Bounded per-column cache of match_column_rules() results, for the columns of one import spec.
+
+    Text columns tend to repeat a limited set of values, which then only need to be matched once.  The least recently
+    used values are dropped once a column holds maxsize values.
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self.columns: dict[int, OrderedDict[str, list[MatchedRule]]] = {}
+
+    def match(self, column: int, spec: ImportColumnSpec, raw: str) -> list[MatchedRule]:
+        cache = self.columns.get(column)
+        if cache is None:
+            cache = self.columns[column] = OrderedDict()
+        result = cache.get(raw)
+        if result is not None:
+            cache.move_to_end(raw)
+            count("match_memo_hits")
+            return result
+        count("match_memo_misses")
+        result = cache[raw] = match_column_rules(spec, raw)
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return result
+
+
 def import_csv_with_spec_detection(
-    csv_file: str,
+    csv_file: TextSource,
     import_spec_registry: ImportSpecRegistry,
     importable_factory: ImporTable,
     field_spec_registry: FieldSpecRegistry,
+    name: str | None = None,
+    provenance: str | None = None,
 ) -> ImporTable | None:
+    """Import a csv file, buffer or binary file-like object with the one spec from the registry that matches it.
+
+    The content is read and split into chunks only once for all specs.  The name is used for reporting and defaults
+    to the file name; the imported_from provenance of each row uses the given provenance name, see iter_sources(), or
+    else the base name of name.
+    """
+    name = name or source_name(csv_file)
+    chunks = load_chunked_textfile(csv_file)
     result: ImporTable = None
     found_specs = set()
-    for spec in import_spec_registry.iter_specs():
+    # only the specs for the file's column labels can match, so the others need not even be loaded
+    for spec in import_spec_registry.iter_specs(first_chunk_columns(chunks)):
         found = None
         try:
-            found = import_csv_with_spec(csv_file, spec, importable_factory, field_spec_registry)
+            with profile_scope(spec=spec.label):
+                found = import_chunks_with_spec(chunks, name, spec, importable_factory, field_spec_registry, provenance)
         except ImportColumnMismatchError:
             pass
         except Exception as e:
             logger.exception(e)
-            print(f"Exception trying {spec.label} on {csv_file}: {e}")
+            print(f"Exception trying {spec.label} on {name}: {e}")
         if not found:
             continue
         result = found
         found_specs.add(spec.label)
 
     if len(found_specs) == 0:
-        print(f"Found no match for {csv_file}")
+        print(f"Found no match for {name}")
         return None
 
     elif len(found_specs) > 1:
-        print(f"** Error: More than one specs matches {csv_file}.")
+        print(f"** Error: More than one specs matches {name}.")
         print(f"** Error: Please restrict to one of {', '.join(found_specs)}")
         return None
 
     return result
 
 
+def shortened_line(line: str) -> str:
+    return line if len(line) < 120 else f"{line[:57]} [..] {line[-57:]}"
+
+
+def read_columns(lines: list[str]) -> tuple[Iterator[list[str]], list[str]]:
+    """Read the column labels from the first of the chunk's lines, returning the reader for the rows with them."""
+    with stage("guess_separator"):
+        delimiter = guess_separator(shortened_line(lines[0]))
+    reader = csv.reader(lines, delimiter=delimiter, quoting=1)
+    return reader, next(reader)
+
+
+def first_chunk_columns(chunks: list[list[tuple[int, str]]]) -> list[str] | None:
+    """The column labels of the first non-empty chunk, which import_chunks_with_spec() requires to match the spec.
+
+    Returns None if the labels cannot be read, leaving it to each spec to report the problem.
+    """
+    for chunk in chunks:
+        if chunk:
+            try:
+                return read_columns([line for _, line in chunk])[1]
+            except (csv.Error, StopIteration, IndexError):
+                return None
+    return []
+
+
 def import_csv_with_spec(
-    csv_file: str,
+    csv_file: TextSource,
     import_spec: ImportSpec,
     importable_factory: ImporTable,
     registry: FieldSpecRegistry,
+    name: str | None = None,
 ) -> ImporTable | None:
     """Import a single csv file with the given spec
 
+    The csv file may also be given as buffer (bytes, bytearray, memoryview) or binary file-like object, in which
+    case name should be provided for the imported_from provenance of each row.
+
     If the file content does not match the spec, the import will fail
     and another specs might be required to succeed.
     """
     chunks = load_chunked_textfile(csv_file)
+    return import_chunks_with_spec(chunks, name or source_name(csv_file), import_spec, importable_factory, registry)
+
+
+def import_chunks_with_spec(
+    chunks: list[list[tuple[int, str]]],
+    name: str,
+    import_spec: ImportSpec,
+    importable_factory: ImporTable,
+    registry: FieldSpecRegistry,
+    provenance: str | None = None,
+) -> ImporTable | None:
+    """Import chunks as returned by load_chunked_textfile() with the given spec, see import_csv_with_spec()."""
     for i, chunk in enumerate(chunks, 1):  # chunk is a list of tuples comprising line number and content
         if not len(chunk):
             logging.debug(f"Chunk #{i:2d} is empty.")
             continue
 
         lines = [line for _, line in chunk]
-        first = lines[0] if len(lines[0]) < 120 else f"{lines[0][:57]} [..] {lines[0][-57:]}"
+        first = shortened_line(lines[0])
         logging.debug(f"Chunk #{i:2d} comprises {len(lines)} lines; 1st line is:")
         logging.debug(f"          {first}")
+        count("chunks")
         try:
-            import csv
-
-            reader = csv.reader(lines, delimiter=guess_separator(first), quoting=1)
-            columns = next(reader)
+            reader, columns = read_columns(lines)
             if columns != [cspec.label for cspec in import_spec.columns]:
                 raise ImportColumnMismatchError()
             logging.info("Columns match, proceeding with import.")
 
             importable: ImporTable = importable_factory()
-            importable.add_extra_fields(registry.make_spec_list(import_spec.fields))
-            importable.add_transforms(import_spec.transforms)
+            extra_fields = import_spec.extra_fields
+            importable.add_extra_fields(extra_fields.field_specs(registry))
+            importable.add_transforms(extra_fields.expressions)
 
             logging.debug(f"{columns=}")
 
             # Todo: Figure out a way to keep track of errors and warnings, including invalid lines
+            basename = provenance or provenance_name(name)
+            memo = MatchMemo()
             for line, row in enumerate(reader, 2):
-                add_to_importable_using_import_spec(importable, import_spec, row, f"{csv_file.split('/')[-1]}:{line}")
+                add_to_importable_using_import_spec(importable, import_spec, row, f"{basename}:{line}", memo)
+            count("rows", len(importable))
 
             return importable
 
@@ -131,8 +246,12 @@ def add_to_importable_using_import_spec(
     import_spec: ImportSpec,
     row: list[str],
     source: str,
+    memo: MatchMemo | None = None,
 ) -> None:
-    """Add data to an importable object from a single row in a source described by the given import_spec."""
+    """Add data to an importable object from a single row in a source described by the given import_spec.
+
+    A memo, if given, caches the outcome of match rules for repeated values; it must only be used with this spec.
+    """
     # Todo: Figure out a way to keep track of errors and warnings, including invalid lines - maybe return some log object?
     logging.debug(f"{source}: {row}")
 
@@ -186,57 +305,50 @@ def add_to_importable_using_import_spec(
     # step 2: handle match clauses separately. only-if statements may only use data from step 2
     #
     match_results: dict[str, ImportDatum] = {}
-    for raw, spec in zip(row, import_spec.columns):
-        if spec.label in ignore_labels:
-            continue
-        match_groups: list[dict[str, str]] = []
-        if not spec.match:
-            continue
-        for rule_idx, rule in enumerate(spec.match):
-            data = match_to_template(raw, rule.rule)
-            if data is None:  # None is no match, {} is a match but without data (e.g. with implies)
-                logger.warning(f"no data for {raw=} {rule=}")
-                continue  # this is normal, only one rule should match
-            logging.debug(f"    ! found match with {data=}")
-            if rule.onlyif:
-                field_dict = {k: v.raw_value for k, v in field_data.items()}
-                if not check_conditions(rule.onlyif, field_dict, row_dict):
-                    print(f"** Warning: dropping match #{rule_idx} due to onlyif condition not met.")
-                    continue
-            match_data = {}
-            for k, v in data.items():
-                match_data[k] = ImportDatum(source_lbl=k, raw_value=v, format=rule.formats.get(k, ""))
-            for k, v in make_field_import_datum_dict("(matched rule)", rule.implies, "/", row_dict).items():
-                # v.raw_value = format_implicit(v.raw_value, row_dict)  # Todo: if still required, find a better way
-                match_data[k] = v
-            match_groups.append(match_data)
-            # logging.debug(f"      -> {match_groups}")
-
-        if (
-            spec.match and not match_groups and spec.label not in columns_mapped
-        ):  # and spec.label not in columns_resolved:
-            print(f"** {spec.match=}")
-            print(f"** {match_groups=}")
-            raise ImportSpecExceededError(f"Input spec for {source}/{spec.label} does not cover value; {raw}")
-
-        #
-        # step 3: check for clashes between all match clauses
-        #
-        if len(match_groups):
-            if len(match_groups) > 1:
-                print(f"** Warning: Multiple matches in {source} column {spec.label}. Will use first match.")
-            # logging.debug("      -> {match_groups[0]}")
-            for field, value in match_groups[0].items():
-                if field in match_results:
-                    prev = match_results[field].source_lbl
-                    print(f"** Warning: matched rule redefines field {field} already defined by {prev}")
-                match_results[field] = value
+    with stage("match"):
+        for column, (raw, spec) in enumerate(zip(row, import_spec.columns)):
+            if spec.label in ignore_labels:
+                continue
+            match_groups: list[dict[str, ImportDatum]] = []
+            if not spec.match:
+                continue
+            matched = memo.match(column, spec, raw) if memo is not None else match_column_rules(spec, raw)
+            for rule_idx, rule, match_data in matched:
+                if rule.onlyif:
+                    field_dict = {k: v.raw_value for k, v in field_data.items()}
+                    if not check_conditions(rule.conditions, field_dict, row_dict):
+                        print(f"** Warning: dropping match #{rule_idx} due to onlyif condition not met.")
+                        continue
+                if rule.implies_row_values:
+                    match_data = {**match_data, **rule.implied(row_dict)}
+                match_groups.append(match_data)
+                # logging.debug(f"      -> {match_groups}")
+
+            if (
+                spec.match and not match_groups and spec.label not in columns_mapped
+            ):  # and spec.label not in columns_resolved:
+                print(f"** {spec.match=}")
+                print(f"** {match_groups=}")
+                raise ImportSpecExceededError(f"Input spec for {source}/{spec.label} does not cover value; {raw}")
+
+            #
+            # step 3: check for clashes between all match clauses
+            #
+            if len(match_groups):
+                if len(match_groups) > 1:
+                    print(f"** Warning: Multiple matches in {source} column {spec.label}. Will use first match.")
+                # logging.debug("      -> {match_groups[0]}")
+                for field, value in match_groups[0].items():
+                    if field in match_results:
+                        prev = match_results[field].source_lbl
+                        print(f"** Warning: matched rule redefines field {field} already defined by {prev}")
+                    match_results[field] = value
 
     #
     # step 4: merge data from step 3 into step 4, starting with defaults
     #
 
-    merged_data = make_field_import_datum_dict("(defaults)", import_spec.defaults, "/", row_dict)
+    merged_data = import_spec.defaulted(row_dict)
     merged_data.update(field_data)
     merged_data.update(match_results)
     # logging.debug("    >", merged_data)
@@ -8,8 +8,12 @@ from typing import Protocol
 
 from contablo.csv_helper import ChunkInfo
 from contablo.csv_helper import CsvFileInfo
+from contablo.csv_helper import TextSource
 from contablo.csv_helper import get_file_encoding
+from contablo.csv_helper import iter_sources
 from contablo.csv_helper import load_chunked_textfile
+from contablo.csv_helper import read_source
+from contablo.csv_helper import source_name
 from contablo.fields import FieldSpec
 from contablo.format_helpers import guess_field_and_format
 from contablo.format_helpers import guess_separator
@@ -58,12 +62,17 @@ class CsvTemplateGenerator:
         self.input_formats.append(info)
 
     def add_files(self, csv_files: list[str]) -> None:
-        for csv_file in csv_files:
-            self.add_file(csv_file)
+        """Add the given CSV files, which may be compressed or zip archives, see iter_sources()."""
+        for name, source, _ in iter_sources(csv_files):
+            self.add_file(source, name)
 
-    def add_file(self, csv_file: str) -> None:
+    def add_file(self, csv_file: TextSource, name: str | None = None) -> None:
         """Add a csv file containing transactions to be analyzed.
-        Files will be grouped by their csv properties including column labels."""
+        Files will be grouped by their csv properties including column labels.
+
+        Besides a file name, csv_file may be a buffer or binary file-like object, identified by the given name."""
+        name = name or source_name(csv_file)
+        csv_file = read_source(csv_file)  # read once for encoding detection and chunking
         encoding = get_file_encoding(csv_file)
         chunk_info = []
         chunks = load_chunked_textfile(csv_file, encoding=encoding)
@@ -74,7 +83,7 @@ class CsvTemplateGenerator:
                 print(f"Chunk #{chunk_idx:2d} is empty.")
                 continue
 
-            logger.info(f"Chunk #{chunk_idx:2d} starts at line {chunk[0][0]} of {encoding}-encoded file {csv_file}")
+            logger.info(f"Chunk #{chunk_idx:2d} starts at line {chunk[0][0]} of {encoding}-encoded file {name}")
 
             lines = [line for _, line in chunk]
 
@@ -96,7 +105,7 @@ class CsvTemplateGenerator:
                     ChunkInfo(delimiter=delimiter, first_line=chunk[0][0], columns=columns, datalines=lines[1:])
                 )
 
-        self.add_file_info(CsvFileInfo(source_files=[csv_file], file_encoding=encoding, chunk_info=chunk_info))
+        self.add_file_info(CsvFileInfo(source_files=[name], file_encoding=encoding, chunk_info=chunk_info))
 
     def make_templates(self, output_path_base: str = None, skip_samples: bool = False) -> None:
         """Output import spec template files based on the alanyzed csv files."""
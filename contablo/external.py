@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+
+from contablo.bloom import row_digest
+from contablo.importable import row_key
+from contablo.match import dicts_equal_in_keys
+from contablo.profiling import count
+from contablo.profiling import stage
+
+# a run holds records sorted by their first two items, which are unique together, so rows are never compared
+Record = tuple[Any, int, dict[str, Any]]
+
+
+class ExternalDeduplicator:
+    """Drop duplicate rows like merging them into an empty ImporTable with merge_in(), for more rows than fit in memory.
+
+    Up to max_rows rows, duplicates are found in memory.  Beyond that, rows are written to temporary files as runs of
+    max_rows rows each, sorted by the digest of their values in the given columns, see row_digest().  The runs are
+    combined with a k-way merge, which brings equal rows together; of those, the first one added is kept, and the
+    survivors are sorted back into the order they were added in.  Rows with equal digest are compared like
+    ImporTable.is_known_entry() does, so that a collision of digests does not drop a row.
+    """
+
+    batch_size = 1000  # records per pickle in a run file
+
+    def __init__(self, columns: list[str], max_rows: int = 100_000, spill_dir: str | None = None, fan_in: int = 64):
+        if max_rows < 1 or fan_in < 2:
+            raise ValueError(f"Invalid parameters {max_rows=} and {fan_in=}")
+        self.columns = columns
+        self.max_rows = max_rows
+        self.fan_in = fan_in
+        self.spill_dir = spill_dir
+        self._temp_dir: str | None = None
+        self._run_count = 0
+        self.runs: list[str] = []
+        self.buffer: list[dict[str, Any]] = []
+        self.added = 0
+
+    def __enter__(self) -> ExternalDeduplicator:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Remove the temporary files."""
+        if self._temp_dir is not None:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._temp_dir = None
+        self.runs = []
+
+    def add(self, rows: Iterable[dict[str, Any]]) -> None:
+        """Add rows, e.g. those of an ImporTable; rows must not be modified afterwards."""
+        with stage("dedup"):
+            for row in rows:
+                if len(self.buffer) >= self.max_rows:
+                    self._spill()
+                self.buffer.append(row)
+                self.added += 1
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        """Yield the unique rows in the order they were added; may be iterated only once, see close().
+
+        Spilling, merging and sorting back are timed as the dedup stage, but not the consumer of the rows.
+        """
+        if not self.runs:
+            # everything fits into memory, so there is no need for sorting
+            with stage("dedup"):
+                rows, self.buffer = list(self._unique_in_memory(self.buffer)), []
+            yield from rows
+            return
+        with stage("dedup"):
+            self._spill()
+            by_digest = self._merge_runs(self.runs)
+            self.runs = []
+            # the survivors are sorted by the order they were added in, with a run of digest and order swapped
+            buffer = []
+            for digest, seq, row in self._unique(by_digest):
+                buffer.append((seq, digest, row))
+                if len(buffer) >= self.max_rows:
+                    buffer.sort()
+                    self.runs.append(self._write_run(buffer))
+                    buffer = []
+            buffer.sort()
+        if not self.runs:
+            yield from (row for _, _, row in buffer)
+            return
+        with stage("dedup"):
+            self.runs.append(self._write_run(buffer))
+            by_order = self._merge_runs(self.runs)
+        for batch in self._timed_batches(by_order):
+            yield from (row for _, _, row in batch)
+
+    def _timed_batches(self, records: Iterator[Record]) -> Iterator[list[Record]]:
+        """The records in batches, each taken as part of the dedup stage."""
+        while True:
+            with stage("dedup"):
+                batch = list(itertools.islice(records, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _unique(self, records: Iterable[Record]) -> Iterator[Record]:
+        """The first of each group of equal rows, from records sorted by digest and order."""
+        columns = self.columns
+        for _, group in itertools.groupby(records, key=lambda record: record[0]):
+            kept: list[Record] = []
+            for record in group:
+                if any(dicts_equal_in_keys(other[2], record[2], columns) for other in kept):
+                    count("dedup_dropped_rows")
+                    continue
+                kept.append(record)
+                yield record
+
+    def _unique_in_memory(self, rows: list[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        """The first of each group of equal rows, in their order, found like ImporTable.is_known_entry() does."""
+        columns = self.columns
+        known: set[tuple] = set()
+        unhashable: list[dict[str, Any]] = []
+        kept: list[dict[str, Any]] = []
+        for row in rows:
+            key = row_key(row, columns)
+            try:
+                duplicate = key in known or any(dicts_equal_in_keys(other, row, columns) for other in unhashable)
+            except TypeError:
+                key = None
+                duplicate = any(dicts_equal_in_keys(other, row, columns) for other in kept)
+            if duplicate:
+                count("dedup_dropped_rows")
+                continue
+            if key is None:
+                unhashable.append(row)
+            else:
+                known.add(key)
+            kept.append(row)
+            yield row
+
+    def _spill(self) -> None:
+        if self.buffer:
+            columns, start = self.columns, self.added - len(self.buffer)
+            records = sorted((row_digest(row, columns), seq, row) for seq, row in enumerate(self.buffer, start))
+            self.buffer = []
+            self.runs.append(self._write_run(records))
+
+    def _write_run(self, records: Iterable[Record]) -> str:
+        if self._temp_dir is None:
+            self._temp_dir = tempfile.mkdtemp(prefix="contablo-dedup-", dir=self.spill_dir)
+        filename = os.path.join(self._temp_dir, f"run-{self._run_count:06d}")
+        self._run_count += 1
+        count("dedup_runs")
+        with open(filename, "wb") as f:
+            records = iter(records)
+            while batch := list(itertools.islice(records, self.batch_size)):
+                pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return filename
+
+    def _read_run(self, filename: str) -> Iterator[Record]:
+        try:
+            with open(filename, "rb") as f:
+                while True:
+                    try:
+                        batch = pickle.load(f)
+                    except EOFError:
+                        break
+                    yield from batch
+        finally:
+            os.remove(filename)
+
+    def _merge_runs(self, runs: list[str]) -> Iterator[Record]:
+        # with more runs than files to be opened at once, runs are merged into longer ones first
+        while len(runs) > self.fan_in:
+            merged = self._write_run(heapq.merge(*(self._read_run(run) for run in runs[: self.fan_in])))
+            runs = runs[self.fan_in :] + [merged]
+        return heapq.merge(*(self._read_run(run) for run in runs))
@@ -1,22 +1,30 @@
 from __future__ import annotations
 
 import datetime
+import functools
 import logging
+import sys
 from dataclasses import dataclass
 from dataclasses import field
 from decimal import Decimal
 from typing import Any
 from typing import Protocol
 
+from contablo.fixedpoint import FixedPoint
+from contablo.fixedpoint import fixed_point_type
 from contablo.format_helpers import common_date_formats
 from contablo.format_helpers import common_datetime_formats
 from contablo.format_helpers import common_time_formats
 from contablo.format_helpers import is_number
 from contablo.format_helpers import parse_datetime
+from contablo.format_helpers import strptime
 from contablo.numberformat import NumberFormat
 
 logger = logging.getLogger(__file__)
 
+# number formats are read only, so the parsed format can be shared by all values of a column
+number_format = functools.lru_cache(maxsize=256)(NumberFormat.from_format)
+
 
 class FieldSpec(Protocol):
     """Interface for a field type specification.
@@ -67,27 +75,41 @@ def is_field_spec_class(cls) -> bool:
 
 @dataclass
 class StringFieldSpec:
+    """Text field; with dictionary set, equal values of all rows share one (interned) string object.
+
+    Use dictionary for columns with few distinct values like currencies or transaction types: it saves memory, and
+    comparing shared strings is reduced to comparing references.
+    """
+
     name: str
     help: str
+    dictionary: bool = False
     type: str = field(default="string", init=False)
     zero: None = field(default=None, init=False)
 
-    @staticmethod
-    def convert(value: str, format: str) -> str:
-        return str(value)
+    def convert(self, value: str, format: str) -> str:
+        value = str(value)
+        return sys.intern(value) if self.dictionary else value
 
 
 @dataclass
 class EnumFieldSpec:
+    """Text field with a fixed set of items; values are always shared like with StringFieldSpec.dictionary."""
+
     name: str
     help: str
     items: list[str]
     type: str = field(default="enum", init=False)
     zero: None = field(default=None, init=False)
+    _item_set: dict[str, str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._item_set = {item: sys.intern(str(item)) for item in self.items}
 
     def convert(self, value: str, format: str) -> str:
-        assert value in self.items, f"Unknown item <{value}>, expecting of of {self.items}"
-        return value
+        item = self._item_set.get(value)
+        assert item is not None, f"Unknown item <{value}>, expecting of of {self.items}"
+        return item
 
 
 @dataclass
@@ -123,8 +145,28 @@ class DecimalFieldSpec:
 
     @staticmethod
     def convert(value: str, format: str) -> Decimal:
-        fmt = NumberFormat.from_format(format)
-        return Decimal(fmt.normalize(value))
+        return Decimal(number_format(format).normalize(value))
+
+
+@dataclass
+class MoneyFieldSpec:
+    """Number with a fixed number of fractional digits (scale), stored as FixedPoint, i.e. a scaled integer.
+
+    Compared to DecimalFieldSpec, arithmetic in transforms is exact regardless of the decimal context, and values use
+    less memory.  Values with more fractional digits than the scale are rejected rather than rounded.
+    """
+
+    name: str
+    help: str
+    scale: int = 2
+    type: str = field(default="money", init=False)
+    zero: FixedPoint = field(default=None, init=False)
+
+    def __post_init__(self) -> None:
+        self.zero = fixed_point_type(self.scale)(0)
+
+    def convert(self, value: str, format: str) -> FixedPoint:
+        return type(self.zero).parse(number_format(format).normalize(value))
 
 
 @dataclass
@@ -162,7 +204,7 @@ class TimeFieldSpec:
     @staticmethod
     def convert(value: str, format: str) -> datetime.time:
         # see https://docs.python.org/3/library/time.html#time.strptime
-        dt = datetime.datetime.strptime(value, common_time_formats.get(format, format))
+        dt = strptime(value, common_time_formats.get(format, format))
         assert dt.date() == datetime.date(1900, 1, 1)
 
         return dt.time()
@@ -197,20 +239,22 @@ class FieldSpecRegistry:
 
     def __init__(self):
         self.known_specs: dict[str, type[dataclass]] = {}
+        self.version = 0  # incremented with each change, to tell when spec lists made before are outdated
 
     def add(self, spec: type[dataclass]) -> None:
         assert_field_spec_class(spec)
         self.known_specs[spec.type] = spec
+        self.version += 1
 
     def get_types(self) -> list[str]:
         return list(sorted(self.known_specs.keys()))
 
     def make_spec_list(self, data: list[dict[str, str]]) -> list[FieldSpec]:
         result: list[FieldSpec] = []
+        types = self.get_types()
         for idx, item in enumerate(data, 1):
             assert "name" in item, f"Item {idx} requires a field 'name'."
             assert "type" in item, f"Item {idx} reqrequires a field 'type'."
-            types = self.get_types()
             name, type = item["name"], item["type"]
             assert (
                 item["type"] in types
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import functools
+import operator
+import sys
+from decimal import Decimal
+from typing import Any
+
+
+class FixedPoint:
+    """Exact decimal number with a fixed number of fractional digits, stored as integer count of 10**-scale units.
+
+    Use fixed_point_type() to get the class for a certain scale.  Instances compare and hash like the Decimal of the
+    same value, and support exact addition, subtraction and multiplication with each other and with int; division and
+    any operation with Decimal or float yield a Decimal.  str() renders the decimal text, e.g. "-12.30" for scale 2.
+    """
+
+    __slots__ = ("units",)
+    scale = 0
+    factor = 1
+    _hash_inverse = 1  # multiplicative inverse of factor modulo the numeric hash modulus, see __hash__()
+
+    def __init__(self, units: int) -> None:
+        _set_units(self, units)
+
+    @classmethod
+    def parse(cls, text: str) -> FixedPoint:
+        """Parse normalized decimal text like "-1234.5", see NumberFormat.normalize()."""
+        whole, _, fraction = text.partition(".")
+        digits = whole[1:] + fraction if whole[:1] == "-" else whole + fraction
+        if not digits.isdigit() or not digits.isascii():
+            raise ValueError(f"Invalid number <{text}>")
+        scale = cls.scale
+        if len(fraction) != scale:
+            if len(fraction) > scale:
+                if fraction[scale:].strip("0"):
+                    raise ValueError(f"Number <{text}> exceeds the scale of {scale} fractional digits")
+                fraction = fraction[:scale]
+            else:
+                fraction += "0" * (scale - len(fraction))
+        return _new(cls, int(whole + fraction))
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.units).scaleb(-self.scale)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return _fixed_point, (self.scale, self.units)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}('{self}')"
+
+    def __str__(self) -> str:
+        units = self.units
+        if not self.scale:
+            return str(units)
+        digits = str(abs(units)).rjust(self.scale + 1, "0")
+        return f"{'-' if units < 0 else ''}{digits[: -self.scale]}.{digits[-self.scale :]}"
+
+    def __format__(self, format_spec: str) -> str:
+        return format(self.to_decimal(), format_spec) if format_spec else str(self)
+
+    def __hash__(self) -> int:
+        # the hash of a rational number p/q as defined for all numeric types, so that equal Decimals hash equal
+        units = self.units
+        result = abs(units) % _modulus * self._hash_inverse % _modulus
+        result = -result if units < 0 else result
+        return -2 if result == -1 else result
+
+    def _units_of(self, other: Any) -> tuple[int, int, type[FixedPoint]] | None:
+        """Units of self and other in a common scale, together with the class of that scale; None for other types."""
+        if isinstance(other, FixedPoint):
+            if other.scale == self.scale:
+                return self.units, other.units, type(self)
+            if other.scale > self.scale:
+                return self.units * (other.factor // self.factor), other.units, type(other)
+            return self.units, other.units * (self.factor // other.factor), type(self)
+        if isinstance(other, int):
+            return self.units, other * self.factor, type(self)
+        return None
+
+    def _compare(self, other: Any, op) -> bool:
+        units = self._units_of(other)
+        if units is not None:
+            return op(units[0], units[1])
+        if isinstance(other, (Decimal, float)):
+            return op(self.to_decimal(), other)
+        return NotImplemented
+
+    def __eq__(self, other: Any) -> bool:
+        return self._compare(other, operator.eq)
+
+    def __ne__(self, other: Any) -> bool:
+        return self._compare(other, operator.ne)
+
+    def __lt__(self, other: Any) -> bool:
+        return self._compare(other, operator.lt)
+
+    def __le__(self, other: Any) -> bool:
+        return self._compare(other, operator.le)
+
+    def __gt__(self, other: Any) -> bool:
+        return self._compare(other, operator.gt)
+
+    def __ge__(self, other: Any) -> bool:
+        return self._compare(other, operator.ge)
+
+    def _decimal_op(self, other: Any, op, reverse: bool = False) -> Any:
+        # operations without exact fixed point result are done in Decimal; floats (e.g. literals in transform
+        # expressions) are taken by their shortest representation, so that 0.19 means Decimal("0.19")
+        if isinstance(other, float):
+            other = Decimal(repr(other))
+        elif isinstance(other, FixedPoint):
+            other = other.to_decimal()
+        elif not isinstance(other, (int, Decimal)):
+            return NotImplemented
+        return op(other, self.to_decimal()) if reverse else op(self.to_decimal(), other)
+
+    def __add__(self, other: Any) -> Any:
+        if type(other) is type(self):
+            return _new(type(self), self.units + other.units)
+        units = self._units_of(other)
+        if units is not None:
+            return _new(units[2], units[0] + units[1])
+        return self._decimal_op(other, operator.add)
+
+    __radd__ = __add__
+
+    def __sub__(self, other: Any) -> Any:
+        if type(other) is type(self):
+            return _new(type(self), self.units - other.units)
+        units = self._units_of(other)
+        if units is not None:
+            return _new(units[2], units[0] - units[1])
+        return self._decimal_op(other, operator.sub)
+
+    def __rsub__(self, other: Any) -> Any:
+        units = self._units_of(other)
+        if units is not None:
+            return _new(units[2], units[1] - units[0])
+        return self._decimal_op(other, operator.sub, reverse=True)
+
+    def __mul__(self, other: Any) -> Any:
+        if isinstance(other, FixedPoint):
+            return _new(fixed_point_type(self.scale + other.scale), self.units * other.units)
+        if isinstance(other, int):
+            return _new(type(self), self.units * other)
+        return self._decimal_op(other, operator.mul)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other: Any) -> Any:
+        return self._decimal_op(other, operator.truediv)
+
+    def __rtruediv__(self, other: Any) -> Any:
+        return self._decimal_op(other, operator.truediv, reverse=True)
+
+    def __floordiv__(self, other: Any) -> Any:
+        return self._decimal_op(other, operator.floordiv)
+
+    def __rfloordiv__(self, other: Any) -> Any:
+        return self._decimal_op(other, operator.floordiv, reverse=True)
+
+    def __mod__(self, other: Any) -> Any:
+        return self._decimal_op(other, operator.mod)
+
+    def __rmod__(self, other: Any) -> Any:
+        return self._decimal_op(other, operator.mod, reverse=True)
+
+    def __pow__(self, other: Any) -> Any:
+        return self._decimal_op(other, operator.pow)
+
+    def __rpow__(self, other: Any) -> Any:
+        return self._decimal_op(other, operator.pow, reverse=True)
+
+    def __neg__(self) -> FixedPoint:
+        return _new(type(self), -self.units)
+
+    def __pos__(self) -> FixedPoint:
+        return self
+
+    def __abs__(self) -> FixedPoint:
+        return _new(type(self), abs(self.units))
+
+    def __int__(self) -> int:
+        units = self.units
+        return -(-units // self.factor) if units < 0 else units // self.factor
+
+    __trunc__ = __int__
+
+    def __floor__(self) -> int:
+        return self.units // self.factor
+
+    def __ceil__(self) -> int:
+        return -(-self.units // self.factor)
+
+    def __round__(self, ndigits: int | None = None) -> Any:
+        return round(self.to_decimal(), ndigits)
+
+    def __float__(self) -> float:
+        return self.units / self.factor
+
+    def __bool__(self) -> bool:
+        return self.units != 0
+
+
+_modulus = sys.hash_info.modulus
+_set_units = FixedPoint.units.__set__  # bypasses __setattr__()
+
+
+def _new(cls: type[FixedPoint], units: int) -> FixedPoint:
+    result = object.__new__(cls)
+    _set_units(result, units)
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def fixed_point_type(scale: int) -> type[FixedPoint]:
+    """The FixedPoint class for the given number of fractional digits."""
+    if scale < 0:
+        raise ValueError(f"Invalid scale {scale}")
+    factor = 10**scale
+    attributes = dict(__slots__=(), scale=scale, factor=factor, _hash_inverse=pow(factor, -1, _modulus))
+    return type(f"FixedPoint{scale}", (FixedPoint,), attributes)
+
+
+def _fixed_point(scale: int, units: int) -> FixedPoint:
+    return fixed_point_type(scale)(units)
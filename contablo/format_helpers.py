@@ -2,11 +2,13 @@ from __future__ import annotations
 
 import csv
 import datetime
+import functools
 import logging
 
 import dateparser
 
 from contablo.codes import is_valid_isin
+from contablo.codes import validate_isins
 from contablo.numberformat import NumberFormat
 
 logger = logging.getLogger(__file__)
@@ -64,6 +66,78 @@ common_datetime_formats = {
 DEFAULT_DATE = datetime.datetime.strptime("01:01:01", "%H:%M:%S").date()
 
 
+class FixedWidthParser:
+    """Parser for strptime formats made of zero-padded numeric fields and literal separators, e.g. "%d.%m.%Y".
+
+    Calling it with a text returns the datetime that strptime() would return, or None if the text does not have the
+    exact shape of the format, e.g. because a field is not zero-padded or whitespace differs from the one in the
+    format; strptime() has to decide in that case.
+    """
+
+    # directive: width, index in the datetime arguments
+    directives = {"Y": (4, 0), "y": (2, 0), "m": (2, 1), "d": (2, 2), "H": (2, 3), "M": (2, 4), "S": (2, 5)}
+
+    def __init__(self, strptime_format: str) -> None:
+        self.format = strptime_format
+        self.literals: list[tuple[int, str]] = []
+        self.fields: list[tuple[int, int, int, bool]] = []  # start, end, argument index, two digit year
+        pos, idx = 0, 0
+        while idx < len(strptime_format):
+            char = strptime_format[idx]
+            if char == "%":
+                directive = strptime_format[idx + 1 : idx + 2]
+                if directive not in self.directives:
+                    raise ValueError(f"Unsupported directive %{directive} in {strptime_format}")
+                width, arg = self.directives[directive]
+                self.fields.append((pos, pos + width, arg, directive == "y"))
+                pos, idx = pos + width, idx + 2
+                continue
+            if char.isdigit():  # digits would make the field widths ambiguous
+                raise ValueError(f"Unsupported literal <{char}> in {strptime_format}")
+            self.literals.append((pos, char))
+            pos, idx = pos + 1, idx + 1
+        self.width = pos
+
+    def __call__(self, text: str) -> datetime.datetime | None:
+        if len(text) != self.width:
+            return None
+        for pos, char in self.literals:
+            if text[pos] != char:
+                return None
+        args = [1900, 1, 1, 0, 0, 0]
+        for start, end, arg, short_year in self.fields:
+            digits = text[start:end]
+            if not (digits.isascii() and digits.isdigit()):
+                return None
+            value = int(digits)
+            if short_year:
+                value += 2000 if value < 69 else 1900  # same pivot as strptime
+            args[arg] = value
+        try:
+            return datetime.datetime(*args)
+        except ValueError:
+            return None
+
+
+@functools.lru_cache(maxsize=256)
+def fixed_width_parser(strptime_format: str) -> FixedWidthParser | None:
+    """The FixedWidthParser for the format, or None if the format is not suitable, e.g. because it uses month names."""
+    try:
+        return FixedWidthParser(strptime_format)
+    except ValueError:
+        return None
+
+
+def strptime(text: str, strptime_format: str) -> datetime.datetime:
+    """Like datetime.datetime.strptime(), but bypassing it for texts matching the shape of a fixed width format."""
+    parser = fixed_width_parser(strptime_format)
+    if parser is not None:
+        result = parser(text)
+        if result is not None:
+            return result
+    return datetime.datetime.strptime(text, strptime_format)
+
+
 def parse_datetime(text: str, datetime_format: str) -> datetime.datetime | None:
     """Parse text for a datetime conforming to the strptime compatible date_format.
 
@@ -72,7 +146,7 @@ def parse_datetime(text: str, datetime_format: str) -> datetime.datetime | None:
     localised date reprensentations in the form "01. Januar 2012" (german)
     """
     try:
-        return datetime.datetime.strptime(text, datetime_format)
+        return strptime(text, datetime_format)
     except ValueError:
         pass
 
@@ -191,21 +265,21 @@ def get_datetime_strptime_from_format(datetime_format: str):
 
 def guess_date_format(samples: list[str]) -> str | None:
     for date_format, strptime_format in common_date_formats.items():
-        if all([is_date_strptime(s, strptime_format) for s in samples]):
+        if all(is_date_strptime(s, strptime_format) for s in samples):
             return date_format
     return None
 
 
 def guess_time_format(samples: list[str]) -> str | None:
     for time_format, strptime_format in common_time_formats.items():
-        if all([is_time_strptime(s, strptime_format) for s in samples]):
+        if all(is_time_strptime(s, strptime_format) for s in samples):
             return time_format
     return None
 
 
 def guess_datetime_format(samples: list[str]) -> str | None:
     for datetime_format, strptime_format in common_datetime_formats.items():
-        if all([is_datetime_strptime(s, strptime_format) for s in samples]):
+        if all(is_datetime_strptime(s, strptime_format) for s in samples):
             return datetime_format
     return None
 
@@ -251,7 +325,8 @@ def guess_field_and_format(samples: list[str]) -> tuple[str, str]:
     if not len(samples):
         return "empty", ""
 
-    if all(map(is_valid_isin, samples)):
+    # the first sample rules out most columns before checking the whole batch
+    if is_valid_isin(samples[0]) and validate_isins(samples) == (1 << len(samples)) - 1:
         return "isin", ""
 
     if (format := guess_date_format(samples)) is not None:
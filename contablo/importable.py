@@ -7,12 +7,20 @@ from typing import Callable
 import pydantic
 from arithmetic_expressions import Expression
 
+from contablo.bloom import BloomFilter
+from contablo.bloom import row_digest
 from contablo.fields import FieldSpec
 from contablo.match import dicts_equal_in_keys
+from contablo.profiling import stage
 
 logger = logging.getLogger(__file__)
 
 
+def row_key(data: dict[str, Any], columns: list[str]) -> tuple:
+    """Hashable key of the row's values in the given columns, equal for rows matched by dicts_equal_in_keys()."""
+    return tuple((column, data[column]) for column in columns if column in data)
+
+
 class ImportDatum(pydantic.BaseModel):
     source_lbl: str  # source column label
     raw_value: str
@@ -41,11 +49,38 @@ class ImporTable:
         self.fields_list: list[FieldSpec] = fields
         self.extra_fields_list: list[FieldSpec] = []
         self.transforms: dict[str, Expression] = {}
+        self.key_filter: BloomFilter | None = None
+        # duplicate detection state, caught up with appended rows on use, see is_known_entry()
+        self._known_columns: tuple[str, ...] | None = None
+        self._known_keys: set[tuple] = set()
+        self._known_unhashable: list[int] = []
+        self._known_rows = 0
+        self._filtered_rows = 0
         self.data_vector: list[dict[str, Any]] = []  # see self.columns for valid keys
+        self._fields: dict[str, FieldSpec] = {}
+        self._fields_source: tuple[list[FieldSpec], list[FieldSpec]] | None = None
+
+    @property
+    def data_vector(self) -> list[dict[str, Any]]:
+        return self._data_vector
+
+    @data_vector.setter
+    def data_vector(self, rows: list[dict[str, Any]]) -> None:
+        # duplicate detection follows appended rows; a replaced vector is looked at from the start again
+        self._data_vector = rows
+        self._known_columns = None
+        self._filtered_rows = 0
 
     @property
     def fields(self) -> dict[str, FieldSpec]:
-        return {t.name: t for t in self.fields_list + self.extra_fields_list}
+        """Field specs by name, including the extra fields; shared between calls, so do not modify."""
+        fields, extra = self.fields_list, self.extra_fields_list
+        source = self._fields_source
+        # compared item by item, mostly by identity, so that specs replaced in place are noticed as well
+        if source is None or source[0] != fields or source[1] != extra:
+            self._fields = {t.name: t for t in fields + extra}
+            self._fields_source = list(fields), list(extra)
+        return self._fields
 
     @property
     def columns(self) -> list[str]:
@@ -64,8 +99,9 @@ class ImporTable:
     def add_extra_fields(self, fields: list[FieldSpec]) -> None:
         self.extra_fields_list = fields
 
-    def add_transforms(self, transforms: dict[str, str]) -> None:
-        self.transforms.update({k: Expression.parse(v) for k, v in transforms.items()})
+    def add_transforms(self, transforms: dict[str, str | Expression]) -> None:
+        """Add transforms, given as text or as parsed expressions, e.g. from ImportSpec.extra_fields."""
+        self.transforms.update({k: Expression.parse(v) if isinstance(v, str) else v for k, v in transforms.items()})
 
     def get_columns(self) -> list[str]:
         return [c for c in self.columns]
@@ -81,11 +117,12 @@ class ImporTable:
         include_header: bool = False,
     ) -> list[list[Any]]:
         rows = []
+        columns = self.columns
         if include_header:
-            rows.append(self.columns)
+            rows.append(columns)
         for entry in self.data_vector:
             row = []
-            for column in self.columns:
+            for column in columns:
                 value = entry.get(column, None)
                 if value is None:
                     value = fallback
@@ -111,8 +148,9 @@ class ImporTable:
         errors = []
         if import_data.get("drop", None) is not None:
             return
+        fields = self.fields
         for k, v in import_data.items():
-            if k not in self.fields:
+            if k not in fields:
                 errors.append(f"Unknown field <{k}>: {v}")
             if not isinstance(v, ImportDatum):
                 errors.append(f"Implementation error: <{k}> requires type ImportDatum, got: {v}")
@@ -122,20 +160,23 @@ class ImporTable:
                 print(f"   {error}")
             return
         data = {"imported_from": source}
-        for field, datum in import_data.items():
-            try:
-                data[field] = self.fields[field].convert(datum.raw_value, datum.format)
-            except (AssertionError, ValueError) as e:
-                logger.exception(e)
-                errors.append(f"{e} for {field=} and {datum=}")
+        with stage("convert"):
+            for field, datum in import_data.items():
+                try:
+                    data[field] = fields[field].convert(datum.raw_value, datum.format)
+                except (AssertionError, ValueError) as e:
+                    logger.exception(e)
+                    errors.append(f"{e} for {field=} and {datum=}")
         if errors:
             print("** Errors:")
             for error in errors:
                 print(f"   {error}")
             raise ImportError("There were errors while adding data")  # raise a more appropriate Exception
 
-        for column, expression in self.transforms.items():
-            data[column] = self.evaluate(expression, data)
+        if self.transforms:
+            with stage("transform"):
+                for column, expression in self.transforms.items():
+                    data[column] = self.evaluate(expression, data)
 
         self.data_vector.append(data)
 
@@ -154,22 +195,71 @@ class ImporTable:
         """Merge another importable into this one while dropping duplicates.
 
         For duplicate detection, see is_known_entry()"""
-        for data in other.iter_data():
-            if self.is_known_entry(data):
-                continue
-            self.data_vector.append(data)
+        with stage("dedup"):
+            for data in other.iter_data():
+                if self.is_known_entry(data):
+                    continue
+                self.data_vector.append(data)
+
+    def use_key_filter(self, key_filter: BloomFilter, covers_rows: bool = False) -> None:
+        """Use a bloom filter to detect new entries without looking at known ones, see is_known_entry().
+
+        With covers_rows, the filter is assumed to already contain all current rows, e.g. when it was saved together
+        with them by a previous run.  Otherwise, the current rows are added to it.  When the data vector is replaced,
+        its rows are added again; the filter keeps those of the previous rows, which only costs some false positives.
+        """
+        self.key_filter = key_filter
+        self._filtered_rows = len(self.data_vector) if covers_rows else 0
+
+    def save_key_filter(self, filename: str) -> None:
+        """Save the key filter covering all current rows, to be used again with use_key_filter(covers_rows=True)."""
+        if self.key_filter is None:
+            raise ValueError("There is no key filter to save, see use_key_filter()")
+        self._sync_key_filter(self.columns)
+        self.key_filter.save(filename)
+
+    def _sync_key_filter(self, columns: list[str]) -> None:
+        if self._filtered_rows > len(self.data_vector):
+            self._filtered_rows = 0  # rows were removed in place
+        for data in self.data_vector[self._filtered_rows :]:
+            self.key_filter.add(row_digest(data, columns))
+        self._filtered_rows = len(self.data_vector)
+
+    def _sync_known_keys(self, columns: tuple[str, ...]) -> None:
+        # rows are only appended to the data vector in place; start over if it was replaced or columns changed
+        if self._known_columns != columns or self._known_rows > len(self.data_vector):
+            self._known_columns = columns
+            self._known_keys, self._known_unhashable, self._known_rows = set(), [], 0
+        for idx in range(self._known_rows, len(self.data_vector)):
+            try:
+                self._known_keys.add(row_key(self.data_vector[idx], columns))
+            except TypeError:
+                self._known_unhashable.append(idx)
+        self._known_rows = len(self.data_vector)
 
     def is_known_entry(self, data: dict[str, Any]) -> bool:
         """Checks if the provided data is already known.
 
         Only keys in self.columns are checked; additional keys like imported_from are ignored.
         This allows to identify identical data imported from different files as duplicates.
+
+        Known rows are looked up in a set of row keys.  Rows must not be modified in place once they are part of
+        the data vector, and the data vector may only be appended to or replaced as a whole.  With a key filter, see
+        use_key_filter(), most new rows are detected without the set.
         """
-        # Todo: devise some caching
-        for my_data in self.iter_data():
-            if dicts_equal_in_keys(my_data, data, self.columns):
+        columns = self.columns
+        if self.key_filter is not None:
+            if self._filtered_rows != len(self.data_vector):
+                self._sync_key_filter(columns)
+            if row_digest(data, columns) not in self.key_filter:
+                return False
+        self._sync_known_keys(tuple(columns))
+        try:
+            if row_key(data, columns) in self._known_keys:
                 return True
-        return False
+        except TypeError:
+            return any(dicts_equal_in_keys(my_data, data, columns) for my_data in self.iter_data())
+        return any(dicts_equal_in_keys(self.data_vector[idx], data, columns) for idx in self._known_unhashable)
 
     # def to_dataframe(self) -> pd.DataFrame:  # on application level: DataFrame(imp.get_data(), columns=im.get_columns())
     #     columns = self.columns + ["imported_from"]
@@ -1,10 +1,27 @@
+from __future__ import annotations
+
 import logging
+import os
+import pickle
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass
+from dataclasses import field
 from decimal import Decimal
+from operator import itemgetter
 from typing import Any
+from typing import Callable
 from typing import Protocol
+from typing import Sequence
 
+from contablo.fixedpoint import FixedPoint
 from contablo.importable import ImporTable
+from contablo.profiling import count
+from contablo.profiling import stage
 
 logger = logging.getLogger(__file__)
 
@@ -17,7 +34,7 @@ def is_undef(value: Any, ignore_undef):
     if not ignore_undef:
         return False
     for item in ignore_undef:
-        if isinstance(value, Decimal):
+        if isinstance(value, (Decimal, FixedPoint)):
             return Decimal is None
         if isinstance(value, type(item)):
             if value == item:
@@ -87,6 +104,88 @@ def dicts_match_by_map(
     return True
 
 
+def _no_key(row: dict[str, Any]) -> tuple:
+    return ()
+
+
+def _key_getter(keys: tuple[str, ...]) -> Callable[[dict[str, Any]], Any]:
+    # itemgetter returns a bare value for a single key, which compares just like a tuple of one
+    return itemgetter(*keys) if keys else _no_key
+
+
+class MatchComparator:
+    """A match map and ignore lists compiled into a callable that behaves like dicts_match_by_map().
+
+    The mapped keys are compared as one tuple, ignore lists are turned into sets and the undef values into
+    (type, value) pairs, so that comparing two rows does not need to search lists.
+    """
+
+    __slots__ = ("left_keys", "right_keys", "left_signature", "right_signature", "skip_left", "skip_right", "undef")
+
+    def __init__(
+        self,
+        match_map: dict[str, str] = None,
+        ignore_left: list[str] = None,
+        ignore_right: list[str] = None,
+        ignore_undef: list[Any] = None,
+    ) -> None:
+        if match_map is None:
+            raise ValueError("match_map cannot be empty.")
+        self.right_keys = tuple(match_map.keys())
+        self.left_keys = tuple(match_map.values())
+        self.left_signature = _key_getter(self.left_keys)
+        self.right_signature = _key_getter(self.right_keys)
+        mapped = frozenset(self.right_keys) | frozenset(self.left_keys)
+        self.skip_left = mapped | frozenset(ignore_left or [])
+        self.skip_right = mapped | frozenset(ignore_right or [])
+        self.undef = tuple((type(item), item) for item in ignore_undef or [])
+
+    def is_undef(self, value: Any) -> bool:
+        """Same as is_undef(value, ignore_undef)."""
+        if not self.undef or isinstance(value, (Decimal, FixedPoint)):
+            return False
+        for item_type, item in self.undef:
+            if isinstance(value, item_type) and value == item:
+                return True
+        return False
+
+    def __call__(self, left: dict[str, Any], right: dict[str, Any]) -> bool:
+        try:
+            if self.left_signature(left) != self.right_signature(right):
+                return False
+        except KeyError:
+            return False
+
+        skip_left, skip_right, undef = self.skip_left, self.skip_right, self.undef
+        for key, value in left.items():
+            if key in skip_left:
+                continue
+            if key in right:
+                other = right[key]
+                if value == other or self.is_undef(value) or self.is_undef(other):
+                    continue
+                return False
+            if undef:
+                continue
+            if value is not None:
+                return False
+        for key, value in right.items():
+            if key in skip_right:
+                continue
+            if key in left:
+                if key not in skip_left:
+                    continue  # already compared above
+                other = left[key]
+                if value == other or self.is_undef(value) or self.is_undef(other):
+                    continue
+                return False
+            if undef:
+                continue
+            if value is not None:
+                return False
+        return True
+
+
 def pick_one(
     left: list[dict[str, Any]],
     right: dict[str, Any],
@@ -101,9 +200,10 @@ def pick_one(
 
     match_map dictates, which keys from "right" (key) must match keys in "left" (value).
     """
+    matches = MatchComparator(match_map, ignore_left, ignore_right, ignore_values)
     match_idx = set()
     for idx, row in enumerate(left):
-        if dicts_match_by_map(row, right, match_map, ignore_left, ignore_right, ignore_values):
+        if matches(row, right):
             match_idx.add(idx)
     # print(f"{match_idx=}")
     if len(match_idx) == 0:
@@ -120,10 +220,176 @@ def pick_one(
     return result
 
 
+class MatchIndex:
+    """Hash index of rows on the key columns of a match map, see dicts_match_by_map().
+
+    Allows to pick the unique match for a row without scanning all rows, and to consume matched rows without
+    shifting a list.  Rows lacking one of the key columns can never match and are not indexed.  Rows with unhashable
+    key values are considered as candidates for every lookup.
+
+    With a range column, each bucket is additionally sorted by the values of that column, so that candidates can be
+    restricted to a closed interval of values by bisection.  Rows with an undefined range value are not indexed then,
+    and the rows of a bucket whose range values cannot be compared with each other are treated like unhashable ones.
+    """
+
+    def __init__(self, rows: list[dict[str, Any]], key_columns: list[str], range_column: str | None = None) -> None:
+        self.rows = rows
+        self.key_columns = key_columns
+        self.range_column = range_column
+        self.consumed = [False] * len(rows)
+        self.buckets: dict[tuple, list[int]] = {}
+        self.unhashable: list[int] = []
+        for idx, row in enumerate(rows):
+            if any(column not in row for column in key_columns):
+                continue
+            if range_column is not None and is_undef(row.get(range_column, None), [None, ""]):
+                continue
+            key = tuple(row[column] for column in key_columns)
+            try:
+                self.buckets.setdefault(key, []).append(idx)
+            except TypeError:
+                self.unhashable.append(idx)
+        self.range_values: dict[tuple, list[Any]] = {}
+        if range_column is not None:
+            for key, indices in list(self.buckets.items()):
+                try:
+                    indices.sort(key=lambda idx: rows[idx][range_column])
+                except TypeError:
+                    self.unhashable.extend(self.buckets.pop(key))
+                    continue
+                self.range_values[key] = [rows[idx][range_column] for idx in indices]
+            self.unhashable.sort()
+
+    def candidates(self, key: tuple, bounds: tuple[Any, Any] | None = None) -> list[int]:
+        """Indices of all unconsumed rows that may match the given key and range bounds, in row order."""
+        try:
+            found = self.buckets.get(key, [])
+        except TypeError:
+            return [idx for idx in range(len(self.rows)) if not self.consumed[idx]]
+        if bounds is not None and found:
+            values = self.range_values[key]
+            try:
+                found = sorted(found[bisect_left(values, bounds[0]) : bisect_right(values, bounds[1])])
+            except TypeError:
+                pass  # bounds of another type than the values; all of the bucket are candidates then
+        if self.unhashable:
+            found = sorted(found + self.unhashable)
+        return [idx for idx in found if not self.consumed[idx]]
+
+    def pick_index(
+        self,
+        right: dict[str, Any],
+        right_columns: list[str],
+        matches: Callable[[dict], bool],
+        bounds: tuple[Any, Any] | None = None,
+    ) -> int | None:
+        """Consume the only row matching the right dict and return its index, None if there is no or more than one.
+
+        right_columns lists the keys of the right dict corresponding to the index' key columns. The matches function
+        decides whether a candidate row matches the right dict.
+        """
+        if any(column not in right for column in right_columns):
+            return None
+        key = tuple(right[column] for column in right_columns)
+        match_idx = [idx for idx in self.candidates(key, bounds) if matches(self.rows[idx])]
+        if len(match_idx) == 0:
+            return None
+        if len(match_idx) > 1:
+            logger.warning(f"multiple matches: {match_idx=}")
+            return None
+        self.consumed[match_idx[0]] = True
+        return match_idx[0]
+
+    def pick_one(
+        self,
+        right: dict[str, Any],
+        right_columns: list[str],
+        matches: Callable[[dict], bool],
+        bounds: tuple[Any, Any] | None = None,
+    ) -> dict:
+        """Consume and return a copy of the only row matching the right dict, like pick_one() does for lists."""
+        idx = self.pick_index(right, right_columns, matches, bounds)
+        return {} if idx is None else self.rows[idx].copy()
+
+    def remaining(self) -> list[dict[str, Any]]:
+        """All rows not yet consumed, in their original order."""
+        return [row for row, consumed in zip(self.rows, self.consumed) if not consumed]
+
+
 @dataclass
 class LeftRightMatchRule:
+    """Rule to match entries of two importables, see dicts_match_by_map().
+
+    tolerances maps right keys of left_right_map to the maximum allowed difference of the values, e.g. a timedelta for
+    date columns or a number for amounts.  Tolerant keys are excluded from the exact comparison.
+    """
+
     left_right_map: dict[str, str]
     ignored_fields: list[str]
+    tolerances: dict[str, Any] = field(default_factory=dict)
+    _comparators: dict[tuple, MatchComparator] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        unknown = [key for key in self.tolerances if key not in self.left_right_map]
+        if unknown:
+            raise ValueError(f"Tolerances for {unknown} not in match map {self.left_right_map}")
+
+    @property
+    def exact_map(self) -> dict[str, str]:
+        return {right: left for right, left in self.left_right_map.items() if right not in self.tolerances}
+
+    @property
+    def range_column(self) -> str | None:
+        """Left key of the first tolerant column, used for an interval lookup, see MatchIndex."""
+        for right in self.tolerances:
+            return self.left_right_map[right]
+        return None
+
+    def bounds(self, right: dict[str, Any]) -> tuple[Any, Any] | None:
+        """Interval of acceptable values in the range column for the given right dict, None if there is none."""
+        for key, tolerance in self.tolerances.items():
+            value = right.get(key, None)
+            if value is None:
+                return None
+            tolerance = _tolerance_for(value, tolerance)
+            try:
+                return value - tolerance, value + tolerance
+            except TypeError:
+                return None
+        return None
+
+    def comparator(self, ignored_keys: list[str], undef: list[Any]) -> MatchComparator:
+        """Compiled comparison of the exact keys, cached per ignore and undef lists."""
+        cache_key = (tuple(ignored_keys), tuple(undef))
+        comparator = self._comparators.get(cache_key)
+        if comparator is None:
+            ignore_left = ignored_keys + [self.left_right_map[key] for key in self.tolerances]
+            ignore_right = ignored_keys + list(self.tolerances)
+            comparator = MatchComparator(self.exact_map, ignore_left, ignore_right, undef)
+            self._comparators[cache_key] = comparator
+        return comparator
+
+    def matches(self, left: dict[str, Any], right: dict[str, Any], ignored_keys: list[str], undef: list[Any]) -> bool:
+        """Check the dicts like dicts_match_by_map() on the exact keys and for the allowed differences otherwise."""
+        if not self.comparator(ignored_keys, undef)(left, right):
+            return False
+        for key, tolerance in self.tolerances.items():
+            left_value, right_value = left.get(self.left_right_map[key], None), right.get(key, None)
+            if left_value is None or right_value is None:
+                return False
+            try:
+                if abs(left_value - right_value) > _tolerance_for(right_value, tolerance):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+
+def _tolerance_for(value: Any, tolerance: Any) -> Any:
+    # Decimal values do not mix with float tolerances
+    if isinstance(value, (Decimal, FixedPoint)) and isinstance(tolerance, float):
+        return Decimal(str(tolerance))
+    return tolerance
 
 
 def already_in(from_data: dict[str, str], to_data: dict[str, str], ignore_keys: list[str], undef: list[str]):
@@ -143,51 +409,142 @@ def already_in(from_data: dict[str, str], to_data: dict[str, str], ignore_keys:
     return True
 
 
+def match_by_rule(
+    src: list[dict[str, Any]],
+    tgt: list[dict[str, Any]],
+    match_rule: LeftRightMatchRule,
+    addable_fields: list[str],
+) -> list[tuple[int, int]]:
+    """Find the unique matching target row for each source row, using a single match rule.
+
+    Returns pairs of source and target row indices in source order; each target row is matched at most once.
+    """
+    undef = [None, ""]
+    ignore_keys = match_rule.ignored_fields
+    pairs = []
+    # hash join on the exactly matched keys: only rows with equal key values need a full comparison.
+    # with tolerances, candidates are further restricted to an interval of the first tolerant key.
+    match_map = match_rule.exact_map
+    index = MatchIndex(tgt, list(match_map.values()), match_rule.range_column)
+    right_columns = list(match_map.keys())
+    for src_idx, row in enumerate(src):
+        ignored_keys = [k for k in ignore_keys]
+        # logger.warning(f"#### {row=}")
+        if row.get("_allow_add", False):
+            ignored_keys.extend(addable_fields)
+            # print(f"***** {ignored_keys}")
+
+        def matches(left: dict[str, Any]) -> bool:
+            return match_rule.matches(left, row, ignored_keys, undef)
+
+        bounds = match_rule.bounds(row)
+        if match_rule.tolerances and bounds is None:
+            continue
+        tgt_idx = index.pick_index(row, right_columns, matches, bounds)
+        if tgt_idx is not None:
+            pairs.append((src_idx, tgt_idx))
+    return pairs
+
+
+def match_by_rule_partitioned(
+    src: list[dict[str, Any]],
+    tgt: list[dict[str, Any]],
+    match_rule: LeftRightMatchRule,
+    addable_fields: list[str],
+    executor: Executor,
+    partitions: int,
+) -> list[tuple[int, int]]:
+    """Same as match_by_rule(), but with both sides hash-partitioned on the exact keys of the rule.
+
+    Rows can only match if their exact keys are equal, so partitions are matched independently by the executor.
+    Falls back to match_by_rule() if the rule has no exact keys or there are unhashable key values.
+    """
+    match_map = match_rule.exact_map
+    if not match_map or partitions < 2:
+        return match_by_rule(src, tgt, match_rule, addable_fields)
+
+    def partition(rows: list[dict[str, Any]], columns: list[str]) -> list[list[int]] | None:
+        parts = [[] for _ in range(partitions)]
+        for idx, row in enumerate(rows):
+            if any(column not in row for column in columns):
+                continue  # cannot match at all
+            try:
+                parts[hash(tuple(row[column] for column in columns)) % partitions].append(idx)
+            except TypeError:
+                return None
+        return parts
+
+    src_parts, tgt_parts = partition(src, list(match_map.keys())), partition(tgt, list(match_map.values()))
+    if src_parts is None or tgt_parts is None:
+        return match_by_rule(src, tgt, match_rule, addable_fields)
+
+    jobs = []
+    for src_part, tgt_part in zip(src_parts, tgt_parts):
+        if src_part and tgt_part:
+            rows = [src[idx] for idx in src_part], [tgt[idx] for idx in tgt_part]
+            jobs.append((src_part, tgt_part, executor.submit(match_by_rule, *rows, match_rule, addable_fields)))
+
+    # map back to the global indices, in the order match_by_rule() would have produced
+    pairs = []
+    for src_part, tgt_part, job in jobs:
+        pairs.extend((src_part[src_idx], tgt_part[tgt_idx]) for src_idx, tgt_idx in job.result())
+    pairs.sort()
+    return pairs
+
+
+def merge_rows(source_row: dict[str, Any], target_row: dict[str, Any], ignored_keys: list[str]) -> dict[str, Any]:
+    """Return a copy of the target row, completed with the values of the matching source row."""
+    undef = [None, ""]
+    match = target_row.copy()
+    if not already_in(source_row, match, ignored_keys, undef):
+        msrc = "|".join([s for s in [match.get("imported_from", None), source_row.get("imported_from", None)] if s])
+        # print(msrc)
+        match.update(
+            {k: v for k, v in source_row.items() if not is_undef(v, undef) and is_undef(match.get(k, None), undef)}
+        )
+        match["imported_from"] = msrc
+    return match
+
+
 def importable_merge_two(
     source: ImporTable,
     target: ImporTable,
     match_rules: list[LeftRightMatchRule],
     addable_fields: list[str],
+    workers: int = 1,
 ) -> ImporTable:
-    """Merge two importables, using a set of match rules to identify mergable entries. Not suitable for inner merges."""
+    """Merge two importables, using a set of match rules to identify mergable entries. Not suitable for inner merges.
+
+    With more than one worker, the rows are partitioned by the keys of each rule and matched in a process pool, see
+    match_by_rule_partitioned(); the result is the same.  Only the matching runs in parallel, while the matched rows
+    are still merged here, and all rows are pickled to the workers.  This only pays off with as many idle cores as
+    workers and well over 100,000 rows; otherwise, workers=1 is faster.  The commands merge with ImporTableMerger
+    instead, which has no parallel mode, so workers is only available to callers of this function.
+    """
     # this implementation consumes all merable items from both importables to produce new entries.
     # finally, all non-mergable items from both importables are also added.
     imp = target.clone_empty()
 
     tgt = target.data_vector.copy()
     src = source.data_vector.copy()
-    undef = [None, ""]
-
-    def try_merge(match_map: dict[str, str], ignore_keys: list[str]) -> None:
-        rem = []
-        if not tgt:
-            # print(f"Already finished, skipping {match_map}")
-            return src
-        for row in src:
-            ignored_keys = [k for k in ignore_keys]
-            # logger.warning(f"#### {row=}")
-            if row.get("_allow_add", False):
-                ignored_keys.extend(addable_fields)
-                # print(f"***** {ignored_keys}")
-            match = pick_one(tgt, row, match_map, ignored_keys, ignored_keys, ignore_values=undef, remove_match=True)
-            if not match:
-                rem.append(row)
-                continue
-            if not already_in(row, match, ignored_keys, undef):
-                msrc = "|".join([s for s in [match.get("imported_from", None), row.get("imported_from", None)] if s])
-                # print(msrc)
-                match.update(
-                    {k: v for k, v in row.items() if not is_undef(v, undef) and is_undef(match.get(k, None), undef)}
-                )
-                match["imported_from"] = msrc
-            imp.data_vector.append(match)
-        return rem
-
-    for match_rule in match_rules:
-        if not tgt:
-            break
 
-        src = try_merge(match_rule.left_right_map, match_rule.ignored_fields)
+    with stage("merge"), ProcessPoolExecutor(workers) if workers > 1 else nullcontext() as executor:
+        for match_rule in match_rules:
+            if not tgt:
+                break
+            if executor is None:
+                pairs = match_by_rule(src, tgt, match_rule, addable_fields)
+            else:
+                pairs = match_by_rule_partitioned(src, tgt, match_rule, addable_fields, executor, workers)
+            for src_idx, tgt_idx in pairs:
+                row = src[src_idx]
+                ignored_keys = match_rule.ignored_fields + (addable_fields if row.get("_allow_add", False) else [])
+                imp.data_vector.append(merge_rows(row, tgt[tgt_idx], ignored_keys))
+            matched_src, matched_tgt = {src_idx for src_idx, _ in pairs}, {tgt_idx for _, tgt_idx in pairs}
+            src = [row for idx, row in enumerate(src) if idx not in matched_src]
+            tgt = [row for idx, row in enumerate(tgt) if idx not in matched_tgt]
+    count("merge_input_rows", len(source))
+    count("merge_matches", len(imp))
 
     # Todo: find better means of debugging without adding pandas dependency
     # print()
@@ -241,7 +598,17 @@ def importable_merge_one(
         if item.get("_allow_add", False):
             ignored_keys.extend(addable_fields)
             # print(f"***** {ignored_keys}")
-        match = pick_one(tgt, item, match_map, ignored_keys, ignored_keys, ignore_values=undef, remove_match=True)
+        if match_rule.tolerances:
+            if match_rule.bounds(item) is None:
+                continue
+            # for a single item, sorting the target into a MatchIndex costs more than comparing every row once;
+            # to merge many items, see ImporTableMerger
+            match_idx = [idx for idx, left in enumerate(tgt) if match_rule.matches(left, item, ignored_keys, undef)]
+            if len(match_idx) > 1:
+                logger.warning(f"multiple matches: {match_idx=}")
+            match = tgt.pop(match_idx[0]).copy() if len(match_idx) == 1 else {}
+        else:
+            match = pick_one(tgt, item, match_map, ignored_keys, ignored_keys, ignore_values=undef, remove_match=True)
         if not match:
             continue
         if not already_in(item, match, ignored_keys, undef):
@@ -268,13 +635,336 @@ def importable_merge_one(
     return imp
 
 
+def _is_indexed(value: Any) -> bool:
+    """Whether a column value is used to look up merge candidates, see ImporTableMerger."""
+    if is_undef(value, [None, ""]):
+        return False
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class MergeSnapshot:
+    """Rows of a merge result in columnar form, together with a value index per column, see ImporTableMerger.save().
+
+    Each column is stored as the list of its distinct values and an array of value codes per row (0 if the row lacks
+    the column).  The index of a column holds the row numbers grouped by equal values, with the rows lacking an
+    indexable value in front, so that loading a snapshot does not need to create any per-row objects.  Rows are only
+    materialized when accessed.
+    """
+
+    magic = b"contablo-merge-state-1\n"
+
+    def __init__(
+        self,
+        size: int,
+        columns: dict[str, tuple[list[Any], array]],
+        index: dict[str, tuple[list[Any], array, array]],
+    ) -> None:
+        self.size = size
+        self.columns = columns
+        self.index = index
+        self._groups: dict[str, dict[Any, int]] = {}
+
+    @classmethod
+    def from_rows(cls, rows: list[dict[str, Any]]) -> MergeSnapshot:
+        size = len(rows)
+        columns: dict[str, tuple[list[Any], array]] = {}
+        codes_by_key: dict[str, dict[Any, int]] = {}
+        for seq, row in enumerate(rows):
+            for column, value in row.items():
+                if column not in columns:
+                    columns[column] = [], array("I", [0]) * size
+                    codes_by_key[column] = {}
+                values, codes = columns[column]
+                # equal values may differ in type or representation, e.g. Decimal("1.0") and Decimal("1.00")
+                try:
+                    key = value if type(value) is str else (type(value), repr(value), hash(value))
+                except TypeError:
+                    key = (id(value), seq)
+                code = codes_by_key[column].get(key)
+                if code is None:
+                    values.append(value)
+                    code = codes_by_key[column][key] = len(values)
+                codes[seq] = code
+
+        index = {}
+        for column, (values, codes) in columns.items():
+            # group 0 holds the rows lacking an indexable value, the other groups are equal values
+            groups: dict[Any, int] = {}
+            group_keys = []
+            group_of_code = [0] * (len(values) + 1)
+            for code, value in enumerate(values, 1):
+                if _is_indexed(value):
+                    group = groups.get(value)
+                    if group is None:
+                        group_keys.append(value)
+                        group = groups[value] = len(group_keys)
+                    group_of_code[code] = group
+            counts = [0] * (len(group_keys) + 1)
+            for code in codes:
+                counts[group_of_code[code]] += 1
+            offsets = array("I", [0]) * (len(group_keys) + 2)
+            for group, n in enumerate(counts):
+                offsets[group + 1] = offsets[group] + n
+            fill = list(offsets[:-1])
+            order = array("I", [0]) * size
+            for seq, code in enumerate(codes):
+                group = group_of_code[code]
+                order[fill[group]] = seq
+                fill[group] += 1
+            index[column] = group_keys, order, offsets
+        return cls(size, columns, index)
+
+    def save(self, filename: str) -> None:
+        """Save to a temporary file first, so that the previous state is only replaced by a complete one."""
+        temp_name = f"{filename}.{os.getpid()}.tmp"
+        try:
+            with open(temp_name, "wb") as f:
+                f.write(self.magic)
+                pickle.dump((self.size, self.columns, self.index), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_name, filename)
+        finally:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+
+    @classmethod
+    def load(cls, filename: str) -> MergeSnapshot:
+        with open(filename, "rb") as f:
+            if f.read(len(cls.magic)) != cls.magic:
+                raise ValueError(f"{filename} is not a contablo merge state.")
+            return cls(*pickle.load(f))
+
+    def row(self, seq: int) -> dict[str, Any]:
+        row = {}
+        for column, (values, codes) in self.columns.items():
+            code = codes[seq]
+            if code:
+                row[column] = values[code - 1]
+        return row
+
+    def postings(self, column: str, value: Any) -> Sequence[int]:
+        """Row numbers with a value equal to the given one in the column."""
+        if column not in self.index:
+            return ()
+        group_keys, order, offsets = self.index[column]
+        groups = self._groups.get(column)
+        if groups is None:
+            groups = self._groups[column] = dict(zip(group_keys, range(1, len(group_keys) + 1)))
+        group = groups.get(value)
+        if group is None:
+            return ()
+        return order[offsets[group] : offsets[group + 1]]
+
+    def lacking(self, column: str) -> Sequence[int]:
+        """Row numbers without an indexable value in the column."""
+        if column not in self.index:
+            return range(self.size)
+        _, order, offsets = self.index[column]
+        return order[offsets[0] : offsets[1]]
+
+
+class ImporTableMerger:
+    """Merge any number of importables into a target, with the same result as folding them with importable_merge_one().
+
+    All rows merged so far are indexed by their defined column values, so that finding the candidates for a match
+    does not need to compare against every row.  Like with importable_merge_one(), a merged row moves to the end,
+    and unmatched rows are appended; ties are resolved by input order.
+    """
+
+    undef = [None, ""]
+
+    def __init__(
+        self,
+        target: ImporTable,
+        match_rules: list[LeftRightMatchRule] = None,
+        addable_fields: list[str] = None,
+        snapshot: MergeSnapshot | None = None,
+    ) -> None:
+        self.target = target
+        self.match_rules = match_rules or []
+        self.addable_fields = addable_fields or []
+        # rows of a previous merge, numbered from 0 to snapshot.size; removed ones are merged into newer rows
+        self.snapshot = snapshot
+        self.removed: set[int] = set()
+        # newer rows by sequence number; the dict's insertion order is the order of the result
+        self.rows: dict[int, dict[str, Any]] = {}
+        self.next_seq = snapshot.size if snapshot is not None else 0
+        # sequence numbers of the rows by column and value, and of the rows lacking a defined value per column
+        self.postings: dict[str, dict[Any, set[int]]] = {}
+        self.lacking: dict[str, set[int]] = {}
+        for row in target.iter_data():
+            self._insert(row)
+
+    @classmethod
+    def load(
+        cls,
+        filename: str,
+        target: ImporTable,
+        match_rules: list[LeftRightMatchRule] = None,
+        addable_fields: list[str] = None,
+    ) -> ImporTableMerger:
+        """Continue merging into the result saved with save(); rows of the target are merged after the saved ones."""
+        return cls(target, match_rules, addable_fields, MergeSnapshot.load(filename))
+
+    def save(self, filename: str, result: ImporTable | None = None) -> None:
+        """Save the current result together with its index, see MergeSnapshot.
+
+        A result just returned by result() may be given, so that its rows need not be collected again.
+        """
+        if result is None:
+            result = self.result()
+        MergeSnapshot.from_rows(result.data_vector).save(filename)
+
+    def __len__(self) -> int:
+        if self.snapshot is None:
+            return len(self.rows)
+        return self.snapshot.size - len(self.removed) + len(self.rows)
+
+    def _row(self, seq: int) -> dict[str, Any]:
+        row = self.rows.get(seq)
+        return row if row is not None else self.snapshot.row(seq)
+
+    def _indexed_values(self, row: dict[str, Any]) -> dict[str, Any]:
+        return {key: value for key, value in row.items() if _is_indexed(value)}
+
+    def _insert(self, row: dict[str, Any]) -> None:
+        seq = self.next_seq
+        self.next_seq += 1
+        self.rows[seq] = row
+        values = self._indexed_values(row)
+        for key, value in values.items():
+            if key not in self.postings:
+                self.postings[key] = {}
+                self.lacking[key] = set(self.rows) - {seq}
+            self.postings[key].setdefault(value, set()).add(seq)
+        for key, lacking in self.lacking.items():
+            if key not in values:
+                lacking.add(seq)
+
+    def _remove(self, seq: int) -> None:
+        if seq not in self.rows:
+            self.removed.add(seq)
+            return
+        row = self.rows.pop(seq)
+        for lacking in self.lacking.values():
+            lacking.discard(seq)
+        for key, value in self._indexed_values(row).items():
+            postings = self.postings[key][value]
+            postings.discard(seq)
+            if not postings:
+                del self.postings[key][value]
+
+    def _candidates(self, item: dict[str, Any], match_rule: LeftRightMatchRule, ignored_keys: list[str]) -> set[int]:
+        """Superset of the rows that may match the item, narrowed by its most selective column value."""
+        mapped = set(match_rule.left_right_map) | set(match_rule.left_right_map.values())
+        exact_map = match_rule.exact_map
+        best = None
+        for key, value in self._indexed_values(item).items():
+            if key in ignored_keys:
+                continue
+            if key in exact_map:
+                # mapped keys must be equal in the mapped column
+                column = exact_map[key]
+            elif key in mapped:
+                continue
+            else:
+                # other keys must be equal unless missing or undefined in the row
+                column = key
+            parts = []
+            if column in self.postings:
+                parts += [self.postings[column].get(value, ()), self.lacking[column]]
+            elif self.snapshot is None or column not in self.snapshot.index:
+                continue
+            else:
+                parts.append(self.rows.keys())
+            if self.snapshot is not None:
+                parts += [self.snapshot.postings(column, value), self.snapshot.lacking(column)]
+            size = sum(len(part) for part in parts)
+            if best is None or size < best[0]:
+                best = size, parts
+        if best is None:
+            parts = [self.rows.keys(), range(self.snapshot.size if self.snapshot is not None else 0)]
+        else:
+            parts = best[1]
+        return set().union(*parts) - self.removed
+
+    def merge_row(self, item: dict[str, Any]) -> None:
+        """Merge a single row, see importable_merge_one()."""
+        for match_rule in self.match_rules:
+            if not len(self):
+                break
+            ignored_keys = [k for k in match_rule.ignored_fields]
+            if item.get("_allow_add", False):
+                ignored_keys.extend(self.addable_fields)
+            if match_rule.tolerances and match_rule.bounds(item) is None:
+                continue
+            match_seqs = sorted(
+                seq
+                for seq in self._candidates(item, match_rule, ignored_keys)
+                if match_rule.matches(self._row(seq), item, ignored_keys, self.undef)
+            )
+            if len(match_seqs) > 1:
+                logger.warning(f"multiple matches: {match_seqs=}")
+            if len(match_seqs) != 1:
+                continue
+            match = self._row(match_seqs[0]).copy()
+            self._remove(match_seqs[0])
+            if not already_in(item, match, ignored_keys, self.undef):
+                msrc = "|".join([s for s in [match.get("imported_from", None), item.get("imported_from", None)] if s])
+                match.update(
+                    {
+                        k: v
+                        for k, v in item.items()
+                        if not is_undef(v, self.undef) and is_undef(match.get(k, None), self.undef)
+                    }
+                )
+                match["imported_from"] = msrc
+            elif item.get("_allow_add", False):
+                for key in self.addable_fields:
+                    if match.get(key, None) is not None and item.get(key, None) is not None:
+                        match[key] = match[key] + item[key]
+            self._insert(match)
+            return
+        self._insert(item)
+
+    def add(self, source: ImporTable) -> None:
+        """Merge all rows of the source importable."""
+        with stage("merge"):
+            for item in source.iter_data():
+                self.merge_row(item)
+        count("merge_input_rows", len(source))
+
+    def result(self) -> ImporTable:
+        imp = self.target.clone_empty()
+        if self.snapshot is not None:
+            imp.data_vector = [self.snapshot.row(seq) for seq in range(self.snapshot.size) if seq not in self.removed]
+        imp.data_vector.extend(self.rows.values())
+        return imp
+
+
 def importable_merge(
     source: ImporTable,
     target: ImporTable,
     match_rules: list[LeftRightMatchRule] = None,
     addable_fields: list[str] = None,
 ) -> ImporTable:
-    result = target
-    for item in source.iter_data():
-        result = importable_merge_one(result, item, match_rules or [], addable_fields or [])
-    return result
+    """Merge the source importable into the target row by row, see importable_merge_one()."""
+    merger = ImporTableMerger(target, match_rules, addable_fields)
+    merger.add(source)
+    return merger.result()
+
+
+def importable_merge_all(
+    importables: list[ImporTable],
+    target: ImporTable,
+    match_rules: list[LeftRightMatchRule] = None,
+    addable_fields: list[str] = None,
+) -> ImporTable:
+    """Merge all importables into the target in one pass, equivalent to folding them with importable_merge()."""
+    merger = ImporTableMerger(target, match_rules, addable_fields)
+    for importable in importables:
+        merger.add(importable)
+    return merger.result()
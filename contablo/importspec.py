@@ -1,18 +1,126 @@
 from __future__ import annotations
 
+import functools
+import gc
+import hashlib
 import logging
+import operator
+import os
+import pickle
+import string
+import threading
+from dataclasses import dataclass
 from typing import Any
+from typing import Callable
 from typing import Iterable
 
 import pydantic
+from arithmetic_expressions import Expression
 
 from contablo.csv_helper import CsvFileInfo
+from contablo.fields import FieldSpec
+from contablo.fields import FieldSpecRegistry
+from contablo.importable import ImportDatum
+from contablo.match import Condition
+from contablo.match import TemplatePrefixIndex
+from contablo.match import compile_condition
+from contablo.profiling import count
 
 logger = logging.getLogger(__file__)
 
 
 class StrictAttribBaseModel(pydantic.BaseModel):
-    model_config = pydantic.ConfigDict(extra="forbid")
+    model_config = pydantic.ConfigDict(extra="forbid", validate_assignment=True)
+
+
+class DatumTemplates:
+    """Defaults or implies of a spec, with their "value/format" entries parsed once.
+
+    Values may refer to the columns of a row, e.g. "{Date}" as with format_implicit(); a reference to a single column
+    is looked up directly.  All other values are turned into ImportDatum objects once and shared by all rows.
+    """
+
+    def __init__(self, source_lbl: str, spec: dict[str, str], fmt_sep: str = "/") -> None:
+        self.source_lbl = source_lbl
+        self.spec = dict(spec)  # to tell whether the spec was changed since, see is_outdated()
+        # field, constant datum or None, referenced column or None, template, format
+        self.entries: list[tuple[str, ImportDatum | None, str | None, str, str]] = []
+        for field, text in spec.items():
+            value, format = text.split(fmt_sep, 1) if fmt_sep in text else (text, "")
+            if "{" not in value and "}" not in value:
+                datum = ImportDatum(source_lbl=source_lbl, raw_value=value, format=format)
+                self.entries.append((field, datum, None, value, format))
+                continue
+            try:
+                parts = list(string.Formatter().parse(value))
+            except ValueError as e:
+                raise ValueError(f"Malformed template <{value}> for {field}: {e}") from e
+            column = None
+            if len(parts) == 1:
+                literal, name, format_spec, conversion = parts[0]
+                if not literal and name and not format_spec and conversion is None and not set(".[").intersection(name):
+                    column = name
+            self.entries.append((field, None, column, value, format))
+        self.row_values = any(datum is None for _, datum, _, _, _ in self.entries)
+
+    def is_outdated(self, spec: dict[str, str]) -> bool:
+        return self.spec != spec
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, DatumTemplates) and (self.source_lbl, self.entries) == (
+            other.source_lbl,
+            other.entries,
+        )
+
+    def __call__(self, row_dict: dict[str, str] | None = None) -> dict[str, ImportDatum]:
+        """Data for a row; without row_dict, templates are not filled in."""
+        result = {}
+        for field, datum, column, template, format in self.entries:
+            if datum is None:
+                if row_dict is None:
+                    value = template
+                elif column is not None:
+                    value = row_dict[column]
+                else:
+                    value = template.format_map(row_dict)
+                datum = ImportDatum(source_lbl=self.source_lbl, raw_value=value, format=format)
+            result[field] = datum
+        return result
+
+
+class ExtraFields:
+    """Extra fields and transforms of a spec, resolved once and shared by all importables created from the spec.
+
+    The field specs depend on the registry and are made again only if another registry is used or it was changed.
+    """
+
+    def __init__(self, fields: list[dict[str, str]], transforms: dict[str, str]) -> None:
+        # copies, to tell whether the spec's fields or transforms were changed since, see is_outdated()
+        self.fields = [dict(field) for field in fields]
+        self.transforms = dict(transforms)
+        self.expressions: dict[str, Expression] = {}
+        for column, text in transforms.items():
+            try:
+                self.expressions[column] = Expression.parse(text)
+            except (SyntaxError, ValueError) as e:
+                raise ValueError(f"Malformed transform <{text}> for {column}: {e}") from e
+        self._field_specs: tuple[FieldSpecRegistry, int, list[FieldSpec]] | None = None
+
+    def field_specs(self, registry: FieldSpecRegistry) -> list[FieldSpec]:
+        cached = self._field_specs
+        if cached is None or cached[0] is not registry or cached[1] != registry.version:
+            cached = self._field_specs = registry, registry.version, registry.make_spec_list(self.fields)
+        return cached[2]
+
+    def is_outdated(self, fields: list[dict[str, str]], transforms: dict[str, str]) -> bool:
+        return self.fields != fields or self.transforms != transforms
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ExtraFields) and (self.fields, self.transforms) == (other.fields, other.transforms)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # field specs are made for a registry of this process
+        return dict(self.__dict__, _field_specs=None)
 
 
 class ImportMatchRule(StrictAttribBaseModel):
@@ -22,6 +130,53 @@ class ImportMatchRule(StrictAttribBaseModel):
     # Todo: would we need onlyif_all, onlyif_any, notiff_all, notif_any, and which would take precendence?
     onlyif: dict[str, str] = {}  # key: field, value: condition; all conditions must match
     # notif: dict[str, str] = {}  # key: field, value: condition
+    _conditions: dict[str, Condition] = pydantic.PrivateAttr(default_factory=dict)
+    _conditions_source: dict[str, str] = pydantic.PrivateAttr(default_factory=dict)
+    _implied: DatumTemplates = pydantic.PrivateAttr(default_factory=lambda: DatumTemplates("(matched rule)", {}))
+
+    @pydantic.field_validator("onlyif")
+    @classmethod
+    def compile_onlyif(cls, onlyif: dict[str, str]) -> dict[str, str]:
+        """Fail on malformed conditions when loading the spec rather than on the first affected row."""
+        for condition in onlyif.values():
+            compile_condition(condition)
+        return onlyif
+
+    @pydantic.field_validator("implies")
+    @classmethod
+    def compile_implies(cls, implies: dict[str, str]) -> dict[str, str]:
+        DatumTemplates("(matched rule)", implies)
+        return implies
+
+    def model_post_init(self, __context: Any) -> None:
+        self._compile_conditions()
+        self._implied = DatumTemplates("(matched rule)", self.implies)
+
+    def _compile_conditions(self) -> None:
+        self._conditions = {field: compile_condition(condition) for field, condition in self.onlyif.items()}
+        self._conditions_source = dict(self.onlyif)
+
+    @property
+    def conditions(self) -> dict[str, Condition]:
+        """The onlyif conditions, compiled for use with check_conditions(), and again once onlyif was changed."""
+        if self._conditions_source != self.onlyif:
+            self._compile_conditions()
+        return self._conditions
+
+    @property
+    def implied(self) -> DatumTemplates:
+        """The implied data, compiled from implies, and again once implies was changed."""
+        if self._implied.is_outdated(self.implies):
+            self._implied = DatumTemplates("(matched rule)", self.implies)
+        return self._implied
+
+    @property
+    def implies_row_values(self) -> bool:
+        """True if implied values refer to the values of the row, e.g. "{Date}", and need to be formatted per row."""
+        return self.implied.row_values
+
+
+_rule_template = operator.attrgetter("rule")
 
 
 class ImportColumnSpec(StrictAttribBaseModel):
@@ -38,6 +193,24 @@ class ImportColumnSpec(StrictAttribBaseModel):
     map: dict[str, str] | None = {}
     ignore: list[str] | None = []
     samples: list[str] | None = []
+    _match_index: TemplatePrefixIndex = pydantic.PrivateAttr(default_factory=lambda: TemplatePrefixIndex([]))
+    _match_index_rules: tuple[str, ...] | None = pydantic.PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._sync_match_index()
+
+    def _sync_match_index(self) -> None:
+        # rebuild if any rule was replaced, added or changed; collecting the templates is cheap next to matching them
+        templates = tuple(map(_rule_template, self.match or ()))
+        if self._match_index_rules != templates:
+            self._match_index = TemplatePrefixIndex(list(templates))
+            self._match_index_rules = templates
+
+    def match_candidates(self, raw: str) -> list[tuple[int, ImportMatchRule]]:
+        """The match rules that may match the raw value, with their index and in their original order."""
+        self._sync_match_index()
+        rules = self.match or []
+        return [(idx, rules[idx]) for idx in self._match_index.candidates(raw)]
 
 
 class ImportSpec(StrictAttribBaseModel):
@@ -58,13 +231,85 @@ class ImportSpec(StrictAttribBaseModel):
     columns: list[ImportColumnSpec] = []
     fields: list[dict[str, str]] = []
     transforms: dict[str, str] = {}
+    _defaulted: DatumTemplates = pydantic.PrivateAttr(default_factory=lambda: DatumTemplates("(defaults)", {}))
+    _extra: ExtraFields = pydantic.PrivateAttr(default_factory=lambda: ExtraFields([], {}))
+
+    @pydantic.field_validator("defaults")
+    @classmethod
+    def compile_defaults(cls, defaults: dict[str, str]) -> dict[str, str]:
+        DatumTemplates("(defaults)", defaults)
+        return defaults
+
+    @pydantic.field_validator("transforms")
+    @classmethod
+    def compile_transforms(cls, transforms: dict[str, str]) -> dict[str, str]:
+        ExtraFields([], transforms)
+        return transforms
+
+    def model_post_init(self, __context: Any) -> None:
+        self._defaulted = DatumTemplates("(defaults)", self.defaults)
+        self._extra = ExtraFields(self.fields, self.transforms)
+
+    @property
+    def defaulted(self) -> DatumTemplates:
+        """The default data, compiled from defaults, and again once defaults was changed."""
+        if self._defaulted.is_outdated(self.defaults):
+            self._defaulted = DatumTemplates("(defaults)", self.defaults)
+        return self._defaulted
+
+    @property
+    def extra_fields(self) -> ExtraFields:
+        """The extra fields and parsed transforms, shared by all importables created from this spec."""
+        if self._extra.is_outdated(self.fields, self.transforms):
+            self._extra = ExtraFields(self.fields, self.transforms)
+        return self._extra
 
     @property
     def column_labels(self):
         return [c.label for c in self.columns]
 
+    @property
+    def header(self) -> ImportSpecHeader:
+        return ImportSpecHeader(self.label, self.encoding, self.skip_lines, self.delimiter, tuple(self.column_labels))
+
     def matches(self, other: CsvFileInfo) -> bool:
         """Test if this spec can by used to import the file described by the given csv file info."""
+        return self.header.matches(other)
+
+
+@dataclass(frozen=True)
+class ImportSpecHeader:
+    """The parts of an import spec that decide which files it applies to, known without validating the whole spec."""
+
+    label: str
+    encoding: str | None
+    skip_lines: int
+    delimiter: str
+    column_labels: tuple[str, ...]
+
+    @classmethod
+    def from_data(cls, data: dict[str, Any]) -> ImportSpecHeader:
+        """Read the header from spec data as loaded from a config file.
+
+        Raises TypeError if a value is not of the type of the respective ImportSpec attribute; the data may still be
+        valid, but only a validation of the whole spec can tell.
+        """
+        label, encoding = data.get("label"), data.get("encoding")
+        skip_lines, delimiter = data.get("skip_lines", 0), data.get("delimiter", ",")
+        columns = data.get("columns", [])
+        if (
+            not isinstance(label, str)
+            or not (encoding is None or isinstance(encoding, str))
+            or type(skip_lines) is not int
+            or not isinstance(delimiter, str)
+            or not isinstance(columns, list)
+            or not all(isinstance(column, dict) and isinstance(column.get("label"), str) for column in columns)
+        ):
+            raise TypeError("Import spec header needs validation")
+        return cls(label, encoding, skip_lines, delimiter, tuple(column["label"] for column in columns))
+
+    def matches(self, other: CsvFileInfo) -> bool:
+        """Test if the spec can by used to import the file described by the given csv file info."""
         logger.info("ImportSpec.matches")
         if isinstance(other, CsvFileInfo):
             logger.info(f"Checking {other.source_files}")
@@ -78,7 +323,7 @@ class ImportSpec(StrictAttribBaseModel):
                 if chunk.delimiter != self.delimiter:
                     logger.info(f"Chunk {idx} differs in delimiter")
                     continue
-                if chunk.columns != self.column_labels:
+                if tuple(chunk.columns) != self.column_labels:
                     logger.info(f"Chunk {idx} differs in column labels")
                     logger.debug(f"  {chunk.columns=}")
                     logger.debug(f"  {self.column_labels=}")
@@ -89,25 +334,205 @@ class ImportSpec(StrictAttribBaseModel):
         return False
 
 
+class ImportSpecEntry:
+    """An import spec of the registry, known by its header and loaded on first use."""
+
+    def __init__(
+        self,
+        header: ImportSpecHeader,
+        source: str,
+        load: Callable[[], ImportSpec] | None = None,
+        spec: ImportSpec | None = None,
+    ) -> None:
+        self.header = header
+        self.source = source
+        self._load = load
+        self._spec = spec
+        self.error: Exception | None = None  # why the spec could not be loaded
+        self._lock = threading.Lock()
+
+    @property
+    def spec(self) -> ImportSpec | None:
+        """The import spec, or None if it could not be loaded."""
+        if self._load is not None:
+            with self._lock:  # files may be imported concurrently, see DropFolderWatcher
+                if self._load is not None:
+                    count("specs_loaded")
+                    try:
+                        self._spec = self._load()
+                    except pydantic.ValidationError as e:
+                        self.error = e
+                        logger.error(f"Error when trying to initialize import spec from {self.source}: {e}")
+                    except Exception as e:
+                        self.error = e
+                        logger.exception(e)
+                    self._load = None
+        return self._spec
+
+
 class ImportSpecRegistry:
+    """Import specs by source; specs added by header are only loaded once a file may need them."""
+
     def __init__(self) -> None:
-        self.registry: list[ImportSpec] = []
+        self.entries: list[ImportSpecEntry] = []
         self.label_source_map: dict[str, str] = {}
 
-    def iter_specs(self) -> Iterable[ImportSpec]:
-        yield from self.registry
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def iter_specs(self, column_labels: Iterable[str] | None = None) -> Iterable[ImportSpec]:
+        """Yield the specs, or only those for the given column labels, loading them as needed."""
+        column_labels = None if column_labels is None else tuple(column_labels)
+        for entry in self.entries:
+            if column_labels is None or entry.header.column_labels == column_labels:
+                if (spec := entry.spec) is not None:
+                    yield spec
 
     def add_import_spec(self, spec: ImportSpec, source: str) -> None:
-        self.registry.append(spec)
+        self.entries.append(ImportSpecEntry(spec.header, source, spec=spec))
         self.label_source_map[spec.label] = source
 
+    def add_lazy_import_spec(self, header: ImportSpecHeader, source: str, load: Callable[[], ImportSpec]) -> None:
+        """Add a spec by its header; load() is called to get the spec once it is needed."""
+        self.entries.append(ImportSpecEntry(header, source, load))
+        self.label_source_map[header.label] = source
+
     def query_by_file_info(self, info: CsvFileInfo) -> ImportSpec | None:
-        logger.info(f"Scanning {len(self.registry)} specs for {info.source_files}")
-        for spec in self.registry:
-            logger.debug(f"Next is {spec.label}")
-            if spec.matches(info):
+        logger.info(f"Scanning {len(self.entries)} specs for {info.source_files}")
+        for entry in self.entries:
+            logger.debug(f"Next is {entry.header.label}")
+            if entry.header.matches(info) and (spec := entry.spec) is not None:
                 logger.debug(f"Found match: {spec.label}")
                 return spec
 
     def query_source(self, label: str) -> str:
         return self.label_source_map.get(label, None)
+
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint() -> bytes:
+    """Digest of the modules of this package, which changes with any update of the code."""
+    digest = hashlib.blake2b(pydantic.VERSION.encode(), digest_size=16)
+    for entry in sorted(os.scandir(os.path.dirname(__file__)), key=lambda entry: entry.name):
+        if entry.name.endswith(".py"):
+            stat = entry.stat()
+            digest.update(f"{entry.name}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return digest.digest()
+
+
+class ImportSpecCache:
+    """Headers and validated import specs by config file, saved to a cache directory to skip reading, parsing and
+    validation on later runs.
+
+    The index of a config directory holds the header of each config file, see ImportSpecHeader, so that the files need
+    not be read to find the spec of a CSV file.  Once loaded, a spec is saved to a file of its own by content digest,
+    including its compiled match rules and conditions; as with any pickle, the cache directory needs to be as
+    trustworthy as the config files.  An entry is used as long as its config file has the same modification time and
+    size, or else the same content.  Any change of contablo's code invalidates the cache.
+    """
+
+    magic = b"contablo-spec-cache-2\n"
+
+    def __init__(self, cache_dir: str, config: str) -> None:
+        key = hashlib.blake2b(os.path.abspath(config).encode("utf-8", "surrogatepass"), digest_size=8).hexdigest()
+        self.cache_dir = cache_dir
+        self.filename = os.path.join(cache_dir, f"import-specs-{key}.cache")
+        self.spec_prefix = f"import-specs-{key}-"
+        # file name to modification time, size, content digest and header
+        self.entries: dict[str, tuple[int, int, bytes, ImportSpecHeader]] = {}
+        self.used: set[str] = set()
+        self.changed = False
+        try:
+            with open(self.filename, "rb") as f:
+                if f.read(len(self.magic)) == self.magic:
+                    fingerprint, entries = pickle.load(f)
+                    if fingerprint == code_fingerprint():
+                        self.entries = entries
+        except FileNotFoundError:
+            pass
+        except Exception as e:  # unpickling may fail in many ways, all of which mean the cache is to be rebuilt
+            logger.warning(f"Ignoring unreadable import spec cache {self.filename}: {e}")
+
+    @staticmethod
+    def digest(data: bytes) -> bytes:
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get(self, filename: str) -> tuple[bytes, ImportSpecHeader] | None:
+        """Content digest and header of the config file, or None if unknown or changed."""
+        entry = self.entries.get(filename)
+        if entry is None:
+            return None
+        stat = os.stat(filename)
+        if (stat.st_mtime_ns, stat.st_size) != entry[:2]:
+            with open(filename, "rb") as f:
+                if self.digest(f.read()) != entry[2]:
+                    self.used.discard(filename)
+                    return None
+            # touched, but not changed
+            self.entries[filename] = stat.st_mtime_ns, stat.st_size, entry[2], entry[3]
+            self.changed = True
+        self.used.add(filename)
+        return entry[2], entry[3]
+
+    def put(self, filename: str, digest: bytes, header: ImportSpecHeader) -> None:
+        """Add the header read from the content of the config file with the given digest."""
+        stat = os.stat(filename)
+        self.entries[filename] = stat.st_mtime_ns, stat.st_size, digest, header
+        self.used.add(filename)
+        self.changed = True
+
+    def spec_filename(self, digest: bytes) -> str:
+        return os.path.join(self.cache_dir, f"{self.spec_prefix}{digest.hex()}.spec")
+
+    def load_spec(self, digest: bytes) -> ImportSpec | None:
+        """The spec validated from config file content with the given digest, or None if not cached."""
+        filename = self.spec_filename(digest)
+        # the cyclic garbage collector would run over and over while unpickling thousands of objects
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(filename, "rb") as f:
+                if f.read(len(self.magic)) == self.magic:
+                    fingerprint, spec = pickle.load(f)
+                    if fingerprint == code_fingerprint():
+                        return spec
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable import spec cache {filename}: {e}")
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return None
+
+    def save_spec(self, digest: bytes, spec: ImportSpec) -> None:
+        """Save the spec validated from config file content with the given digest."""
+        filename = self.spec_filename(digest)
+        try:
+            self._write(filename, spec)
+        except OSError as e:
+            logger.warning(f"Could not save import spec cache {filename}: {e}")
+
+    def save(self) -> None:
+        """Save the index if it was changed, dropping the entries and specs of config files that were not used."""
+        if not self.changed and self.used == self.entries.keys():
+            return
+        entries = {filename: entry for filename, entry in self.entries.items() if filename in self.used}
+        self._write(self.filename, entries)
+        self.entries, self.changed = entries, False
+        used_specs = {os.path.basename(self.spec_filename(entry[2])) for entry in entries.values()}
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(self.spec_prefix) and name.endswith(".spec") and name not in used_specs:
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def _write(self, filename: str, data: Any) -> None:
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        temp_name = f"{filename}.{os.getpid()}.tmp"
+        try:
+            with open(temp_name, "wb") as f:
+                f.write(self.magic)
+                pickle.dump((code_fingerprint(), data), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_name, filename)
+        finally:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
@@ -1,8 +1,19 @@
+from __future__ import annotations
+
 import datetime
+import functools
+import operator
+import re
+from abc import ABC
+from abc import abstractmethod
+from typing import Any
+from typing import Callable
 from typing import Optional
+from typing import Sequence
 
 from contablo.format_helpers import get_date_strptime_from_format
 from contablo.format_helpers import get_time_strptime_from_format
+from contablo.format_helpers import strptime
 from contablo.numberformat import NumberFormat
 
 
@@ -18,19 +29,80 @@ def dicts_equal_in_keys(a, b, compared_keys):
     return ka == kb and all(a[k] == b[k] for k in ka)
 
 
-def match_to_template(text: str, template: str, strict_whitespace: bool = False) -> Optional[dict[str, str]]:
-    import re
-
+@functools.lru_cache(maxsize=4096)
+def compile_template(template: str, strict_whitespace: bool = False) -> re.Pattern[str]:
+    """Regular expression for a match template, see match_to_template()."""
     pattern = re.escape(template)
     if not strict_whitespace:
         pattern = re.sub(r"(\\\s)+", r"\\s+", pattern)
     pattern = re.sub(r"\\\{\\\}", r".+", pattern)
     pattern = re.sub(r"\\\{(\w+)\\\}", r"(?P<\1>.*)", pattern)
-    # print(template, pattern)
-    match = re.match(pattern, text)
+    return re.compile(pattern)
+
+
+def match_to_template(text: str, template: str, strict_whitespace: bool = False) -> Optional[dict[str, str]]:
+    match = compile_template(template, strict_whitespace).match(text)
     return match.groupdict() if match is not None else None
 
 
+# whitespace escaped by re.escape(), see compile_template(); other whitespace in templates is matched literally
+_template_whitespace = frozenset(" \t\n\r\v\f")
+
+
+def template_prefix(template: str) -> str:
+    """Literal start of a template that any matching text starts with, with runs of whitespace collapsed to " "."""
+    chars: list[str] = []
+    for char in template:
+        if char == "{" or (char.isspace() and char not in _template_whitespace):
+            break
+        if char in _template_whitespace:
+            if chars and chars[-1] == " ":
+                continue
+            char = " "
+        chars.append(char)
+    return "".join(chars)
+
+
+class TemplatePrefixIndex:
+    """Trie over the template_prefix() of several match templates, preselecting the templates a text may match.
+
+    Only the candidates need to be checked with match_to_template(), which keeps the cost per text nearly independent
+    of the number of templates as long as their prefixes differ.  The index is valid for both, strict and collapsed
+    whitespace matching.
+    """
+
+    def __init__(self, templates: Sequence[str]) -> None:
+        self.templates = tuple(templates)
+        self.root: dict[str, Any] = {}
+        for idx, template in enumerate(self.templates):
+            node = self.root
+            for char in template_prefix(template):
+                node = node.setdefault(char, {})
+            node.setdefault("", []).append(idx)  # "" is never a character of the text, so it marks the end of a prefix
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, TemplatePrefixIndex) and self.templates == other.templates
+
+    def candidates(self, text: str) -> list[int]:
+        """Indices of the templates whose prefix the text starts with, in ascending order."""
+        node = self.root
+        found = list(node.get("", ()))
+        after_space = False
+        for char in text:
+            if char.isspace():
+                if after_space:
+                    continue
+                char, after_space = " ", True
+            else:
+                after_space = False
+            node = node.get(char)
+            if node is None:
+                break
+            found.extend(node.get("", ()))
+        found.sort()
+        return found
+
+
 def split_after_prefix(prefix: str, text: str) -> list[str]:
     if text == prefix:
         return [prefix]
@@ -40,80 +112,147 @@ def split_after_prefix(prefix: str, text: str) -> list[str]:
     return text.split(delimiter)
 
 
-def check_condition_value_is_empty(raw: str, parts: list[str]) -> bool:
+class Condition(ABC):
+    """An onlyif condition compiled from its textual form, see compile_condition(); call it with a raw value."""
+
+    source = ""  # the textual form, set by compile_condition()
+
+    @abstractmethod
+    def __call__(self, raw: str | None) -> bool: ...
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Condition) and self.source == other.source
+
+    def __hash__(self) -> int:
+        return hash(self.source)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # compile again when unpickling, which yields the shared object of compile_condition()
+        return compile_condition, (self.source,)
+
+
+class EmptyCondition(Condition):
+    def __call__(self, raw: str | None) -> bool:
+        return not raw
+
+
+class NotEmptyCondition(Condition):
+    def __call__(self, raw: str | None) -> bool:
+        return (raw is not None) and (raw != "")
+
+
+class CompareCondition(Condition):
+    """Compare the parsed raw value to a reference value parsed at compile time."""
+
+    operators = {
+        "=": operator.eq,
+        "!=": operator.ne,
+        "<": operator.lt,
+        ">": operator.gt,
+        "<=": operator.le,
+        ">=": operator.ge,
+    }
+
+    def __init__(self, mode: str, parse: Callable[[str], Any], raw_ref: str) -> None:
+        assert mode in self.operators, f"Unknown condition mode '{mode}'"
+        self.compare = self.operators[mode]
+        self.parse = parse
+        self.ref_value = parse(raw_ref)
+
+    def __call__(self, raw: str | None) -> bool:
+        if raw is None:
+            return False
+        return self.compare(self.parse(raw), self.ref_value)
+
+
+class StringIsCondition(Condition):
+    def __init__(self, text: str, flags: str, negate: bool = False) -> None:
+        assert all([c in "i" for c in flags]), f"Unsupported flag in <{flags}>"
+        self.ignore_case = "i" in flags
+        self.text = text.lower() if self.ignore_case else text
+        self.negate = negate
+
+    def __call__(self, raw: str | None) -> bool:
+        if self.ignore_case:
+            raw = raw.lower()
+        return (raw == self.text) is not self.negate
+
+
+class NumberParser:
+    def __init__(self, format: str) -> None:
+        self.num_fmt = NumberFormat.from_format(format)
+
+    def __call__(self, raw: str) -> float:
+        return float(self.num_fmt.normalize(raw))
+
+
+class DateParser:
+    def __init__(self, format: str) -> None:
+        self.date_fmt = get_date_strptime_from_format(format)
+
+    def __call__(self, raw: str) -> datetime.date:
+        return strptime(raw, self.date_fmt).date()
+
+
+class TimeParser:
+    def __init__(self, format: str) -> None:
+        self.time_fmt = get_time_strptime_from_format(format)
+
+    def __call__(self, raw: str) -> datetime.time:
+        return strptime(raw, self.time_fmt).time()
+
+
+def compile_condition_value_is_empty(parts: list[str]) -> Condition:
     assert len(parts) - 1 == 0, "[]"
     assert parts[0] == "empty"
-    return not raw
+    return EmptyCondition()
 
 
-def check_condition_value_is_not_empty(raw: str, parts: list[str]) -> bool:
+def compile_condition_value_is_not_empty(parts: list[str]) -> Condition:
     assert len(parts) - 1 == 0, "[]"
     assert parts[0] == "notempty"
-    return (raw is not None) and (raw != "")
+    return NotEmptyCondition()
 
 
-def check_condition_value_compare(raw: str, parts: list[str]) -> bool:
-    assert len(parts) - 1 == 3, "[value, type, format] with type one of [number, date, time, datetime]"
+def compile_condition_value_compare(parts: list[str]) -> Condition:
+    assert len(parts) - 1 == 3, "[value, type, format] with type one of [number, date, time]"
     mode, raw_ref, subtype, format = parts
-    assert subtype in ["number", "date", "time", "datetime"], f"unknwon type <{subtype}>"
-
-    if raw is None:
-        return False
-
-    if subtype == "number":
-        num_fmt = NumberFormat.from_format(format)
-        value = float(num_fmt.normalize(raw))
-        ref_value = float(num_fmt.normalize(raw_ref))
-    elif subtype == "date":
-        date_fmt = get_date_strptime_from_format(format)
-        value = datetime.datetime.strptime(raw, date_fmt).date()
-        ref_value = datetime.datetime.strptime(raw_ref, date_fmt).date()
-    elif subtype == "time":
-        time_fmt = get_time_strptime_from_format(format)
-        value = datetime.datetime.strptime(raw, time_fmt).time()
-        ref_value = datetime.datetime.strptime(raw_ref, time_fmt).time()
-    else:
-        raise NotImplementedError(f"check_condition_value_compare requires implementation for {subtype=}")
-    cls = value.__class__
-    methods = {"=": cls.__eq__, "!=": cls.__ne__, "<": cls.__lt__, ">": cls.__gt__, "<=": cls.__le__, ">=": cls.__ge__}
-    assert mode in methods, f"Unknown condition mode '{mode}'"
-    func = methods[mode]
-    # print(f"## check if {value} {mode} {ref_value} using {func}")
-    return func(value, ref_value)
-
-
-def check_condition_string_is(raw: str, parts: list[str]) -> bool:
-    assert 1 <= len(parts) - 1 <= 2, "[text, [i]]"
+    parsers = {"number": NumberParser, "date": DateParser, "time": TimeParser}
+    assert subtype in parsers, f"unknwon type <{subtype}>"
+    return CompareCondition(mode, parsers[subtype](format), raw_ref)
 
-    _, text, flags = (parts + [""])[:3]
-
-    assert all([c in "i" for c in flags]), f"Unsupported flag in <{flags}>"
 
-    if "i" in flags:
-        raw, text = raw.lower(), text.lower()
+def compile_condition_string_is(parts: list[str]) -> Condition:
+    assert 1 <= len(parts) - 1 <= 2, "[text, [i]]"
+    _, text, flags = (parts + [""])[:3]
+    return StringIsCondition(text, flags)
 
-    return raw == text
 
+def compile_condition_string_is_not(parts: list[str]) -> Condition:
+    assert 1 <= len(parts) - 1 <= 2, "[text, [i]]"
+    _, text, flags = (parts + [""])[:3]
+    return StringIsCondition(text, flags, negate=True)
 
-def check_condition_string_is_not(raw: str, parts: list[str]) -> bool:
-    return not check_condition_string_is(raw, parts)
 
+@functools.lru_cache(maxsize=1024)
+def compile_condition(cond: str) -> Condition:
+    """Parse an onlyif condition once, so that checking a raw value is a single comparison.
 
-def check_condition(cond: str, raw: str) -> list[str]:
-    # Todo: maybe put this in a class, allow to query for conditions with syntax (see assert in handlers)
+    Raises ValueError for unknown or malformed conditions, including reference values not matching their format.
+    """
     conditions = [
-        ["empty", 0, check_condition_value_is_empty],
-        ["notempty", 0, check_condition_value_is_not_empty],
-        ["=", 3, check_condition_value_compare],
-        ["!=", 3, check_condition_value_compare],
-        ["<", 3, check_condition_value_compare],
-        [">", 3, check_condition_value_compare],
-        ["<=", 3, check_condition_value_compare],
-        [">=", 3, check_condition_value_compare],
-        ["is", 1, check_condition_string_is],  # value
-        ["is", 2, check_condition_string_is],  # value, [i]
-        ["not", 1, check_condition_string_is_not],  # value
-        ["not", 2, check_condition_string_is_not],  # value, [i]
+        ["empty", 0, compile_condition_value_is_empty],
+        ["notempty", 0, compile_condition_value_is_not_empty],
+        ["=", 3, compile_condition_value_compare],
+        ["!=", 3, compile_condition_value_compare],
+        ["<", 3, compile_condition_value_compare],
+        [">", 3, compile_condition_value_compare],
+        ["<=", 3, compile_condition_value_compare],
+        [">=", 3, compile_condition_value_compare],
+        ["is", 1, compile_condition_string_is],  # value
+        ["is", 2, compile_condition_string_is],  # value, [i]
+        ["not", 1, compile_condition_string_is_not],  # value
+        ["not", 2, compile_condition_string_is_not],  # value, [i]
     ]
     possible_cause = ""
     for type, nargs, func in conditions:
@@ -122,24 +261,37 @@ def check_condition(cond: str, raw: str) -> list[str]:
         if len(parts) - 1 != nargs:
             possible_cause = f"Expected {nargs} argument{'s' if nargs == 1 else ''} for '{type}', got {parts[1:]}."
             continue
-        return func(raw, parts)
+        try:
+            result = func(parts)
+            result.source = cond
+            return result
+        except (AssertionError, ValueError) as e:
+            raise ValueError(f"Invalid condition <{cond}>: {e}") from e
     if possible_cause:
         raise ValueError(possible_cause)
-    raise ValueError("Unknown condition {type}.")
+    raise ValueError(f"Unknown condition <{cond}>.")
+
+
+def check_condition(cond: str, raw: str) -> bool:
+    return compile_condition(cond)(raw)
 
 
 def check_conditions(
-    conditions: dict[str, str],
+    conditions: dict[str, str | Condition],
     primary_raw_values: dict[str, str],
     secondary_raw_values: dict[str, str] | None = None,
 ) -> bool:
-    """Check if the provided raw values meet all conditions. Raises KeyError for unknown condition keys."""
+    """Check if the provided raw values meet all conditions. Raises KeyError for unknown condition keys.
+
+    Conditions may be given as text or compiled, see compile_condition().
+    """
     secondary_raw_values = secondary_raw_values or {}
     for field, cond in conditions.items():
         # might raise a KeyError indicating an unknown field or input key
         if field not in primary_raw_values and field not in secondary_raw_values:
             keys = set(list(primary_raw_values.keys()) + list(secondary_raw_values.keys()))
             raise KeyError(f"Field <{field}> requested when only <{keys}> where given.")
-        if not check_condition(cond, primary_raw_values.get(field, secondary_raw_values.get(field, None))):
+        condition = cond if isinstance(cond, Condition) else compile_condition(cond)
+        if not condition(primary_raw_values.get(field, secondary_raw_values.get(field, None))):
             return False
     return True
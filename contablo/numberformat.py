@@ -1,6 +1,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from dataclasses import field
+
+# validity of a number only depends on its shape, i.e. on the positions of signs and separators
+_digit_shape = str.maketrans("123456789", "000000000")
 
 
 @dataclass
@@ -14,6 +18,7 @@ class NumberFormat:
     thou_sep: str  # thousands separator
     frac_sep: str  # fractional separator
     trailing_sign: bool = False
+    _valid_shapes: dict[str, bool] = field(default_factory=dict, init=False, repr=False, compare=False)
 
     @property
     def is_integer(self):
@@ -136,7 +141,13 @@ class NumberFormat:
 
     def normalize(self, number: str) -> str:
         """Converts the given number to a format that can be casted to float or decimal."""
-        if not self.is_valid_number(number):
+        shape = number.translate(_digit_shape)
+        valid = self._valid_shapes.get(shape)
+        if valid is None:
+            if len(self._valid_shapes) >= 1024:
+                self._valid_shapes.clear()
+            valid = self._valid_shapes[shape] = self.is_valid_number(shape)
+        if not valid:
             raise ValueError(f"Number {number} does not conform to format {self.format}.")
 
         is_negative = "-" in number
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+from typing import Iterator
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+
+
+class ImportProfile:
+    """Collects timers and counters for the stages of an import, keyed by file, spec and stage name.
+
+    A profile is only filled while it is active, see profiling().  Scopes (file and spec) are set with profile_scope()
+    and apply to all timers and counters recorded within.
+    """
+
+    def __init__(self) -> None:
+        self.stages: dict[tuple[str, str, str], StageStats] = {}
+        self.counters: dict[tuple[str, str, str], int] = {}
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1) -> None:
+        key = (*_active_scope.get(), stage)
+        stats = self.stages.get(key)
+        if stats is None:
+            stats = self.stages[key] = StageStats()
+        stats.calls += calls
+        stats.seconds += seconds
+
+    def add_count(self, counter: str, n: int = 1) -> None:
+        key = (*_active_scope.get(), counter)
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def update(self, other: ImportProfile) -> None:
+        """Add timers and counters of another profile, e.g. one collected in a worker thread."""
+        for key, stats in other.stages.items():
+            own = self.stages.setdefault(key, StageStats())
+            own.calls += stats.calls
+            own.seconds += stats.seconds
+        for key, n in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def as_dict(self) -> dict[str, list[dict[str, Any]]]:
+        """Machine-readable representation, suitable for json.dump()."""
+        return {
+            "stages": [
+                dict(file=file, spec=spec, stage=stage, calls=stats.calls, seconds=stats.seconds)
+                for (file, spec, stage), stats in self.stages.items()
+            ],
+            "counters": [
+                dict(file=file, spec=spec, counter=counter, count=n)
+                for (file, spec, counter), n in self.counters.items()
+            ],
+        }
+
+    def format_table(self) -> list[str]:
+        """Breakdown of stage timings and counters per file and spec, as lines of text."""
+        rows = [("File", "Spec", "Stage/Counter", "Calls", "Seconds")]
+        for (file, spec, stage), stats in sorted(self.stages.items()):
+            rows.append((file or "-", spec or "-", stage, str(stats.calls), f"{stats.seconds:.6f}"))
+        for (file, spec, counter), n in sorted(self.counters.items()):
+            rows.append((file or "-", spec or "-", f"#{counter}", str(n), ""))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        lines = []
+        for idx, row in enumerate(rows):
+            lines.append(
+                "  ".join(cell.ljust(w) if i < 3 else cell.rjust(w) for i, (cell, w) in enumerate(zip(row, widths)))
+            )
+            if idx == 0:
+                lines.append("  ".join("-" * w for w in widths))
+        return lines
+
+
+_active_profile: ContextVar[ImportProfile | None] = ContextVar("contablo_profile", default=None)
+_active_scope: ContextVar[tuple[str, str]] = ContextVar("contablo_profile_scope", default=("", ""))
+
+
+class _Stage:
+    __slots__ = ("profile", "name", "start")
+
+    def __init__(self, profile: ImportProfile, name: str) -> None:
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.profile.add_time(self.name, time.perf_counter() - self.start)
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_no_stage = _NoStage()
+
+
+def current_profile() -> ImportProfile | None:
+    return _active_profile.get()
+
+
+@contextmanager
+def profiling(profile: ImportProfile | None = None) -> Iterator[ImportProfile]:
+    """Activate a profile for the current context; instrumentation is a no-op while no profile is active."""
+    profile = profile if profile is not None else ImportProfile()
+    token = _active_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _active_profile.reset(token)
+
+
+@contextmanager
+def profile_scope(file: str | None = None, spec: str | None = None) -> Iterator[None]:
+    """Attribute all stages and counters within to the given file and/or spec; unset values are inherited."""
+    outer_file, outer_spec = _active_scope.get()
+    token = _active_scope.set((outer_file if file is None else file, outer_spec if spec is None else spec))
+    try:
+        yield
+    finally:
+        _active_scope.reset(token)
+
+
+def stage(name: str) -> _Stage | _NoStage:
+    """Context manager timing the enclosed block as the named stage of the active profile."""
+    profile = _active_profile.get()
+    if profile is None:
+        return _no_stage
+    return _Stage(profile, name)
+
+
+def count(counter: str, n: int = 1) -> None:
+    """Increment the named counter of the active profile."""
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.add_count(counter, n)
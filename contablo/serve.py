@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from contablo.csvimporter import import_csv_with_spec_detection
+from contablo.fields import FieldSpec
+from contablo.fields import FieldSpecRegistry
+from contablo.importable import ImporTable
+from contablo.importspec import ImportSpecRegistry
+
+logger = logging.getLogger(__file__)
+
+# Protocol: each request is a line with a JSON object, e.g. {"path": "export.csv", "format": "csv"}, or with the
+# "length" of the CSV data that follows the line instead of a path.  Each response is a line with a JSON object,
+# {"status": "ok", "rows": ..., "length": ...} or {"status": "error", "message": ..., "length": 0}, followed by length
+# bytes of converted rows.  A connection may send any number of requests, one after the other.
+output_formats = ("jsonl", "csv")
+max_request_line = 64 * 1024
+default_max_request_bytes = 64 * 1024 * 1024
+
+
+class ImportServiceError(Exception):
+    pass
+
+
+class ImportService:
+    """Convert CSV data with registries that are kept loaded between requests, see make_server()."""
+
+    def __init__(
+        self,
+        import_spec_registry: ImportSpecRegistry,
+        field_spec_registry: FieldSpecRegistry,
+        fields: list[FieldSpec],
+    ) -> None:
+        self.import_spec_registry = import_spec_registry
+        self.field_spec_registry = field_spec_registry
+        self.factory = ImporTable(fields).clone_empty
+
+    def convert(self, request: dict[str, Any], data: bytes | None = None) -> tuple[dict[str, Any], bytes]:
+        """Convert the data, or the file at the request's path, to the requested format; returns response and body."""
+        format = request.get("format", "jsonl")
+        if format not in output_formats:
+            raise ValueError(f"Unknown format <{format}>, choose one of {', '.join(output_formats)}")
+        if data is not None:
+            source, name = memoryview(data), request.get("name") or "(request)"
+        elif isinstance(request.get("path"), str):
+            source, name = request["path"], request.get("name") or request["path"]
+        else:
+            raise ValueError("Request needs either a path or the length of the data that follows it")
+
+        importable = import_csv_with_spec_detection(
+            source, self.import_spec_registry, self.factory, self.field_spec_registry, name
+        )
+        if importable is None:
+            return {"status": "error", "message": f"No single import spec matches {name}"}, b""
+        rows = importable.get_flat_table(convert_func=str, fallback=None, include_header=True)
+        if format == "csv":
+            text = io.StringIO()
+            csv.writer(text).writerows([[value or "" for value in row] for row in rows])
+            body = text.getvalue().encode("utf-8")
+        else:
+            header = rows[0]
+            lines = [json.dumps(dict(zip(header, row)), ensure_ascii=False) + "\n" for row in rows[1:]]
+            body = "".join(lines).encode("utf-8")
+        return {"status": "ok", "rows": len(importable), "format": format}, body
+
+
+class ImportRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        service: ImportService = self.server.service
+        server: PooledServerMixIn = self.server
+        while line := self.rfile.readline(max_request_line):
+            data = None
+            skipped_data = False
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError(f"Request line exceeds {max_request_line} bytes")
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be a JSON object")
+                length = request.get("length")
+                if length is not None:
+                    if type(length) is not int or length < 0:
+                        raise ValueError(f"Invalid length {length!r}")
+                    if length > server.max_request_bytes:
+                        skipped_data = True
+                        raise ValueError(f"Request data of {length} bytes exceeds {server.max_request_bytes} bytes")
+                    data = self.rfile.read(length)
+                    if len(data) != length:
+                        return  # connection closed before all data arrived
+                elif isinstance(request.get("path"), str) and not server.allows_path(request["path"]):
+                    raise ValueError(f"Not allowed to read {request['path']}")
+                response, body = service.convert(request, data)
+            except ValueError as e:
+                response, body = {"status": "error", "message": str(e)}, b""
+            except Exception as e:
+                logger.exception(e)
+                response, body = {"status": "error", "message": f"Internal error: {e}"}, b""
+            response["length"] = len(body)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.write(body)
+            self.wfile.flush()
+            if skipped_data or not line.endswith(b"\n"):
+                return  # the rest of the request would be taken for the next one
+
+
+class PooledServerMixIn:
+    """Handle connections in a bounded pool of worker threads, instead of a thread per connection.
+
+    A connection occupies a worker until it is closed; further connections wait for a free worker.  Closing the server
+    shuts down the open connections, so that workers waiting for a request do not keep it from stopping.
+    """
+
+    paths_allowed = False  # whether requests may name any file to be read, without a path_root
+
+    def __init__(
+        self,
+        address: Any,
+        service: ImportService,
+        workers: int = 4,
+        max_request_bytes: int = default_max_request_bytes,
+        path_root: str | None = None,
+    ) -> None:
+        self.service = service
+        self.max_request_bytes = max_request_bytes
+        self.path_root = os.path.realpath(path_root) if path_root is not None else None
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="contablo-serve")
+        self._connections: set[socket.socket] = set()
+        self._connections_lock = threading.Lock()
+        super().__init__(address, ImportRequestHandler)
+
+    def allows_path(self, path: str) -> bool:
+        """Whether a request may have the server read the file at path, see make_server()."""
+        if self.path_root is None:
+            return self.paths_allowed
+        return os.path.commonpath([os.path.realpath(path), self.path_root]) == self.path_root
+
+    def process_request(self, request: socket.socket, client_address: Any) -> None:
+        with self._connections_lock:
+            self._connections.add(request)
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request: socket.socket, client_address: Any) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._connections_lock:
+                self._connections.discard(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        with self._connections_lock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)  # wakes up a worker waiting for the next request
+                except OSError:
+                    pass
+        self.executor.shutdown(wait=True)
+
+
+class UnixImportServer(PooledServerMixIn, socketserver.UnixStreamServer):
+    paths_allowed = True  # the socket is only accessible by the user running the server
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class TCPImportServer(PooledServerMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+def make_server(
+    service: ImportService,
+    socket_path: str | None = None,
+    port: int | None = None,
+    workers: int = 4,
+    max_request_bytes: int = default_max_request_bytes,
+    path_root: str | None = None,
+) -> socketserver.BaseServer:
+    """Server for the service on a Unix domain socket only accessible by the user, or else on a localhost TCP port.
+
+    Requests may send at most max_request_bytes of CSV data.  With path_root, requests may only name files in that
+    directory; without, only requests on the Unix domain socket may name files, as any local user can reach the port.
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                raise FileExistsError(f"{socket_path} exists and is not a socket")
+            os.remove(socket_path)  # left over by a server that was not shut down
+        old_umask = os.umask(0o177)
+        try:
+            return UnixImportServer(socket_path, service, workers, max_request_bytes, path_root)
+        finally:
+            os.umask(old_umask)
+    return TCPImportServer(("127.0.0.1", port or 0), service, workers, max_request_bytes, path_root)
+
+
+def request_import(
+    address: str | tuple[str, int],
+    data: bytes | None = None,
+    path: str | None = None,
+    name: str | None = None,
+    format: str = "jsonl",
+) -> bytes:
+    """Convert CSV data or the CSV file at path with the server at address, a socket path or host and port."""
+    request: dict[str, Any] = {"format": format}
+    if name is not None:
+        request["name"] = name
+    if data is not None:
+        request["length"] = len(data)
+    else:
+        request["path"] = os.path.abspath(path)
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.connect(address)
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(request).encode("utf-8") + b"\n")
+            if data is not None:
+                f.write(data)
+            f.flush()
+            response = json.loads(f.readline())
+            body = f.read(response["length"])
+    if response["status"] != "ok":
+        raise ImportServiceError(response.get("message", "Unknown error"))
+    return body
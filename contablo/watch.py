@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import glob
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from contablo.importable import ImporTable
+from contablo.importablemerge import ImporTableMerger
+
+logger = logging.getLogger(__file__)
+
+
+class DropFolderWatcher:
+    """Import the files of a folder as they appear or change, merging them into a merger that is kept across polls.
+
+    A file is imported once its modification time and size were unchanged for debounce seconds, so that files which
+    are still being written are not imported half-way, and once more whenever it changed.  Up to max_imports files are
+    imported concurrently, but merged one after the other in the order of their names, in the polling thread.  After
+    a poll that merged any rows, on_merged() is called, e.g. to write the result, but at most once every
+    write_interval seconds; merges in between are covered by the next call, or by flush() when the watcher stops.
+
+    The rows of a changed file are merged like those of a new one: rows of its previous version are not removed, so
+    rows that were corrected in the new version remain in their outdated form as well.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        import_file: Callable[[str], ImporTable | None],
+        merger: ImporTableMerger,
+        on_merged: Callable[[], None] | None = None,
+        pattern: str = "*.csv",
+        debounce: float = 2.0,
+        max_imports: int = 2,
+        clock: Callable[[], float] = time.monotonic,
+        write_interval: float = 0.0,
+    ) -> None:
+        if max_imports < 1:
+            raise ValueError(f"Invalid number of concurrent imports {max_imports}")
+        self.folder = folder
+        self.import_file = import_file
+        self.merger = merger
+        self.on_merged = on_merged
+        self.pattern = pattern
+        self.debounce = debounce
+        self.max_imports = max_imports
+        self.clock = clock
+        self.write_interval = write_interval
+        # file name to modification time and size when imported, and when first seen unchanged but not yet imported
+        self.imported: dict[str, tuple[int, int]] = {}
+        self.pending: dict[str, tuple[tuple[int, int], float]] = {}
+        self.unwritten = False  # whether rows were merged since the last call of on_merged()
+        self.written_at: float | None = None
+
+    def ready_files(self) -> list[tuple[str, tuple[int, int]]]:
+        """The files to be imported now, with their modification time and size."""
+        now = self.clock()
+        result = []
+        found = set()
+        for filename in sorted(glob.glob(os.path.join(glob.escape(self.folder), self.pattern))):
+            try:
+                stat = os.stat(filename)
+            except FileNotFoundError:
+                continue
+            found.add(filename)
+            stamp = stat.st_mtime_ns, stat.st_size
+            if self.imported.get(filename) == stamp:
+                continue
+            pending = self.pending.get(filename)
+            if pending is None or pending[0] != stamp:
+                pending = self.pending[filename] = stamp, now
+            if now - pending[1] >= self.debounce:
+                result.append((filename, stamp))
+        for filename in self.pending.keys() - found:
+            del self.pending[filename]
+        return result
+
+    def _import(self, filename: str) -> ImporTable | None:
+        try:
+            return self.import_file(filename)
+        except Exception as e:
+            logger.exception(e)
+            print(f"Exception importing {filename}: {e}")
+            return None
+
+    def flush(self) -> None:
+        """Call on_merged() if rows were merged since its last call."""
+        if self.unwritten and self.on_merged is not None:
+            self.on_merged()
+            self.written_at = self.clock()
+        self.unwritten = False
+
+    def poll_once(self) -> list[str]:
+        """Import and merge the files that are new or changed and ready; returns their names."""
+        filenames = self._import_ready()
+        if self.written_at is None or self.clock() - self.written_at >= self.write_interval:
+            self.flush()
+        return filenames
+
+    def _import_ready(self) -> list[str]:
+        ready = self.ready_files()
+        if not ready:
+            return []
+        filenames = [filename for filename, _ in ready]
+        if self.max_imports == 1 or len(ready) == 1:
+            importables = map(self._import, filenames)
+        else:
+            executor = ThreadPoolExecutor(min(self.max_imports, len(ready)), thread_name_prefix="contablo-import")
+            importables = executor.map(self._import, filenames)
+            executor.shutdown(wait=False)  # map() has submitted all imports already
+        for (filename, stamp), importable in zip(ready, importables):
+            # failed imports are retried only once the file changes, like those that yield nothing
+            self.imported[filename] = stamp
+            del self.pending[filename]
+            if not importable:
+                print(f"--- importing from {filename} yields nothing ---")
+                continue
+            self.merger.add(importable)
+            self.unwritten = True
+            entries = len(importable)
+            print(f"--- importing from {filename} with {entries} entries results in {len(self.merger)} after merge ---")
+        return filenames
+
+    def run(self, interval: float = 2.0, stop: threading.Event | None = None) -> None:
+        """Poll every interval seconds until stop is set, or forever; merged rows are written on the way out."""
+        stop = stop or threading.Event()
+        try:
+            while not stop.is_set():
+                self.poll_once()
+                stop.wait(interval)
+        finally:
+            self.flush()
@@ -0,0 +1,31 @@
+import logging
+
+from benchmarks.common import import_export
+from benchmarks.generator import generate_bank_export
+from benchmarks.generator import generate_exports
+from contablo.codes import is_valid_isin
+from contablo.csv_helper import load_chunked_textfile
+
+
+def test_generator_is_reproducible():
+    assert generate_exports(20, seed=3) == generate_exports(20, seed=3)
+    assert generate_exports(20, seed=3) != generate_exports(20, seed=4)
+
+
+def test_generated_exports_can_be_imported(tmp_path):
+    logging.disable(logging.WARNING)
+    try:
+        for export in generate_exports(30, seed=1, rules=5):
+            importable = import_export(export, tmp_path)
+            assert len(importable) == 30
+            assert [row["reference"] for row in importable.iter_data()] == export.references
+            assert all(is_valid_isin(row["isin"]) for row in importable.iter_data() if "isin" in row)
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def test_generated_metadata_chunks(tmp_path):
+    export = generate_bank_export(10, metadata=True)
+    chunks = load_chunked_textfile(export.write(tmp_path))
+    assert [len(chunk) for chunk in chunks] == [3, 11]
+    assert chunks[1][0][0] == export.import_spec["skip_lines"] + 1
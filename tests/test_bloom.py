@@ -0,0 +1,58 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from contablo.bloom import BloomFilter
+from contablo.bloom import row_digest
+from contablo.fixedpoint import fixed_point_type
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    dut = BloomFilter(1000, 0.01)
+    for idx in range(1000):
+        dut.add(row_digest({"a": idx}, ["a"]))
+    assert all(row_digest({"a": idx}, ["a"]) in dut for idx in range(1000))
+    false_positives = sum(row_digest({"a": idx}, ["a"]) in dut for idx in range(1000, 11000))
+    assert false_positives < 300
+
+
+def test_bloom_filter_save_and_load(tmp_path):
+    dut = BloomFilter(10, 0.1)
+    dut.add(row_digest({"a": "x"}, ["a"]))
+    dut.save(tmp_path / "filter")
+    loaded = BloomFilter.load(tmp_path / "filter")
+    assert (loaded.bits, loaded.count, loaded.hashes) == (dut.bits, dut.count, dut.hashes)
+    saved = (tmp_path / "filter").read_bytes()
+    dut.bits = None  # writing fails halfway
+    with pytest.raises(TypeError):
+        dut.save(tmp_path / "filter")
+    assert (tmp_path / "filter").read_bytes() == saved
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["filter"]
+    (tmp_path / "other").write_bytes(b"not a filter")
+    with pytest.raises(ValueError):
+        BloomFilter.load(tmp_path / "other")
+
+
+@pytest.mark.parametrize(
+    "left, right",
+    [
+        (Decimal("1.0"), Decimal("1.00")),
+        (Decimal("0"), Decimal("-0.00")),
+        (1, Decimal("1")),
+        (fixed_point_type(2).parse("1.50"), Decimal("1.5")),
+        (fixed_point_type(2)(0), Decimal("-0.0")),
+        (
+            datetime.datetime(2023, 1, 1, 12, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2023, 1, 1, 13, tzinfo=datetime.timezone(datetime.timedelta(hours=1))),
+        ),
+    ],
+)
+def test_row_digest_is_equal_for_equal_values(left, right):
+    assert left == right
+    assert row_digest({"a": left, "b": "x"}, ["a", "b"]) == row_digest({"a": right, "b": "x"}, ["a", "b"])
+
+
+def test_row_digest_considers_given_columns_only():
+    assert row_digest({"a": 1, "imported_from": "x"}, ["a"]) == row_digest({"a": 1, "imported_from": "y"}, ["a"])
+    assert row_digest({"a": 1}, ["a", "b"]) != row_digest({"a": 1, "b": None}, ["a", "b"])
@@ -1,4 +1,6 @@
+import gzip
 import json
+import zipfile
 from glob import glob
 
 from click.testing import CliRunner
@@ -46,3 +48,172 @@ def test_mk_import_template():
         out_files = glob("test_template*.json")
         print(out_files)
         assert len(out_files) == 1
+
+
+def test_convert_with_profile():
+    from .test_custom_fields_with_transforms import import_spec
+    from .test_custom_fields_with_transforms import target_field_specs
+
+    runner = CliRunner()
+    with open("tests/example-4.csv") as f:
+        csv_data = f.read()
+
+    with runner.isolated_filesystem():
+        with open("example-4.csv", "w") as f:
+            f.write(csv_data)
+        with open("import-spec.json", "w") as f:
+            json.dump(import_spec, f)
+        with open("target-spec.json", "w") as f:
+            json.dump(target_field_specs, f)
+
+        result = runner.invoke(
+            cli,
+            [
+                "convert",
+                "-t",
+                "target-spec.json",
+                "-c",
+                "import-spec.json",
+                "-o",
+                "merged.csv",
+                "--profile",
+                "--profile-json",
+                "profile.json",
+                "example-4.csv",
+            ],
+        )
+        assert result.exit_code == 0, result.output
+        assert "Import profile:" in result.output
+
+        with open("profile.json") as f:
+            profile = json.load(f)
+        stages = {(item["file"], item["spec"], item["stage"]) for item in profile["stages"]}
+        assert ("example-4.csv", "export-dividends", "convert") in stages
+        assert ("example-4.csv", "", "merge") in stages
+
+
+def test_convert_with_state():
+    from .test_custom_fields_with_transforms import import_spec
+    from .test_custom_fields_with_transforms import target_field_specs
+
+    runner = CliRunner()
+    with open("tests/example-4.csv") as f:
+        csv_data = f.read()
+
+    with runner.isolated_filesystem():
+        with open("example-4.csv", "w") as f:
+            f.write(csv_data)
+        with open("import-spec.json", "w") as f:
+            json.dump(import_spec, f)
+        with open("target-spec.json", "w") as f:
+            json.dump(target_field_specs, f)
+
+        args = ["convert", "-t", "target-spec.json", "-c", "import-spec.json", "--state", "merge.state"]
+        result = runner.invoke(cli, args + ["-o", "first.csv", "example-4.csv"])
+        assert result.exit_code == 0, result.output
+        result = runner.invoke(cli, args + ["-o", "second.csv", "example-4.csv"])
+        assert result.exit_code == 0, result.output
+        assert "continuing with" in result.output
+
+        # importing the same file again merges with the saved state
+        with open("first.csv") as first, open("second.csv") as second:
+            assert len(first.readlines()) == len(second.readlines())
+
+
+def test_convert_with_cache_dir():
+    from .test_custom_fields_with_transforms import import_spec
+    from .test_custom_fields_with_transforms import target_field_specs
+
+    runner = CliRunner()
+    with open("tests/example-4.csv") as f:
+        csv_data = f.read()
+
+    with runner.isolated_filesystem():
+        with open("example-4.csv", "w") as f:
+            f.write(csv_data)
+        with open("import-spec.json", "w") as f:
+            json.dump(import_spec, f)
+        with open("target-spec.json", "w") as f:
+            json.dump(target_field_specs, f)
+
+        outputs = []
+        for idx in range(2):
+            args = ["convert", "-t", "target-spec.json", "-c", "import-spec.json", "-o", f"out-{idx}.csv"]
+            result = runner.invoke(cli, args + ["example-4.csv"], env={"CONTABLO_CACHE_DIR": "cache"})
+            assert result.exit_code == 0, result.output
+            assert len(glob("cache/*")) == 2  # the index and the one spec used
+            with open(f"out-{idx}.csv") as f:
+                outputs.append(f.read())
+        assert outputs[0] == outputs[1]
+
+
+def test_convert_with_spill_rows():
+    from .test_custom_fields_with_transforms import import_spec
+    from .test_custom_fields_with_transforms import target_field_specs
+
+    runner = CliRunner()
+    with open("tests/example-4.csv") as f:
+        csv_data = f.read()
+
+    with runner.isolated_filesystem():
+        for name in ["a.csv", "b.csv"]:
+            with open(name, "w") as f:
+                f.write(csv_data)
+        with open("import-spec.json", "w") as f:
+            json.dump(import_spec, f)
+        with open("target-spec.json", "w") as f:
+            json.dump(target_field_specs, f)
+
+        args = ["convert", "-t", "target-spec.json", "-c", "import-spec.json"]
+        result = runner.invoke(cli, args + ["-o", "merged.csv", "a.csv", "b.csv"])
+        assert result.exit_code == 0, result.output
+        result = runner.invoke(cli, args + ["--spill-rows", "2", "-o", "dedup.csv", "a.csv", "b.csv"])
+        assert result.exit_code == 0, result.output
+        with open("merged.csv") as merged, open("dedup.csv") as dedup:
+            assert dedup.read() == merged.read()
+
+        result = runner.invoke(cli, args + ["--spill-rows", "2", "--state", "x.state", "a.csv"])
+        assert result.exit_code != 0 and "--state" in result.output
+
+
+def test_convert_from_archives():
+    from .test_custom_fields_with_transforms import import_spec
+    from .test_custom_fields_with_transforms import target_field_specs
+
+    runner = CliRunner()
+    with open("tests/example-4.csv", "rb") as f:
+        csv_data = f.read()
+
+    with runner.isolated_filesystem():
+        with open("a.csv", "wb") as f:
+            f.write(csv_data)
+        with gzip.open("b.csv.gz", "wb") as f:
+            f.write(csv_data)
+        with zipfile.ZipFile("bundle.zip", "w") as archive:
+            archive.writestr("c.csv", csv_data)
+            archive.writestr("d/e.csv", csv_data)
+        with open("import-spec.json", "w") as f:
+            json.dump(import_spec, f)
+        with open("target-spec.json", "w") as f:
+            json.dump(target_field_specs, f)
+
+        args = ["convert", "-t", "target-spec.json", "-c", "import-spec.json"]
+        result = runner.invoke(cli, args + ["-o", "plain.csv", "a.csv"])
+        assert result.exit_code == 0, result.output
+        result = runner.invoke(cli, args + ["-o", "archives.csv", "b.csv.gz", "bundle.zip"])
+        assert result.exit_code == 0, result.output
+        assert "importing from bundle.zip!d/e.csv" in result.output
+        with open("plain.csv") as plain, open("archives.csv") as archives:
+            assert archives.read() == plain.read()
+
+        # a file that cannot be decompressed is reported and skipped
+        with open("truncated.csv.gz", "wb") as f:
+            f.write(gzip.compress(csv_data)[:100])
+        result = runner.invoke(cli, args + ["-o", "skipped.csv", "truncated.csv.gz", "a.csv"])
+        assert result.exit_code == 0, result.output
+        with open("plain.csv") as plain, open("skipped.csv") as skipped:
+            assert skipped.read() == plain.read()
+
+        result = runner.invoke(cli, ["mk-import-tmpl", "-t", "target-spec.json", "-o", "tmpl", "bundle.zip"])
+        assert result.exit_code == 0, result.output
+        assert len(glob("tmpl*.json")) == 1
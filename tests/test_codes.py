@@ -0,0 +1,46 @@
+import pytest
+
+from contablo.codes import is_luhn_valid
+from contablo.codes import is_valid_isin
+from contablo.codes import validate_isins
+
+
+@pytest.mark.parametrize(
+    "isin, expected",
+    [
+        ("DE0005140008", True),
+        ("US0378331005", True),
+        ("IE00B4L5Y983", True),
+        ("XS2314659447", True),
+        ("ie00b4l5y983", True),
+        ("DE0005140009", False),
+        ("IE00B4L5Y984", False),
+        ("ZZ0005140008", False),
+        ("DE000514000", False),
+        ("DE00051400080", False),
+        ("DE-005140008", False),
+        ("", False),
+    ],
+)
+def test_is_valid_isin_yields(isin, expected):
+    assert is_valid_isin(isin) is expected
+
+
+def test_is_valid_isin_agrees_with_luhn():
+    # the table driven check must agree with the plain Luhn check on the letters converted to numbers
+    for isin in ["IE00B4L5Y983", "IE00B4L5Y984", "US0378331005", "XS2314659447", "DE000A1EWWW0", "DE000A1EWWW1"]:
+        code = "".join(str(int(c, 36)) for c in isin)
+        assert is_valid_isin(isin) is is_luhn_valid(code)
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ([], 0),
+        (["DE0005140008"], 0b1),
+        (["DE0005140008", "n/a", "US0378331005"], 0b101),
+        (["n/a", "DE0005140008", "DE0005140008"], 0b110),
+    ],
+)
+def test_validate_isins_yields(values, expected):
+    assert validate_isins(values) == expected
@@ -1,4 +1,13 @@
+import bz2
+import gzip
+import io
+import lzma
+import zipfile
+
+from contablo.csv_helper import get_file_encoding
+from contablo.csv_helper import iter_sources
 from contablo.csv_helper import load_chunked_textfile
+from contablo.csv_helper import provenance_name
 
 
 def test_load_chunked_textfile():
@@ -10,3 +19,87 @@ def test_load_chunked_textfile():
 
     chunks = load_chunked_textfile("tests/example-3_chunks_c.csv")  # empty line is chunk delimiter
     assert len(chunks) == 3
+
+
+def test_load_chunked_textfile_from_buffers():
+    filename = "tests/example-3_chunks_a.csv"
+    with open(filename, "rb") as f:
+        data = f.read()
+    expected = load_chunked_textfile(filename)
+
+    assert load_chunked_textfile(data) == expected
+    assert load_chunked_textfile(bytearray(data)) == expected
+    assert load_chunked_textfile(memoryview(data)) == expected
+    assert load_chunked_textfile(io.BytesIO(data)) == expected
+
+
+def test_get_file_encoding_from_buffers():
+    filename = "tests/example-4.csv"
+    with open(filename, "rb") as f:
+        data = f.read()
+    expected = get_file_encoding(filename)
+
+    assert get_file_encoding(data) == expected
+    assert get_file_encoding(bytearray(data)) == expected
+    assert get_file_encoding(memoryview(data)[:]) == expected
+    assert get_file_encoding(io.BytesIO(data)) == expected
+    assert get_file_encoding("Zahlung an Müller".encode("iso-8859-1")) == "iso-8859-1"
+
+
+def test_iter_sources_from_archives(tmp_path):
+    filename = "tests/example-4.csv"
+    with open(filename, "rb") as f:
+        data = f.read()
+    paths = [filename]
+    for suffix, compress in [(".gz", gzip.compress), (".bz2", bz2.compress), (".xz", lzma.compress)]:
+        paths.append(tmp_path / f"example{suffix}")
+        paths[-1].write_bytes(compress(data))
+    paths.append(tmp_path / "bundle.zip")
+    with zipfile.ZipFile(paths[-1], "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("a.csv", data)
+        archive.writestr("notes.txt", "not imported")
+        archive.writestr("2024/", "")
+        archive.writestr("2024/B.CSV", data)
+        archive.writestr("__MACOSX/2024/._B.CSV", "resource fork")
+
+    sources = list(iter_sources(paths))
+    assert [name for name, _, _ in sources] == [str(path) for path in paths[:4]] + [
+        f"{paths[-1]}!a.csv",
+        f"{paths[-1]}!2024/B.CSV",
+    ]
+    assert [provenance for _, _, provenance in sources] == [
+        "example-4.csv",
+        "example.gz",
+        "example.bz2",
+        "example.xz",
+        "bundle.zip!a.csv",
+        "bundle.zip!2024/B.CSV",
+    ]
+    assert sources[0][1] == filename
+    assert all(source == data for _, source, _ in sources[1:])
+    assert load_chunked_textfile(sources[-1][1]) == load_chunked_textfile(filename)
+
+
+def test_iter_sources_skips_unreadable_files(tmp_path, caplog):
+    with open("tests/example-4.csv", "rb") as f:
+        data = f.read()
+    (tmp_path / "truncated.gz").write_bytes(gzip.compress(data)[:100])
+    (tmp_path / "broken.xz").write_bytes(lzma.compress(data)[:-20] + b"x" * 20)
+    (tmp_path / "broken.zip").write_bytes(b"PK\x03\x04" + b"x" * 100)
+    with zipfile.ZipFile(tmp_path / "bundle.zip", "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("a.csv", data)
+        archive.writestr("b.csv", data)
+    content = (tmp_path / "bundle.zip").read_bytes()
+    offset = content.index(b"b.csv") + len("b.csv") + 10  # within the compressed data of b.csv
+    (tmp_path / "bundle.zip").write_bytes(content[:offset] + bytes(20) + content[offset + 20 :])
+    paths = [tmp_path / name for name in ["truncated.gz", "missing.csv", "broken.xz", "broken.zip", "bundle.zip"]]
+
+    sources = list(iter_sources(paths + ["tests/example-4.csv"]))
+    assert [provenance for _, _, provenance in sources] == ["bundle.zip!a.csv", "example-4.csv"]
+    assert sum("Cannot read" in message for message in caplog.messages) == 5
+
+
+def test_provenance_name():
+    assert provenance_name("tests/example-4.csv") == "example-4.csv"
+    assert provenance_name("/data/acct!old/export.csv") == "export.csv"
+    assert provenance_name("in/bundle.zip", "2024/01.csv") == "bundle.zip!2024/01.csv"
@@ -1,11 +1,21 @@
+import copy
 import datetime
 from decimal import Decimal
 
 import pytest
 
 from contablo.csvimporter import ImportSpecExceededError
+from contablo.csvimporter import MatchMemo
 from contablo.csvimporter import add_to_importable_using_import_spec
+from contablo.csvimporter import first_chunk_columns
+from contablo.csvimporter import import_csv_with_spec_detection
+from contablo.fields import FieldSpecRegistry
+from contablo.fields import add_builtin_fieldspecs_to_registry
 from contablo.importable import ImporTable
+from contablo.importspec import ImportSpec
+from contablo.importspec import ImportSpecHeader
+from contablo.importspec import ImportSpecRegistry
+from contablo.profiling import profiling
 from tests.defs_importspec import import_spec_dict_acct1_account
 from tests.defs_importspec import import_spec_dict_with_map
 from tests.defs_importspec import import_spec_dict_with_map_and_match
@@ -241,3 +251,80 @@ def test_add_to_importable_using_import_spec_with_implicit_3():
             "_allow_add": True,
         },
     ]
+
+
+@pytest.mark.parametrize("maxsize", [1, 100])
+def test_add_to_importable_using_import_spec_with_memo(maxsize):
+    inputs = [
+        ["554122933", "2021-01-17 21:13:39", "Sub1", "Buy", "ASSET5", "41.00000000", ""],
+        ["554122933", "2021-01-17 21:13:39", "Sub1", "Buy", "ASSET4", "-16.09250000", ""],
+        ["554122933", "2021-01-17 21:13:39", "Sub1", "Fee", "ASSET5", "-0.04100000", ""],
+        ["554122934", "2021-01-18 10:00:00", "Sub1", "Buy", "ASSET6", "2.00000000", ""],
+        ["554122934", "2021-01-18 10:00:00", "Sub1", "Fee", "ASSET6", "-0.00100000", ""],
+    ]
+    expected = ImporTable(financial_transaction_fields)
+    for idx, inp in enumerate(inputs, 1):
+        add_to_importable_using_import_spec(expected, import_spec_inst1_sub1_with_implicit, inp, f"test:{idx}")
+
+    imp = ImporTable(financial_transaction_fields)
+    memo = MatchMemo(maxsize)
+    with profiling() as profile:
+        for idx, inp in enumerate(inputs, 1):
+            add_to_importable_using_import_spec(imp, import_spec_inst1_sub1_with_implicit, inp, f"test:{idx}", memo)
+
+    assert imp.data_vector == expected.data_vector
+    assert all(len(cache) <= maxsize for cache in memo.columns.values())
+    hits = profile.counters.get(("", "", "match_memo_hits"), 0)
+    misses = profile.counters[("", "", "match_memo_misses")]
+    assert hits + misses == len(inputs)
+    assert hits == (3 if maxsize > 1 else 1)
+
+
+def test_import_csv_with_spec_detection_loads_matching_specs_only():
+    from .test_custom_fields_with_transforms import import_spec
+    from .test_custom_fields_with_transforms import target_field_specs
+
+    field_registry = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(field_registry)
+    factory = ImporTable(field_registry.make_spec_list(target_field_specs)).clone_empty
+    decoy = copy.deepcopy(import_spec)
+    decoy["label"] = "decoy"
+    decoy["columns"][-1]["label"] = "Decoy"
+
+    loaded = []
+    registry = ImportSpecRegistry()
+    for data in [decoy, import_spec]:
+        load = lambda data=data: loaded.append(data["label"]) or ImportSpec(**data)  # noqa: E731
+        registry.add_lazy_import_spec(ImportSpecHeader.from_data(data), f"{data['label']}.json", load)
+
+    with profiling() as profile:
+        result = import_csv_with_spec_detection("tests/example-4.csv", registry, factory, field_registry)
+    assert result is not None and len(result) > 0
+    assert loaded == [import_spec["label"]]
+    assert profile.counters[("", "", "specs_loaded")] == 1
+
+
+def test_import_csv_with_spec_detection_names_archive_member():
+    from .test_custom_fields_with_transforms import import_spec
+    from .test_custom_fields_with_transforms import target_field_specs
+
+    field_registry = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(field_registry)
+    registry = ImportSpecRegistry()
+    registry.add_import_spec(ImportSpec(**import_spec), "import-spec.json")
+    factory = ImporTable(field_registry.make_spec_list(target_field_specs)).clone_empty
+    with open("tests/example-4.csv", "rb") as f:
+        data = f.read()
+
+    name = "in/bundle.zip!2024/01.csv"
+    importable = import_csv_with_spec_detection(data, registry, factory, field_registry, name, "bundle.zip!2024/01.csv")
+    assert [row["imported_from"] for row in importable.iter_data()][:2] == [
+        "export-dividends:bundle.zip!2024/01.csv:2",
+        "export-dividends:bundle.zip!2024/01.csv:3",
+    ]
+
+
+def test_first_chunk_columns():
+    assert first_chunk_columns([[], [(3, "a;b"), (4, "1;2")]]) == ["a", "b"]
+    assert first_chunk_columns([]) == []
+    assert first_chunk_columns([[(1, "")]]) is None  # no delimiter to be found
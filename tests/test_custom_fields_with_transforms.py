@@ -1,10 +1,12 @@
 import datetime
+import io
 import json
 from decimal import Decimal
 
 from contablo.csvimporter import import_csv_with_spec
 from contablo.fields import FieldSpecRegistry
 from contablo.fields import add_builtin_fieldspecs_to_registry
+from contablo.fixedpoint import fixed_point_type
 from contablo.importable import ImporTable
 from contablo.importspec import ImportSpec
 
@@ -130,3 +132,41 @@ def test_custom_fields_with_transforms():
             "tx_type": "DIVIDEND",
         },
     ]
+
+
+def test_custom_fields_with_transforms_from_buffer():
+    fieldspecs = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(fieldspecs)
+    fields = fieldspecs.make_spec_list(target_field_specs)
+    config = ImportSpec(**import_spec)
+
+    expected = import_csv_with_spec("tests/example-4.csv", config, ImporTable(fields).clone_empty, fieldspecs)
+    with open("tests/example-4.csv", "rb") as f:
+        data = f.read()
+
+    imp = import_csv_with_spec(memoryview(data), config, ImporTable(fields).clone_empty, fieldspecs, "example-4.csv")
+    assert imp.get_data() == expected.get_data()
+
+    imp = import_csv_with_spec(io.BytesIO(data), config, ImporTable(fields).clone_empty, fieldspecs, "example-4.csv")
+    assert imp.get_data() == expected.get_data()
+
+
+def test_custom_fields_with_transforms_in_money():
+    def as_money(specs):
+        return [dict(spec, type="money") if spec["type"] == "number" else spec for spec in specs]
+
+    fieldspecs = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(fieldspecs)
+    expected = import_csv_with_spec(
+        "tests/example-4.csv",
+        ImportSpec(**import_spec),
+        ImporTable(fieldspecs.make_spec_list(target_field_specs)).clone_empty,
+        fieldspecs,
+    )
+
+    config = ImportSpec(**dict(import_spec, fields=as_money(import_spec["fields"])))
+    fields = fieldspecs.make_spec_list(as_money(target_field_specs))
+    imp = import_csv_with_spec("tests/example-4.csv", config, ImporTable(fields).clone_empty, fieldspecs)
+
+    assert imp.get_data() == expected.get_data()
+    assert {type(row["tax_amount"]) for row in imp.get_data()} == {fixed_point_type(2)}
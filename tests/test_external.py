@@ -0,0 +1,61 @@
+import os
+import random
+from decimal import Decimal
+
+import pytest
+
+from contablo.external import ExternalDeduplicator
+from contablo.fields import DecimalFieldSpec
+from contablo.fields import StringFieldSpec
+from contablo.importable import ImporTable
+from contablo.profiling import profiling
+
+fields = [StringFieldSpec("payee", "Payee"), DecimalFieldSpec("amount", "Amount"), StringFieldSpec("note", "Note")]
+
+
+def random_rows(count, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for idx in range(count):
+        row = {"imported_from": f"file-{idx % 3}:{idx}", "payee": rng.choice("abc")}
+        amount = rng.randint(0, 5)
+        row["amount"] = rng.choice([amount, Decimal(amount), Decimal(f"{amount}.00")])  # equal, but different types
+        if rng.random() < 0.7:
+            # tuples and lists share a digest per type, see row_digest(), and lists are not hashable
+            row["note"] = rng.choice(["x", "y", ("t", 1), ("t", 2), ["l", 1], ["l", 2]])
+        rows.append(row)
+    return rows
+
+
+def merged_in(*row_lists):
+    target = ImporTable(fields)
+    for rows in row_lists:
+        other = ImporTable(fields)
+        other.data_vector = rows
+        target.merge_in(other)
+    return target.data_vector
+
+
+@pytest.mark.parametrize("max_rows,fan_in", [(1000, 64), (1, 2), (7, 2), (16, 3)])
+def test_external_deduplicator_is_like_merge_in(tmp_path, max_rows, fan_in):
+    rows_a, rows_b = random_rows(200, seed=1), random_rows(150, seed=2)
+    expected = merged_in(rows_a, rows_b)
+
+    with profiling() as profile:
+        with ExternalDeduplicator(ImporTable(fields).columns, max_rows, str(tmp_path), fan_in) as dedup:
+            dedup.add(rows_a)
+            dedup.add(rows_b)
+            result = list(dedup)
+        assert os.listdir(tmp_path) == []
+
+    assert [row["imported_from"] for row in result] == [row["imported_from"] for row in expected]
+    assert profile.counters[("", "", "dedup_dropped_rows")] == 350 - len(expected)
+    assert (profile.counters.get(("", "", "dedup_runs"), 0) > 0) == (max_rows < 350)
+    assert profile.stages[("", "", "dedup")].calls > 2  # iterating, i.e. merging, is timed as well as adding
+
+
+def test_external_deduplicator_invalid_parameters():
+    with pytest.raises(ValueError):
+        ExternalDeduplicator(["a"], max_rows=0)
+    with pytest.raises(ValueError):
+        ExternalDeduplicator(["a"], fan_in=1)
@@ -10,6 +10,7 @@ from contablo.fields import DecimalFieldSpec
 from contablo.fields import EnumFieldSpec
 from contablo.fields import FieldSpecRegistry
 from contablo.fields import IntFieldSpec
+from contablo.fields import MoneyFieldSpec
 from contablo.fields import StringFieldSpec
 from contablo.fields import TimeFieldSpec
 from contablo.fields import add_builtin_fieldspecs_to_registry
@@ -35,6 +36,7 @@ def test_int_field_spec_convert_yields(value, format, expected):
         (DecimalFieldSpec, dict(name="test", help="")),
         (EnumFieldSpec, dict(name="test", help="", items=["one", "two"])),
         (IntFieldSpec, dict(name="test", help="")),
+        (MoneyFieldSpec, dict(name="test", help="", scale=2)),
         (StringFieldSpec, dict(name="test", help="")),
         (TimeFieldSpec, dict(name="test", help="")),
     ],
@@ -51,6 +53,22 @@ def test_builtin_field_spec_rejects_overrides(cls, kwargs):
             raise AssertionError(f"{cls}.__init__() should reject argument {protected}.")
 
 
+@pytest.mark.parametrize("dictionary", [False, True])
+def test_string_field_spec_convert_shares_values(dictionary):
+    spec = StringFieldSpec("currency", "", dictionary=dictionary)
+    first, second = spec.convert("".join(["E", "UR"]), ""), spec.convert("".join(["EU", "R"]), "")
+    assert first == second == "EUR"
+    assert (first is second) is dictionary
+
+
+def test_enum_field_spec_convert():
+    spec = EnumFieldSpec("tx_type", "", ["BUY", "SELL"])
+    assert spec.convert("".join(["B", "UY"]), "") is spec.convert("".join(["BU", "Y"]), "")
+    with pytest.raises(AssertionError):
+        spec.convert("HOLD", "")
+    assert spec == EnumFieldSpec("tx_type", "", ["BUY", "SELL"])
+
+
 @pytest.mark.parametrize(
     "value, format, expected",
     [
@@ -61,6 +79,28 @@ def test_decimal_field_spec_convert_yields(value, format, expected):
     assert DecimalFieldSpec.convert(value, format) == expected
 
 
+@pytest.mark.parametrize(
+    "value, format, scale, expected",
+    [
+        ("+1.234,55", "+1.000,00", 2, "1234.55"),
+        ("-1,234.5", "-1,000.00", 2, "-1234.50"),
+        ("1.5", "1000.00", 4, "1.5000"),
+        ("42", "1000", 0, "42"),
+    ],
+)
+def test_money_field_spec_convert_yields(value, format, scale, expected):
+    spec = MoneyFieldSpec("amount", "", scale=scale)
+    result = spec.convert(value, format)
+    assert str(result) == expected
+    assert result == Decimal(expected)
+    assert type(result) is type(spec.zero) and spec.zero == 0
+
+
+def test_money_field_spec_rejects_excess_digits():
+    with pytest.raises(ValueError):
+        MoneyFieldSpec("amount", "").convert("1.234", "1000.000")
+
+
 @pytest.mark.parametrize(
     "value, format, expected",
     [
@@ -133,6 +173,7 @@ def test_field_spec_registry():
     fsr.add(DecimalFieldSpec)
     fsr.add(EnumFieldSpec)
     fsr.add(IntFieldSpec)
+    fsr.add(MoneyFieldSpec)
     fsr.add(StringFieldSpec)
     fsr.add(TimeFieldSpec)
 
@@ -159,7 +200,9 @@ def test_add_builtin_fieldspecs_to_registry():
             {"name": "bic", "type": "string", "help": "Payee BIC, if applicable"},
             {"name": "amount", "type": "number", "help": "Payment amount"},
             {"name": "balance", "type": "number", "help": "New account balance"},
+            {"name": "fee", "type": "money", "help": "Fee in cents", "scale": 2},
         ]
     )
 
     assert specs[0] == DateFieldSpec(name="tx_date", help="Date of payment")
+    assert specs[-1] == MoneyFieldSpec(name="fee", help="Fee in cents", scale=2)
@@ -0,0 +1,104 @@
+import math
+import pickle
+from decimal import Decimal
+
+import pytest
+
+from contablo.fixedpoint import fixed_point_type
+
+Money = fixed_point_type(2)
+
+
+@pytest.mark.parametrize(
+    "text, units, expected",
+    [
+        ("1234.5", 123450, "1234.50"),
+        ("-1234.56", -123456, "-1234.56"),
+        ("0.05", 5, "0.05"),
+        ("-.5", -50, "-0.50"),
+        ("12", 1200, "12.00"),
+        ("1.230", 123, "1.23"),
+        ("-0", 0, "0.00"),
+    ],
+)
+def test_fixed_point_parse_and_str(text, units, expected):
+    value = Money.parse(text)
+    assert value.units == units
+    assert str(value) == expected
+    assert value == Decimal(text)
+
+
+@pytest.mark.parametrize("text", ["", "-", ".", "1.234", "1e5", "1,00", " 1", "１"])
+def test_fixed_point_parse_rejects(text):
+    with pytest.raises(ValueError):
+        Money.parse(text)
+
+
+def test_fixed_point_types():
+    assert fixed_point_type(2) is Money
+    assert str(fixed_point_type(0).parse("-42")) == "-42"
+    assert str(fixed_point_type(4).parse("-0.0012")) == "-0.0012"
+    with pytest.raises(ValueError):
+        fixed_point_type(-1)
+
+
+def test_fixed_point_arithmetic_is_exact():
+    a, b = Money.parse("10.10"), Money.parse("-0.20")
+
+    assert sum([Money.parse("0.10")] * 10, Money(0)) == 1
+    assert (a + b, a - b, b - a, -b, abs(b), +a) == (Money(990), Money(1030), Money(-1030), Money(20), Money(20), a)
+    assert (a + 1, 1 + a, a - 1, 1 - a, a * 3, 3 * a) == (
+        Money(1110),
+        Money(1110),
+        Money(910),
+        Money(-910),
+        Money(3030),
+        Money(3030),
+    )
+    assert type(a + b) is Money and type(a * 3) is Money
+    assert repr(a * b) == "FixedPoint4('-2.0200')"
+    assert repr(a + fixed_point_type(3).parse("0.001")) == "FixedPoint3('10.101')"
+
+
+def test_fixed_point_yields_decimal_for_inexact_operations():
+    a = Money.parse("10.10")
+
+    assert a / 4 == Decimal("2.525") and isinstance(a / 4, Decimal)
+    assert 1 / Money.parse("0.5") == 2
+    assert a * 0.19 == Decimal("1.919")
+    assert 0.5 - a == Decimal("-9.6")
+    assert a + Decimal("0.001") == Decimal("10.101")
+    assert (a // 3, a % 3) == (Decimal("3"), Decimal("1.10"))
+
+
+def test_fixed_point_conversions():
+    a = Money.parse("-10.75")
+
+    assert (int(a), math.trunc(a), math.floor(a), math.ceil(a), round(a)) == (-10, -10, -11, -10, -11)
+    assert round(a, 1) == Decimal("-10.8")
+    assert float(a) == -10.75
+    assert f"{a}" == "-10.75" and f"{a:.1f}" == "-10.8"
+    assert bool(a) and not Money(0)
+    assert a.to_decimal() == Decimal("-10.75")
+
+
+def test_fixed_point_compares_and_hashes_like_decimal():
+    values = [Money.parse(text) for text in ["-1.5", "0", "0.01", "2", "1234567.89"]]
+    for value in values:
+        assert value == value.to_decimal()
+        assert hash(value) == hash(value.to_decimal())
+    assert hash(Money(0)) == hash(0) and hash(Money(200)) == hash(2)
+    assert Money.parse("0.10") == fixed_point_type(1).parse("0.1")
+    assert hash(Money.parse("0.10")) == hash(fixed_point_type(1).parse("0.1"))
+    assert sorted(reversed(values)) == values
+    assert Money.parse("0.1") != 0.1 and Money.parse("0.5") == 0.5
+    assert Money(100) < 2 < Money(201) and Money(1) > Decimal("0.001")
+    assert Money(0) != "0"
+
+
+def test_fixed_point_is_immutable_and_picklable():
+    a = Money.parse("12.34")
+    with pytest.raises(AttributeError):
+        a.units = 1
+    assert pickle.loads(pickle.dumps(a)) == a
+    assert type(pickle.loads(pickle.dumps(a))) is Money
@@ -2,6 +2,10 @@ import datetime
 
 import pytest
 
+from contablo.format_helpers import common_date_formats
+from contablo.format_helpers import common_datetime_formats
+from contablo.format_helpers import common_time_formats
+from contablo.format_helpers import fixed_width_parser
 from contablo.format_helpers import format_implicit
 from contablo.format_helpers import format_tmpl_str
 from contablo.format_helpers import guess_date_format
@@ -16,6 +20,7 @@ from contablo.format_helpers import is_time
 from contablo.format_helpers import parse_date
 from contablo.format_helpers import parse_datetime
 from contablo.format_helpers import parse_time
+from contablo.format_helpers import strptime
 
 
 @pytest.mark.parametrize(
@@ -46,6 +51,45 @@ def test_parse_datetime(sample, format, expected):
     assert parse_datetime(sample, format) == expected
 
 
+@pytest.mark.parametrize(
+    "sample, format",
+    [
+        ("2024-02-29", "%Y-%m-%d"),
+        ("29.02.24", "%d.%m.%y"),
+        ("31.12.69", "%d.%m.%y"),
+        ("20240229", "%Y%m%d"),
+        ("2024-02", "%Y-%m"),
+        ("29.02.2024 13:05:20", "%d.%m.%Y %H:%M:%S"),
+        ("29.02.2024  13:05:20", "%d.%m.%Y %H:%M:%S"),
+        ("1.2.2024", "%d.%m.%Y"),
+        ("２０２４-01-01", "%Y-%m-%d"),
+        ("01:02:03", "%H:%M:%S"),
+    ],
+)
+def test_strptime_equals_datetime_strptime(sample, format):
+    assert strptime(sample, format) == datetime.datetime.strptime(sample, format)
+
+
+@pytest.mark.parametrize(
+    "sample, format",
+    [
+        ("2023-02-29", "%Y-%m-%d"),
+        ("2024-13-01", "%Y-%m-%d"),
+        ("2024-1a-01", "%Y-%m-%d"),
+        ("2024.01.01", "%Y-%m-%d"),
+    ],
+)
+def test_strptime_raises(sample, format):
+    with pytest.raises(ValueError):
+        strptime(sample, format)
+
+
+def test_fixed_width_parser_covers_numeric_formats():
+    formats = [*common_date_formats.values(), *common_time_formats.values(), *common_datetime_formats.values()]
+    assert [format for format in formats if fixed_width_parser(format) is None] == ["%d %B %Y", "%d %B %Y %H:%M:%S"]
+    assert fixed_width_parser("%d.%m.%Y")("1.2.2024") is None
+
+
 @pytest.mark.parametrize(
     "sample, format, expected",
     [
@@ -1,3 +1,8 @@
+import pytest
+from arithmetic_expressions import Expression
+
+from contablo.bloom import BloomFilter
+from contablo.fields import DecimalFieldSpec
 from contablo.importable import ImporTable
 
 from .defs_fields import financial_transaction_fields
@@ -9,3 +14,63 @@ def test_importable_iter_data():
 
     assert list(dut.iter_data(reversed=False)) == [1, 2, 3]
     assert list(dut.iter_data(reversed=True)) == [3, 2, 1]
+
+
+def test_importable_merge_in_drops_known_entries():
+    dut = ImporTable(financial_transaction_fields)
+    dut.data_vector = [{"tx_reference": "a", "imported_from": "x"}, {"tx_reference": "b", "imported_from": "x"}]
+    other = dut.clone_empty()
+    other.data_vector = [{"tx_reference": "b", "imported_from": "y"}, {"tx_reference": "c", "imported_from": "y"}]
+
+    dut.merge_in(other)
+    assert [row["tx_reference"] for row in dut.iter_data()] == ["a", "b", "c"]
+    assert dut.is_known_entry({"tx_reference": "c"})  # rows added by merge_in are known
+    dut.data_vector.append({"tx_reference": "d"})
+    assert dut.is_known_entry({"tx_reference": "d"})  # rows appended directly as well
+    assert not dut.is_known_entry({"tx_reference": "d", "tx_type": "BUY"})
+
+
+def test_importable_merge_in_with_key_filter(tmp_path):
+    dut = ImporTable(financial_transaction_fields)
+    dut.data_vector = [{"tx_reference": str(idx), "imported_from": "x"} for idx in range(100)]
+    dut.use_key_filter(BloomFilter(1000, 0.01))
+    other = dut.clone_empty()
+    other.data_vector = [{"tx_reference": str(idx), "imported_from": "y"} for idx in range(50, 150)]
+
+    dut.merge_in(other)
+    assert [row["tx_reference"] for row in dut.iter_data()] == [str(idx) for idx in range(150)]
+
+    # a saved filter covering all rows gives the same result
+    dut.save_key_filter(tmp_path / "filter")
+    warm = dut.clone_empty()
+    warm.data_vector = dut.data_vector.copy()
+    warm.use_key_filter(BloomFilter.load(tmp_path / "filter"), covers_rows=True)
+    assert all(warm.is_known_entry(row) for row in other.iter_data())
+    assert not warm.is_known_entry({"tx_reference": "150"})
+
+
+def test_importable_fields_follow_extra_fields():
+    dut = ImporTable(financial_transaction_fields)
+    fields = dut.fields
+    assert dut.fields is fields and list(fields) == dut.columns
+
+    dut.add_extra_fields([DecimalFieldSpec("net", "")])
+    dut.add_transforms({"net": Expression.parse("price + 1")})
+    assert dut.fields["net"] == DecimalFieldSpec("net", "") and dut.columns[-1] == "net"
+    dut.extra_fields_list[0] = DecimalFieldSpec("gross", "")  # replaced in place, same size
+    assert "gross" in dut.fields and "net" not in dut.fields
+    assert dut.evaluate(dut.transforms["net"], {"price": 2}) == 3
+
+
+def test_importable_known_entries_follow_replaced_data_vector(tmp_path):
+    dut = ImporTable(financial_transaction_fields)
+    dut.use_key_filter(BloomFilter(1000, 0.01))
+    dut.data_vector.append({"tx_reference": "x"})
+    assert dut.is_known_entry({"tx_reference": "x"})
+    dut.data_vector = [{"tx_reference": "y"}]
+    assert dut.is_known_entry({"tx_reference": "y"})
+    assert not dut.is_known_entry({"tx_reference": "x"})
+
+    dut.key_filter = None
+    with pytest.raises(ValueError):
+        dut.save_key_filter(tmp_path / "filter")
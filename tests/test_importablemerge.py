@@ -1,10 +1,17 @@
 import datetime
+import random
 from decimal import Decimal
 
 import pytest
 
 from contablo.importable import ImporTable
+from contablo.importablemerge import ImporTableMerger
+from contablo.importablemerge import LeftRightMatchRule
+from contablo.importablemerge import MatchComparator
+from contablo.importablemerge import MatchIndex
 from contablo.importablemerge import dicts_match_by_map
+from contablo.importablemerge import importable_merge
+from contablo.importablemerge import importable_merge_all
 from contablo.importablemerge import importable_merge_one
 from contablo.importablemerge import importable_merge_two
 from contablo.importablemerge import pick_one
@@ -13,84 +20,84 @@ from .defs_fields import addable_fields
 from .defs_fields import financial_transaction_fields
 from .defs_fields import match_rules
 
+# test cases for dicts_match_by_map(), also used by the match benchmark
+dicts_match_cases = [
+    (  # 0
+        {"A": 0, "B": 1, "C": None},  # left
+        {"A": 0, "B": 1, "C": None},  # right
+        {"A": "A"},  # match_map
+        None,  # ignore_left
+        None,  # ignore_right
+        None,  # ignore_undef
+        True,
+    ),
+    (  # 1: mismatch in B/b
+        {"A": 0, "B": 1, "C": None},  # left
+        {"A": 0, "b": 1, "C": None},  # right
+        {"A": "A"},  # match_map
+        None,  # ignore_left
+        None,  # ignore_right
+        None,  # ignore_undef
+        False,
+    ),
+    (  # 2
+        {"A": 0, "B": 1, "C": None},  # left
+        {"a": 0, "B": 1, "C": None},  # right
+        {"a": "A"},  # match_map
+        None,  # ignore_left
+        None,  # ignore_right
+        None,  # ignore_undef
+        True,
+    ),
+    (  # 3: mismatch in B/b
+        {"A": 0, "B": 1, "C": None},  # left
+        {"A": 0, "b": 1, "C": None},  # right
+        {"A": "A"},  # match_map
+        ["B"],  # ignore_left
+        ["b"],  # ignore_right
+        None,  # ignore_undef
+        True,
+    ),
+    (  # 4: mismatch in B/b
+        {"A": 0, "B": 1, "C": None},  # left
+        {"A": 0, "b": 1, "C": None},  # right
+        {"A": "A"},  # match_map
+        None,  # ignore_left
+        None,  # ignore_right
+        [None],  # ignore_undef
+        True,
+    ),
+    (  # 5: ignore non-None on right
+        {"A": 0, "B": "hallo", "C": None},  # left
+        {"A": 0, "B": "", "C": None},  # right
+        {"A": "A"},  # match_map
+        None,  # ignore_left
+        None,  # ignore_right
+        [""],  # ignore_undef
+        True,
+    ),
+    (  # 6: ignore non-None on left
+        {"A": 0, "B": "", "C": None},  # left
+        {"A": 0, "B": "hallo", "C": None},  # right
+        {"A": "A"},  # match_map
+        None,  # ignore_left
+        None,  # ignore_right
+        [""],  # ignore_undef
+        True,
+    ),
+    (  # 7: ignore works with Decimal
+        {"A": 0, "B": Decimal("1.0"), "C": None},  # left
+        {"A": 0, "B": "", "C": None},  # right
+        {"A": "A"},  # match_map
+        None,  # ignore_left
+        None,  # ignore_right
+        [None, ""],  # ignore_undef
+        True,
+    ),
+]
 
-@pytest.mark.parametrize(
-    "left, right, match_map, ignore_left, ignore_right, ignore_undef, expected",
-    [
-        (  # 0
-            {"A": 0, "B": 1, "C": None},  # left
-            {"A": 0, "B": 1, "C": None},  # right
-            {"A": "A"},  # match_map
-            None,  # ignore_left
-            None,  # ignore_right
-            None,  # ignore_undef
-            True,
-        ),
-        (  # 1: mismatch in B/b
-            {"A": 0, "B": 1, "C": None},  # left
-            {"A": 0, "b": 1, "C": None},  # right
-            {"A": "A"},  # match_map
-            None,  # ignore_left
-            None,  # ignore_right
-            None,  # ignore_undef
-            False,
-        ),
-        (  # 2
-            {"A": 0, "B": 1, "C": None},  # left
-            {"a": 0, "B": 1, "C": None},  # right
-            {"a": "A"},  # match_map
-            None,  # ignore_left
-            None,  # ignore_right
-            None,  # ignore_undef
-            True,
-        ),
-        (  # 3: mismatch in B/b
-            {"A": 0, "B": 1, "C": None},  # left
-            {"A": 0, "b": 1, "C": None},  # right
-            {"A": "A"},  # match_map
-            ["B"],  # ignore_left
-            ["b"],  # ignore_right
-            None,  # ignore_undef
-            True,
-        ),
-        (  # 4: mismatch in B/b
-            {"A": 0, "B": 1, "C": None},  # left
-            {"A": 0, "b": 1, "C": None},  # right
-            {"A": "A"},  # match_map
-            None,  # ignore_left
-            None,  # ignore_right
-            [None],  # ignore_undef
-            True,
-        ),
-        (  # 5: ignore non-None on right
-            {"A": 0, "B": "hallo", "C": None},  # left
-            {"A": 0, "B": "", "C": None},  # right
-            {"A": "A"},  # match_map
-            None,  # ignore_left
-            None,  # ignore_right
-            [""],  # ignore_undef
-            True,
-        ),
-        (  # 6: ignore non-None on left
-            {"A": 0, "B": "", "C": None},  # left
-            {"A": 0, "B": "hallo", "C": None},  # right
-            {"A": "A"},  # match_map
-            None,  # ignore_left
-            None,  # ignore_right
-            [""],  # ignore_undef
-            True,
-        ),
-        (  # 7: ignore works with Decimal
-            {"A": 0, "B": Decimal("1.0"), "C": None},  # left
-            {"A": 0, "B": "", "C": None},  # right
-            {"A": "A"},  # match_map
-            None,  # ignore_left
-            None,  # ignore_right
-            [None, ""],  # ignore_undef
-            True,
-        ),
-    ],
-)
+
+@pytest.mark.parametrize("left, right, match_map, ignore_left, ignore_right, ignore_undef, expected", dicts_match_cases)
 def test_dicts_match_by_map_yields(
     left: dict[str, int | None] | dict[str, int | str | None] | dict[str, int | Decimal | None],
     right: dict[str, int | None] | dict[str, int | str | None],
@@ -103,6 +110,14 @@ def test_dicts_match_by_map_yields(
     assert dicts_match_by_map(left, right, match_map, ignore_left, ignore_right, ignore_undef) is expected
 
 
+@pytest.mark.parametrize("left, right, match_map, ignore_left, ignore_right, ignore_undef, expected", dicts_match_cases)
+def test_match_comparator_yields(left, right, match_map, ignore_left, ignore_right, ignore_undef, expected):
+    matches = MatchComparator(match_map, ignore_left, ignore_right, ignore_undef)
+    assert matches(left, right) is expected
+    swapped = MatchComparator(match_map, ignore_right, ignore_left, ignore_undef)
+    assert swapped(right, left) is dicts_match_by_map(right, left, match_map, ignore_right, ignore_left, ignore_undef)
+
+
 def test_pick_one():
     left = [
         {"A": 1, "B": 2, "C": 3, "D": 4, "E": 5},
@@ -446,3 +461,201 @@ def test_importable_merge_can_add_subtrades():
         tgt = importable_merge_one(tgt, input, match_rules, addable_fields)
         # will fail unless _allow_add is properly implemented!
         assert tgt.data_vector == [output], f"Mismatch after merge step {idx}"
+
+
+def test_match_index_pick_one():
+    rows = [{"k": 1, "v": "a"}, {"k": 2, "v": "b"}, {"k": 2, "v": "c"}, {"v": "no key"}, {"k": [3], "v": "d"}]
+    index = MatchIndex(rows, ["k"])
+
+    def key_is(value, v=None):
+        return lambda row: row.get("k") == value and v in [None, row["v"]]
+
+    assert index.pick_one({"key": 1}, ["key"], key_is(1)) == {"k": 1, "v": "a"}
+    assert index.pick_one({"key": 1}, ["key"], key_is(1)) == {}  # consumed
+    assert index.pick_one({"key": 2}, ["key"], key_is(2)) == {}  # ambiguous
+    assert index.pick_one({"key": 2}, ["key"], key_is(2, "c")) == {"k": 2, "v": "c"}
+    assert index.pick_one({"other": 2}, ["key"], key_is(2)) == {}  # lacks key column
+    assert index.pick_one({"key": [3]}, ["key"], key_is([3])) == {"k": [3], "v": "d"}  # unhashable
+    assert index.remaining() == [{"k": 2, "v": "b"}, {"v": "no key"}]
+
+
+def test_match_index_with_undefined_or_incomparable_range_values():
+    day = datetime.date(2024, 1, 2)
+    rows = [{"a": "x", "d": ""}, {"a": "x", "d": day}, {"a": "y", "d": 5}, {"a": "y", "d": day}]
+    index = MatchIndex(rows, ["a"], "d")
+    assert index.unhashable == [2, 3]  # int and date cannot be sorted together
+
+    def a_d_is(a, d):
+        return lambda row: row["a"] == a and row["d"] == d
+
+    bounds = (day - datetime.timedelta(days=1), day + datetime.timedelta(days=1))
+    assert index.pick_one({"a": "x"}, ["a"], a_d_is("x", ""), bounds) == {}  # undefined range values are not indexed
+    assert index.pick_one({"a": "x"}, ["a"], a_d_is("x", day), bounds) == {"a": "x", "d": day}
+    assert index.pick_one({"a": "y"}, ["a"], a_d_is("y", day), bounds) == {"a": "y", "d": day}
+    assert index.remaining() == [{"a": "x", "d": ""}, {"a": "y", "d": 5}]
+
+
+def test_importable_merge_two_join_semantics():
+    """Consumption order, ambiguity and output order are the same as scanning the target list for each row."""
+    fields = {"ref": "string", "a": "string", "b": "string", "imported_from": "string"}
+    target, source = ImporTable(fields), ImporTable(fields)
+    target.data_vector = [
+        {"ref": "x", "a": "1", "imported_from": "t1"},
+        {"ref": "y", "a": "2", "imported_from": "t2"},
+        {"ref": "y", "a": "2", "imported_from": "t3"},
+        {"ref": "z", "a": "3", "imported_from": "t4"},
+    ]
+    source.data_vector = [
+        {"ref": "x", "b": "1", "imported_from": "s1"},
+        {"ref": "x", "b": "2", "imported_from": "s2"},
+        {"ref": "y", "b": "3", "imported_from": "s3"},
+        {"ref": "z", "a": "9", "imported_from": "s4"},
+        {"b": "4", "imported_from": "s5"},
+    ]
+    rules = [LeftRightMatchRule({"ref": "ref"}, ["imported_from"])]
+    result = importable_merge_two(source, target, rules, [])
+    assert [row["imported_from"] for row in result.iter_data()] == ["t1|s1", "t2", "t3", "t4", "s2", "s3", "s4", "s5"]
+    assert result.data_vector[0] == {"ref": "x", "a": "1", "b": "1", "imported_from": "t1|s1"}
+
+
+def test_importable_merge_two_with_tolerances():
+    fields = {"isin": "string", "tx_date": "date", "amount": "number", "note": "string", "imported_from": "string"}
+    target, source = ImporTable(fields), ImporTable(fields)
+    target.data_vector = [
+        {"isin": "A", "tx_date": datetime.date(2023, 1, 2), "amount": Decimal("10.00"), "imported_from": "t1"},
+        {"isin": "A", "tx_date": datetime.date(2023, 1, 9), "amount": Decimal("20.00"), "imported_from": "t2"},
+        {"isin": "B", "tx_date": datetime.date(2023, 1, 9), "amount": Decimal("30.00"), "imported_from": "t3"},
+        {"isin": "B", "tx_date": datetime.date(2023, 1, 10), "amount": Decimal("30.00"), "imported_from": "t4"},
+    ]
+    source.data_vector = [
+        {
+            "isin": "A",
+            "tx_date": datetime.date(2023, 1, 3),
+            "amount": Decimal("10.01"),
+            "note": "x",
+            "imported_from": "s1",
+        },
+        {"isin": "A", "tx_date": datetime.date(2023, 1, 12), "amount": Decimal("20.00"), "imported_from": "s2"},
+        {"isin": "B", "tx_date": datetime.date(2023, 1, 11), "amount": Decimal("30.00"), "imported_from": "s3"},
+    ]
+    tolerances = {"tx_date": datetime.timedelta(days=2), "amount": 0.01}
+    rule = LeftRightMatchRule({"isin": "isin", "tx_date": "tx_date", "amount": "amount"}, ["imported_from"], tolerances)
+    result = importable_merge_two(source, target, [rule], [])
+    # s2 is out of the date window, s3 is ambiguous
+    assert [row["imported_from"] for row in result.iter_data()] == ["t1|s1", "t2", "t3", "t4", "s2", "s3"]
+    assert result.data_vector[0]["tx_date"] == datetime.date(2023, 1, 2)
+    assert result.data_vector[0]["note"] == "x"
+
+    merged = importable_merge(source, target, [rule])
+    assert [row["imported_from"] for row in merged.iter_data()] == ["t2", "t3", "t4", "t1|s1", "s2", "s3"]
+
+
+def test_left_right_match_rule_tolerance_must_be_mapped():
+    with pytest.raises(ValueError):
+        LeftRightMatchRule({"isin": "isin"}, [], {"tx_date": datetime.timedelta(days=1)})
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_importable_merge_all_equals_sequential_fold(seed):
+    rng = random.Random(seed)
+    fields = {name: "string" for name in ["ref", "a", "b", "c", "imported_from"]}
+    rules = [LeftRightMatchRule({}, ["imported_from"]), LeftRightMatchRule({"ref": "ref"}, ["imported_from", "c"])]
+    importables = []
+    for file_idx in range(4):
+        importable = ImporTable(fields)
+        for row_idx in range(30):
+            row = {"imported_from": f"f{file_idx}:{row_idx}"}
+            for key in ["ref", "a", "b", "c"]:
+                if rng.random() < 0.8:
+                    row[key] = rng.choice(["", None, "1", "2", "3"])
+            importable.data_vector.append(row)
+        importables.append(importable)
+
+    expected = ImporTable(fields)
+    for importable in importables:
+        for item in importable.iter_data():
+            expected = importable_merge_one(expected, item, rules, [])
+    assert importable_merge_all(importables, ImporTable(fields), rules).data_vector == expected.data_vector
+
+
+def test_importable_merge_two_parallel_equals_serial():
+    rng = random.Random(0)
+    fields = {name: "string" for name in ["ref", "order", "a", "imported_from"]}
+    target, source = ImporTable(fields), ImporTable(fields)
+    for idx in range(300):
+        target.data_vector.append({"ref": str(rng.randrange(200)), "a": "x", "imported_from": f"t{idx}"})
+        row = {"order": str(rng.randrange(200)), "a": rng.choice(["x", "y", ""]), "imported_from": f"s{idx}"}
+        if rng.random() < 0.7:
+            row["ref"] = str(rng.randrange(200))
+        source.data_vector.append(row)
+    rules = [
+        LeftRightMatchRule({"ref": "ref"}, ["imported_from"]),
+        LeftRightMatchRule({"order": "ref"}, ["imported_from"]),
+    ]
+    serial = importable_merge_two(source, target, rules, [])
+    parallel = importable_merge_two(source, target, rules, [], workers=3)
+    assert parallel.data_vector == serial.data_vector
+    assert any("|" in row["imported_from"] for row in serial.iter_data())
+
+
+def test_merger_save_and_load_continues_merge(tmp_path):
+    rng = random.Random(1)
+    fields = {"ref": "string", "amount": "number", "note": "string", "imported_from": "string"}
+    rules = [LeftRightMatchRule({}, ["imported_from"])]
+    importables = []
+    for file_idx in range(4):
+        importable = ImporTable(fields)
+        for row_idx in range(50):
+            row = {
+                "ref": str(rng.randrange(80)),
+                "amount": Decimal(rng.randrange(3)) / 10,
+                "imported_from": f"f{file_idx}",
+            }
+            if rng.random() < 0.5:
+                row["note"] = rng.choice(["", "a", "b"])
+            importable.data_vector.append(row)
+        importables.append(importable)
+    importables[0].data_vector[0]["amount"] = Decimal("0.10")  # equal to, but different from Decimal("0.1")
+
+    merger = ImporTableMerger(ImporTable(fields), rules)
+    for importable in importables[:2]:
+        merger.add(importable)
+    merger.save(tmp_path / "state")
+    merger = ImporTableMerger.load(tmp_path / "state", ImporTable(fields), rules)
+    for importable in importables[2:]:
+        merger.add(importable)
+
+    expected = importable_merge_all(importables, ImporTable(fields), rules)
+    assert merger.result().data_vector == expected.data_vector
+    assert [str(row["amount"]) for row in merger.result().iter_data()] == [
+        str(row["amount"]) for row in expected.iter_data()
+    ]
+    assert len(merger) == len(expected)
+
+
+def test_merger_save_replaces_state_only_when_complete(tmp_path, monkeypatch):
+    fields = {"ref": "string", "imported_from": "string"}
+    merger = ImporTableMerger(ImporTable(fields))
+    source = ImporTable(fields)
+    source.data_vector = [{"ref": "a", "imported_from": "x"}]
+    merger.add(source)
+    result = merger.result()
+    merger.save(tmp_path / "state", result)
+    saved = (tmp_path / "state").read_bytes()
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("contablo.importablemerge.pickle.dump", fail)
+    with pytest.raises(OSError):
+        merger.save(tmp_path / "state")
+    assert (tmp_path / "state").read_bytes() == saved
+    assert [path.name for path in tmp_path.iterdir()] == ["state"]
+    monkeypatch.undo()
+    assert ImporTableMerger.load(tmp_path / "state", ImporTable(fields)).result().data_vector == result.data_vector
+
+
+def test_merger_load_rejects_other_files(tmp_path):
+    (tmp_path / "state").write_bytes(b"something else")
+    with pytest.raises(ValueError):
+        ImporTableMerger.load(tmp_path / "state", ImporTable({}))
@@ -1,9 +1,20 @@
+import os
+import pickle
+
 import pytest
 from pydantic import ValidationError
 
+from contablo.fields import DecimalFieldSpec
+from contablo.fields import FieldSpecRegistry
+from contablo.fields import StringFieldSpec
+from contablo.fields import add_builtin_fieldspecs_to_registry
+from contablo.importspec import DatumTemplates
 from contablo.importspec import ImportColumnSpec
 from contablo.importspec import ImportMatchRule
 from contablo.importspec import ImportSpec
+from contablo.importspec import ImportSpecCache
+from contablo.importspec import ImportSpecHeader
+from contablo.importspec import ImportSpecRegistry
 
 
 def test_import_match_rule_noargs():
@@ -40,7 +51,7 @@ def test_import_column_spec():
             ImportMatchRule(
                 rule="WP-Kenn-Nr.: {wkn}, {}, Nominale:  {amount}",
                 implies={"type": "DIVIDEND", "fees": "0,00"},
-                onlyif={"value+fees": "positive"},
+                onlyif={"value+fees": ">:0,00:number:-0.000,00"},
             ),
         ],
     )
@@ -67,7 +78,7 @@ def test_import_spec_realistic():
                     ImportMatchRule(
                         rule="WP-Kenn-Nr.: {wkn}, {}, Nominale:  {amount}",
                         implies={"type": "DIVIDEND", "fees": "0,00"},
-                        onlyif={"value+fees": "positive"},
+                        onlyif={"value+fees": ">:0,00:number:-0.000,00"},
                     ),
                     ImportMatchRule(rule="bekannt", implies={"type": "DEPOSIT"}),
                 ],
@@ -97,3 +108,214 @@ def test_import_spec_realistic():
 def test_import_spec_forbid_extra():
     with pytest.raises(ValidationError):
         ImportSpec(label="acct2-Konto", type="account", something="else")
+
+
+@pytest.mark.parametrize(
+    "onlyif",
+    [
+        {"value+fees": "positive"},
+        {"value+fees": ">:0,00:number"},
+        {"value+fees": ">:zero:number:-0.000,00"},
+        {"date": ">:15.12.2023:datetime:dd.mm.yyyy"},
+    ],
+)
+def test_import_match_rule_rejects_malformed_onlyif(onlyif):
+    with pytest.raises(ValidationError):
+        ImportMatchRule(rule="testme", onlyif=onlyif)
+
+
+def test_import_match_rule_compiles_onlyif():
+    obj = ImportMatchRule(rule="testme", onlyif={"value+fees": ">:0,00:number:-0.000,00"})
+    assert obj.conditions["value+fees"]("1,00")
+    assert not obj.conditions["value+fees"]("-1,00")
+    assert pickle.loads(pickle.dumps(obj)) == obj
+
+
+def test_import_match_rule_conditions_follow_onlyif():
+    obj = ImportMatchRule(rule="testme", onlyif={"f": "empty"})
+    assert obj.conditions["f"]("")
+    obj.onlyif = {"f": "notempty"}
+    assert not obj.conditions["f"]("") and obj.conditions["f"]("x")
+    obj.onlyif["g"] = "empty"
+    assert set(obj.conditions) == {"f", "g"}
+    with pytest.raises(ValidationError):
+        obj.onlyif = {"f": "positive"}
+
+
+def test_import_column_spec_match_candidates():
+    spec = ImportColumnSpec(
+        label="Text", match=[dict(rule="Kauf {isin}"), dict(rule="Verkauf {isin}"), dict(rule="{}")]
+    )
+    assert [idx for idx, _ in spec.match_candidates("Verkauf DE0001")] == [1, 2]
+    assert spec == ImportColumnSpec(**spec.model_dump())
+    spec.match.append(ImportMatchRule(rule="Verkauf {isin} {}"))
+    assert [rule.rule for _, rule in spec.match_candidates("Verkauf DE0001 x")] == [
+        "Verkauf {isin}",
+        "{}",
+        "Verkauf {isin} {}",
+    ]
+    spec.match[0] = ImportMatchRule(rule="Bar {}")
+    assert [idx for idx, _ in spec.match_candidates("Bar baz")] == [0, 2]
+    spec.match[0].rule = "Baz {}"
+    assert [idx for idx, _ in spec.match_candidates("Bar baz")] == [2]
+
+
+def test_datum_templates():
+    templates = DatumTemplates(
+        "(defaults)",
+        {"currency": "EUR", "fees": "0,00/0.000,00", "ref": "{Ref}", "id": "{Date}-{Ref}/x", "braces": "{{EUR}}"},
+    )
+    assert templates.row_values
+    first = templates({"Date": "01.02.2023", "Ref": "R1"})
+    second = templates({"Date": "02.02.2023", "Ref": "R2"})
+    assert {k: (v.raw_value, v.format) for k, v in second.items()} == {
+        "currency": ("EUR", ""),
+        "fees": ("0,00", "0.000,00"),
+        "ref": ("R2", ""),
+        "id": ("02.02.2023-R2", "x"),
+        "braces": ("{EUR}", ""),
+    }
+    assert first["currency"] is second["currency"]
+    assert templates()["id"].raw_value == "{Date}-{Ref}"
+    assert not DatumTemplates("(defaults)", {"currency": "EUR"}).row_values
+    assert pickle.loads(pickle.dumps(templates)) == templates
+
+
+@pytest.mark.parametrize("implies", [{"tx_type": "BUY}"}, {"tx_type": "{BUY"}])
+def test_import_match_rule_rejects_malformed_implies(implies):
+    with pytest.raises(ValidationError):
+        ImportMatchRule(rule="Kauf", implies=implies)
+
+
+def test_defaults_and_implies_follow_changes():
+    spec = ImportSpec(label="test", type="account", defaults={"a": "1"})
+    assert spec.defaulted()["a"].raw_value == "1"
+    spec.defaults = {"a": "2"}
+    assert spec.defaulted()["a"].raw_value == "2"
+    spec.defaults["b"] = "{Ref}"
+    assert spec.defaulted({"Ref": "R1"})["b"].raw_value == "R1"
+
+    rule = ImportMatchRule(rule="Kauf")
+    assert rule.implied() == {} and not rule.implies_row_values
+    rule.implies = {"tx_type": "{Type}"}
+    assert rule.implied({"Type": "BUY"})["tx_type"].raw_value == "BUY" and rule.implies_row_values
+    with pytest.raises(ValidationError):
+        rule.implies = {"tx_type": "{BUY"}
+
+
+def test_import_spec_extra_fields_are_resolved_once():
+    registry = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(registry)
+    spec = ImportSpec(
+        label="test",
+        type="account",
+        fields=[{"name": "net", "type": "number", "help": ""}],
+        transforms={"net": "amount - fee"},
+    )
+
+    extra = spec.extra_fields
+    specs = extra.field_specs(registry)
+    assert specs == [DecimalFieldSpec("net", "")]
+    assert extra.expressions["net"].evaluate(amount=3, fee=1) == 2
+    assert spec.extra_fields is extra and extra.field_specs(registry) is specs
+
+    registry.add(DecimalFieldSpec)
+    assert extra.field_specs(registry) is not specs  # registry was changed
+    spec.transforms = {"net": "amount"}
+    assert spec.extra_fields is not extra and spec.extra_fields.expressions["net"].evaluate(amount=3) == 3
+    spec.transforms["net"] = "fee"  # changed in place, same size
+    assert spec.extra_fields.expressions["net"].evaluate(fee=4) == 4
+    spec.fields[0]["type"] = "string"
+    assert isinstance(spec.extra_fields.field_specs(registry)[0], StringFieldSpec)
+    assert spec == ImportSpec(**spec.model_dump())
+    assert pickle.loads(pickle.dumps(spec)) == spec
+
+
+@pytest.mark.parametrize("transforms", [{"net": "amount -"}, {"net": ""}])
+def test_import_spec_rejects_malformed_transforms(transforms):
+    with pytest.raises(ValidationError):
+        ImportSpec(label="test", type="account", transforms=transforms)
+
+
+def test_import_spec_header():
+    data = {
+        "label": "x",
+        "type": "account",
+        "encoding": "utf-8",
+        "delimiter": ";",
+        "columns": [{"label": "a"}, {"label": "b", "field": "note"}],
+    }
+    header = ImportSpecHeader.from_data(data)
+    assert header == ImportSpec(**data).header
+    assert header.column_labels == ("a", "b")
+    with pytest.raises(TypeError):
+        ImportSpecHeader.from_data({**data, "skip_lines": "1"})  # valid, but only after validation
+
+
+def test_import_spec_registry_loads_specs_on_demand(caplog):
+    loaded = []
+
+    def loader(data):
+        def load():
+            loaded.append(data["label"])
+            return ImportSpec(**data)
+
+        return load
+
+    registry = ImportSpecRegistry()
+    for label, columns in [("x", ["a", "b"]), ("y", ["a"]), ("z", ["b"])]:
+        data = {"label": label, "type": "account", "columns": [{"label": column} for column in columns]}
+        registry.add_lazy_import_spec(ImportSpecHeader.from_data(data), f"{label}.json", loader(data))
+    broken = {"label": "w", "type": "account", "columns": [{"label": "c", "unknown": 1}]}
+    registry.add_lazy_import_spec(ImportSpecHeader.from_data(broken), "w.json", loader(broken))
+    assert len(registry) == 4 and loaded == []
+
+    assert [spec.label for spec in registry.iter_specs(["a"])] == ["y"]
+    assert [spec.label for spec in registry.iter_specs(["a"])] == ["y"]
+    assert loaded == ["y"]
+    assert [spec.label for spec in registry.iter_specs()] == ["x", "y", "z"]
+    assert loaded == ["y", "x", "z", "w"]
+    assert "Error when trying to initialize import spec from w.json" in caplog.text
+    assert isinstance(registry.entries[-1].error, ValidationError)
+    assert registry.query_source("w") == "w.json"
+
+
+def test_import_spec_cache(tmp_path):
+    config = tmp_path / "spec.json"
+    config.write_text('{"label": "x", "type": "account"}')
+    spec = ImportSpec(label="x", type="account", columns=[{"label": "a", "match": [{"rule": "r {}", "onlyif": {}}]}])
+    digest = ImportSpecCache.digest(config.read_bytes())
+
+    cache = ImportSpecCache(tmp_path / "cache", tmp_path)
+    assert cache.get(str(config)) is None
+    cache.put(str(config), digest, spec.header)
+    cache.save()
+    assert cache.load_spec(digest) is None
+    cache.save_spec(digest, spec)
+
+    cache = ImportSpecCache(tmp_path / "cache", tmp_path)
+    assert cache.get(str(config)) == (digest, spec.header)
+    assert cache.load_spec(digest) == spec
+    os.utime(config, ns=(0, 0))  # touched, but same content
+    assert cache.get(str(config)) == (digest, spec.header)
+    config.write_text('{"label": "y", "type": "account"}')
+    assert cache.get(str(config)) is None
+    cache.save()
+    assert ImportSpecCache(tmp_path / "cache", tmp_path).entries == cache.entries
+    assert cache.load_spec(digest) is None  # dropped with the entry of the changed file
+
+    with open(cache.filename, "r+b") as f:
+        f.seek(len(ImportSpecCache.magic))
+        f.write(b"garbage")
+    assert ImportSpecCache(tmp_path / "cache", tmp_path).entries == {}
+
+
+def test_import_spec_cache_write_failure(tmp_path, monkeypatch):
+    def failing_dump(*args, **kwargs):
+        raise OSError("disk full")
+
+    spec = ImportSpec(label="x", type="account")
+    cache = ImportSpecCache(tmp_path / "cache", tmp_path)
+    monkeypatch.setattr(pickle, "dump", failing_dump)
+    cache.save_spec(b"digest", spec)
+    assert os.listdir(tmp_path / "cache") == []
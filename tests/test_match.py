@@ -1,11 +1,14 @@
 import pytest
 
+from contablo.match import Condition
+from contablo.match import TemplatePrefixIndex
 from contablo.match import check_condition
 from contablo.match import check_conditions
 from contablo.match import dicts_equal_in_keys
 from contablo.match import dicts_equal_without_keys
 from contablo.match import match_to_template
 from contablo.match import split_after_prefix
+from contablo.match import template_prefix
 
 
 @pytest.mark.parametrize(
@@ -76,6 +79,69 @@ def test_match_to_template_yields(text, template, strict_whitespace, expected):
         assert match_to_template(text, template) == expected
 
 
+@pytest.mark.parametrize(
+    "template, expected",
+    [
+        ("", ""),
+        ("{}", ""),
+        ("Kauf {wkn}", "Kauf "),
+        ("Kauf  \t{wkn}", "Kauf "),
+        ("\tKauf {}", " Kauf "),
+        (DIV_PATTERN, "WP-Kenn-Nr.: "),
+        ("Gutschrift\xa0{}", "Gutschrift"),
+        ("no placeholder", "no placeholder"),
+    ],
+)
+def test_template_prefix_yields(template, expected):
+    assert template_prefix(template) == expected
+
+
+TEMPLATES = [
+    BUY_PATTERN,
+    DIV_PATTERN,
+    "{}",
+    "Kauf {}",
+    "Kauf  WP-Kenn-Nr.: {}",
+    "Kauf",
+    "Gutschrift\xa0{}",
+    "SEPA {mandate} Lastschrift",
+    "SEPA {}",
+    "",
+]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        DIV_SAMPLE,
+        BUY_SAMPLE,
+        BUY_SAMPLE_NSPC,
+        "Kauf\tWP-Kenn-Nr.: 858144, x, Nominale: 2",
+        "Kauf",
+        "Kauf ",
+        "Gutschrift\xa0Lohn",
+        "Gutschrift Lohn",
+        "SEPA M0001 Lastschrift",
+        " SEPA M0001",
+        "",
+    ],
+)
+@pytest.mark.parametrize("strict_whitespace", [False, True])
+def test_template_prefix_index_keeps_matches(text, strict_whitespace):
+    index = TemplatePrefixIndex(TEMPLATES)
+    candidates = index.candidates(text)
+    assert candidates == sorted(candidates)
+    expected = [idx for idx, t in enumerate(TEMPLATES) if match_to_template(text, t, strict_whitespace) is not None]
+    assert set(expected) <= set(candidates)
+
+
+def test_template_prefix_index_skips_other_prefixes():
+    templates = [f"SEPA-Lastschrift Mandat M{idx:04d} {{}}" for idx in range(500)] + ["{}"]
+    index = TemplatePrefixIndex(templates)
+    assert index.candidates("SEPA-Lastschrift  Mandat M0042 Kd-Nr 1234") == [42, 500]
+    assert index.candidates("Gutschrift") == [500]
+
+
 @pytest.mark.parametrize(
     "prefix, text, expected",
     [
@@ -165,3 +231,11 @@ def test_check_conditions_yields(conditions, field_raw_values, secondary_raw_val
 def test_check_conditions_raises(conditions, field_raw_values, secondary_raw_values, expected):
     with pytest.raises(expected):
         check_conditions(conditions, field_raw_values, secondary_raw_values)
+
+
+def test_condition_subclass_requires_call():
+    class Incomplete(Condition):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -122,3 +122,12 @@ def test_number_format_normalize_yields(format, sample, expected):
 def test_number_format_normalize_raises(format, sample, exception):
     with pytest.raises(exception):
         NumberFormat.from_format(format).normalize(sample)
+
+
+def test_number_format_normalize_reuses_validity_of_shape():
+    fmt = NumberFormat.from_format("-1.000,00")
+    assert [fmt.normalize(sample) for sample in ["-1.234,56", "-9.876,54", "1.234"]] == ["-1234.56", "-9876.54", "1234"]
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            fmt.normalize("-12.34,56")
+    assert fmt == NumberFormat.from_format("-1.000,00")
@@ -0,0 +1,55 @@
+from contablo.csvimporter import import_csv_with_spec
+from contablo.fields import FieldSpecRegistry
+from contablo.fields import add_builtin_fieldspecs_to_registry
+from contablo.importable import ImporTable
+from contablo.importspec import ImportSpec
+from contablo.profiling import ImportProfile
+from contablo.profiling import count
+from contablo.profiling import current_profile
+from contablo.profiling import profile_scope
+from contablo.profiling import profiling
+from contablo.profiling import stage
+
+from .test_custom_fields_with_transforms import import_spec
+from .test_custom_fields_with_transforms import target_field_specs
+
+
+def test_instrumentation_is_noop_without_profile():
+    assert current_profile() is None
+    with stage("anything"):
+        count("anything")
+    assert current_profile() is None
+
+
+def test_profile_scopes():
+    with profiling() as profile:
+        with profile_scope(file="a.csv"):
+            count("rows", 2)
+            with profile_scope(spec="spec1"):
+                count("rows", 3)
+                with stage("match"):
+                    pass
+        count("rows")
+
+    assert profile.counters == {("a.csv", "", "rows"): 2, ("a.csv", "spec1", "rows"): 3, ("", "", "rows"): 1}
+    assert profile.stages[("a.csv", "spec1", "match")].calls == 1
+    assert current_profile() is None
+
+
+def test_profile_import_stages():
+    fieldspecs = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(fieldspecs)
+    fields = fieldspecs.make_spec_list(target_field_specs)
+
+    with profiling(ImportProfile()) as profile, profile_scope(file="example-4.csv", spec="export-dividends"):
+        imp = import_csv_with_spec(
+            "tests/example-4.csv", ImportSpec(**import_spec), ImporTable(fields).clone_empty, fieldspecs
+        )
+
+    stages = {stage for _, _, stage in profile.stages}
+    assert {"encoding", "chunking", "guess_separator", "match", "convert", "transform"} <= stages
+    assert profile.counters[("example-4.csv", "export-dividends", "rows")] == len(imp)
+
+    data = profile.as_dict()
+    assert {"file", "spec", "stage", "calls", "seconds"} == set(data["stages"][0])
+    assert len(profile.format_table()) == 2 + len(profile.stages) + len(profile.counters)
@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from contablo.csvimporter import import_csv_with_spec
+from contablo.fields import FieldSpecRegistry
+from contablo.fields import add_builtin_fieldspecs_to_registry
+from contablo.importable import ImporTable
+from contablo.importspec import ImportSpec
+from contablo.importspec import ImportSpecRegistry
+from contablo.serve import ImportService
+from contablo.serve import ImportServiceError
+from contablo.serve import make_server
+from contablo.serve import request_import
+
+from .test_custom_fields_with_transforms import import_spec
+from .test_custom_fields_with_transforms import target_field_specs
+
+
+def make_service():
+    field_registry = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(field_registry)
+    fields = field_registry.make_spec_list(target_field_specs)
+    registry = ImportSpecRegistry()
+    registry.add_import_spec(ImportSpec(**import_spec), "import-spec.json")
+    return ImportService(registry, field_registry, fields)
+
+
+@pytest.fixture(params=["unix", "tcp"])
+def server_address(request, tmp_path):
+    service = make_service()
+    if request.param == "unix":
+        server = make_server(service, socket_path=str(tmp_path / "contablo.sock"), workers=2, max_request_bytes=1000)
+    else:
+        server = make_server(service, port=0, workers=2, max_request_bytes=1000, path_root="tests")
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def expected_rows():
+    field_registry = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(field_registry)
+    factory = ImporTable(field_registry.make_spec_list(target_field_specs)).clone_empty
+    importable = import_csv_with_spec("tests/example-4.csv", ImportSpec(**import_spec), factory, field_registry)
+    return importable.get_flat_table(convert_func=str, fallback="", include_header=True)
+
+
+def test_serve_converts_data_and_paths(server_address):
+    with open("tests/example-4.csv", "rb") as f:
+        data = f.read()
+    expected = expected_rows()
+
+    body = request_import(server_address, data=data, name="example.csv", format="csv")
+    assert list(csv.reader(io.StringIO(body.decode()))) == expected
+    body = request_import(server_address, path="tests/example-4.csv")
+    rows = [json.loads(line) for line in body.decode().splitlines()]
+    assert [[row[column] or "" for column in expected[0]] for row in rows] == expected[1:]
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda _: request_import(server_address, data=data, format="csv"), range(8)))
+    assert all(result == results[0] for result in results)
+
+
+def test_serve_reports_errors(server_address):
+    with pytest.raises(ImportServiceError, match="No single import spec"):
+        request_import(server_address, data=b"a,b\n1,2\n")
+    with pytest.raises(ImportServiceError, match="Unknown format"):
+        request_import(server_address, path="tests/example-4.csv", format="xml")
+    if not isinstance(server_address, str):
+        with pytest.raises(ImportServiceError, match="Not allowed"):
+            request_import(server_address, path="README.md")
+
+    family = socket.AF_UNIX if isinstance(server_address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.connect(server_address)
+        with sock.makefile("rwb") as f:
+            for request in [b"[]\n", b"not json\n", b'{"length": -1}\n', b"{}\n"]:
+                f.write(request)
+                f.flush()
+                response = json.loads(f.readline())
+                assert response["status"] == "error" and response["length"] == 0
+            # the data of a request that is too large is not read, so the connection is closed
+            f.write(b'{"length": 1001}\n')
+            f.flush()
+            response = json.loads(f.readline())
+            assert "exceeds 1000 bytes" in response["message"]
+            assert f.readline() == b""
+
+
+@pytest.mark.parametrize("kind", ["unix", "tcp"])
+def test_serve_stops_with_idle_connection(tmp_path, kind):
+    if kind == "unix":
+        server = make_server(make_service(), socket_path=str(tmp_path / "contablo.sock"), workers=1)
+    else:
+        server = make_server(make_service(), port=0, workers=1)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    family = socket.AF_UNIX if kind == "unix" else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as idle, socket.socket(family, socket.SOCK_STREAM) as waiting:
+        idle.connect(server.server_address)
+        idle.sendall(b"{}\n")
+        assert json.loads(idle.makefile("rb").readline())["status"] == "error"  # served, and now waiting
+        waiting.connect(server.server_address)  # waits for the only worker
+        server.shutdown()
+        closing = threading.Thread(target=server.server_close)
+        closing.start()
+        closing.join(timeout=5)
+        assert not closing.is_alive()
+        assert idle.recv(1) == b""
+    thread.join()
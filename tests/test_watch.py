@@ -0,0 +1,122 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+from contablo.csvimporter import import_csv_with_spec_detection
+from contablo.fields import FieldSpecRegistry
+from contablo.fields import add_builtin_fieldspecs_to_registry
+from contablo.importable import ImporTable
+from contablo.importablemerge import ImporTableMerger
+from contablo.importablemerge import LeftRightMatchRule
+from contablo.importspec import ImportSpec
+from contablo.importspec import ImportSpecRegistry
+from contablo.watch import DropFolderWatcher
+
+from .test_custom_fields_with_transforms import import_spec
+from .test_custom_fields_with_transforms import target_field_specs
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.parametrize("max_imports", [1, 3])
+def test_drop_folder_watcher(tmp_path, max_imports):
+    field_registry = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(field_registry)
+    merger = ImporTableMerger(
+        ImporTable(field_registry.make_spec_list(target_field_specs)), [LeftRightMatchRule({}, ["imported_from"])]
+    )
+    registry = ImportSpecRegistry()
+    registry.add_import_spec(ImportSpec(**import_spec), "import-spec.json")
+    imported = []
+
+    def import_file(filename):
+        imported.append(os.path.basename(filename))
+        if filename.endswith("broken.csv"):
+            raise ValueError("broken")
+        return import_csv_with_spec_detection(filename, registry, merger.target.clone_empty, field_registry)
+
+    merges = []
+    clock = Clock()
+    on_merged = lambda: merges.append(len(merger))  # noqa: E731
+    watcher = DropFolderWatcher(
+        str(tmp_path), import_file, merger, on_merged, debounce=2, max_imports=max_imports, clock=clock
+    )
+    assert watcher.poll_once() == []
+
+    shutil.copy("tests/example-4.csv", tmp_path / "a.csv")
+    shutil.copy("tests/example-4.csv", tmp_path / "b.csv")
+    (tmp_path / "broken.csv").write_text("x")
+    (tmp_path / "ignored.txt").write_text("x")
+    assert watcher.poll_once() == []  # not yet settled
+    clock.now = 1
+    with open(tmp_path / "a.csv", "a") as f:  # still being written
+        f.write("\n")
+    assert watcher.poll_once() == []
+    clock.now = 2.5
+    assert [os.path.basename(f) for f in watcher.poll_once()] == ["b.csv", "broken.csv"]
+    rows = len(merger)
+    assert rows > 0 and merges == [rows]
+    clock.now = 10
+    assert [os.path.basename(f) for f in watcher.poll_once()] == ["a.csv"]
+    assert len(merger) == rows  # same rows, merged into the existing ones
+    assert merges == [rows, rows]
+
+    clock.now = 20
+    assert watcher.poll_once() == []
+    (tmp_path / "broken.csv").write_text("xy")  # changed, so it is tried once more
+    assert watcher.poll_once() == []
+    clock.now = 30
+    assert [os.path.basename(f) for f in watcher.poll_once()] == ["broken.csv"]
+    assert sorted(imported) == ["a.csv", "b.csv", "broken.csv", "broken.csv"]
+    assert merges == [rows, rows]
+
+
+def test_drop_folder_watcher_invalid_max_imports(tmp_path):
+    with pytest.raises(ValueError):
+        DropFolderWatcher(str(tmp_path), lambda filename: None, None, max_imports=0)
+
+
+def test_drop_folder_watcher_write_interval(tmp_path):
+    field_registry = FieldSpecRegistry()
+    add_builtin_fieldspecs_to_registry(field_registry)
+    merger = ImporTableMerger(ImporTable(field_registry.make_spec_list(target_field_specs)))
+    registry = ImportSpecRegistry()
+    registry.add_import_spec(ImportSpec(**import_spec), "import-spec.json")
+
+    def import_file(filename):
+        return import_csv_with_spec_detection(filename, registry, merger.target.clone_empty, field_registry)
+
+    merges = []
+    clock = Clock()
+    on_merged = lambda: merges.append(len(merger))  # noqa: E731
+    watcher = DropFolderWatcher(
+        str(tmp_path), import_file, merger, on_merged, debounce=0, clock=clock, write_interval=10
+    )
+    shutil.copy("tests/example-4.csv", tmp_path / "a.csv")
+    watcher.poll_once()
+    assert merges == [len(merger)]  # written right away, as nothing was written before
+
+    for name, now in [("b.csv", 1), ("c.csv", 5)]:
+        clock.now = now
+        shutil.copy("tests/example-4.csv", tmp_path / name)
+        assert watcher.poll_once() == [str(tmp_path / name)]
+    assert len(merges) == 1
+    clock.now = 10
+    watcher.poll_once()
+    assert merges == [merges[0], len(merger)]
+
+    clock.now = 11
+    shutil.copy("tests/example-4.csv", tmp_path / "d.csv")
+    stop = threading.Event()
+    stop.set()
+    watcher.poll_once()
+    watcher.run(stop=stop)  # writes the pending merge on the way out
+    assert len(merges) == 3